@@ -2,15 +2,28 @@
 from __future__ import annotations
 
 import io
+import mmap
 import os
 import re
 import tempfile
+import threading
 import time
 import requests
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import IO, BinaryIO, Dict, Iterator, List, Optional, Union
+from urllib.parse import urlsplit
 
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from .checkpoints import CheckpointStore, ConversionCheckpoint
+from .export_variants import get_variant_registry, is_schema_error
+from .metrics import record_adobe_request, record_job_polls, record_payload_fallback
+from .polling import PollingStrategy, parse_retry_after
+from .resilience import TRANSIENT_STATUSES, AdobeServiceUnavailable, RetryPolicy, get_circuit_breaker
+from .timings import record_stage, timed
 
 try:
     from adobe.pdfservices.operation.auth.credentials import Credentials
@@ -42,6 +55,275 @@ except ImportError:
     USE_PDFJOBS = False
 
 
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats"
+_DOWNLOAD_URI_KEYS = ("downloadUri", "download_uri", "downloadURL", "download_url")
+
+# PDF можно передать байтами или открытым бинарным файлом (файл не читается в память целиком)
+PDFSource = Union[bytes, BinaryIO]
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def pdf_buffer(pdf: PDFSource) -> Iterator[Union[bytes, memoryview]]:
+    """
+    Представить PDF как bytes-like буфер без копирования.
+
+    Для файлов на диске используется memory map: содержимое не попадает в кучу
+    Python, а буфер можно повторно отправить при повторе запроса.
+    """
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        yield pdf
+        return
+
+    if hasattr(pdf, "getbuffer"):
+        # Поток в памяти (например, BytesIO) - берем его буфер без копирования
+        view = pdf.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+        return
+
+    if isinstance(pdf, tempfile.SpooledTemporaryFile):
+        # Буфер в памяти SpooledTemporaryFile публично не доступен: rollover() переносит
+        # данные (не больше max_size) во временный файл, который дальше отображается в память
+        pdf.rollover()
+    if hasattr(pdf, "flush"):
+        pdf.flush()
+    try:
+        fileno = pdf.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fileno = None
+
+    if fileno is None:
+        pdf.seek(0)
+        yield pdf.read()
+        return
+
+    if os.fstat(fileno).st_size == 0:
+        yield b""
+        return
+    mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        mapped.close()
+
+
+class BufferStream(io.RawIOBase):
+    """
+    Файловый поток для чтения bytes-like буфера без копии (io.BytesIO копирует буфер целиком).
+
+    Держит ссылку на буфер до close(): memory map из pdf_buffer() нельзя закрыть, пока
+    поток открыт, поэтому его стоит использовать как контекстный менеджер.
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview]) -> None:
+        super().__init__()
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"Отрицательная позиция в потоке: {offset}")
+        self._position = offset
+        return offset
+
+    def readinto(self, target) -> int:
+        end = min(self._position + len(target), len(self._view))
+        size = max(0, end - self._position)
+        target[:size] = self._view[self._position:end]
+        self._position += size
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def spooled_result_file() -> IO[bytes]:
+    """Временный файл для результата: в памяти до ADOBE_SPOOL_MAX_MB, дальше на диске."""
+    max_size = int(float(os.getenv("ADOBE_SPOOL_MAX_MB", "8")) * 1024 * 1024)
+    return tempfile.SpooledTemporaryFile(max_size=max_size, mode="w+b")
+
+
+class AdobeJobFailed(Exception):
+    """Adobe завершил job конвертации со статусом failed."""
+
+
+class AdobeJobNotFound(Exception):
+    """Adobe не знает job (истек срок хранения или неверный ID)."""
+
+
+def api_base_url(region: str, base_url: Optional[str] = None) -> str:
+    """
+    Базовый URL REST API с учетом региона.
+
+    base_url (или переменная ADOBE_BASE_URL) заменяет адрес Adobe целиком - например,
+    чтобы направить клиент на локальный стенд app.fake_adobe.
+    """
+    override = base_url or os.getenv("ADOBE_BASE_URL")
+    if override:
+        return override.rstrip("/")
+    if region.upper() == "EU":
+        return "https://pdf-services-eu.adobe.io"
+    return "https://pdf-services.adobe.io"
+
+
+def token_url(base_url: Optional[str] = None) -> str:
+    """URL выдачи access token: общий для регионов, если адрес API не переопределен."""
+    return f"{api_base_url('US', base_url)}/token"
+
+
+def job_timeout_seconds() -> int:
+    """Максимальное время ожидания job (ADOBE_JOB_TIMEOUT, по умолчанию 10 минут для больших файлов)."""
+    return int(os.getenv("ADOBE_JOB_TIMEOUT", "600"))
+
+
+def build_export_payload_variants(asset_id: str) -> List[dict]:
+    """
+    Варианты payload для /operation/exportpdf.
+
+    Формат запроса у Adobe менялся, поэтому варианты перебираются до первого
+    сработавшего: упрощенный формат согласно примеру из документации, с cpf:engine и
+    полный формат. Сработавший вариант запоминается в ExportVariantRegistry.
+    """
+    return [
+        # Вариант 1: простой формат (согласно примеру)
+        {
+            "assetID": asset_id,
+            "targetFormat": "xlsx"
+        },
+        # Вариант 2: с cpf:engine
+        {
+            "assetID": asset_id,
+            "cpf:engine": {
+                "assetRef": {
+                    "uri": "urn:adobe:pdfservices:pdf2excel:PDF2Excel"
+                }
+            },
+            "targetFormat": "xlsx"
+        },
+        # Вариант 3: полный формат
+        {
+            "cpf:engine": {
+                "assetRef": {
+                    "uri": "urn:adobe:pdfservices:pdf2excel:PDF2Excel"
+                }
+            },
+            "cpf:inputs": {
+                "params": {
+                    "cpf:inline": {
+                        "targetFormat": "xlsx"
+                    }
+                },
+                "documentIn": {
+                    "cpf:location": {
+                        "storageType": "external",
+                        "assetID": asset_id
+                    }
+                }
+            }
+        }
+    ]
+
+
+def file_size(file_obj: IO[bytes]) -> int:
+    """Размер открытого файла без изменения текущей позиции."""
+    position = file_obj.tell()
+    size = file_obj.seek(0, os.SEEK_END)
+    file_obj.seek(position)
+    return size
+
+
+def safe_json(response) -> Optional[dict]:
+    """Разобрать JSON тело ответа, не падая на пустом или не-JSON ответе."""
+    try:
+        data = response.json()
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _request_not_sent(error: requests.RequestException) -> bool:
+    """Ошибка возникла до отправки запроса (соединение не установлено), повтор безопасен."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def extract_job_id(location: Optional[str], body: Optional[dict]) -> Optional[str]:
+    """
+    Извлечь job ID из заголовка Location или тела ответа на создание job.
+
+    Location может быть: /operation/exportpdf/{job_id}/status или просто {job_id}.
+    """
+    job_id = None
+    if location:
+        # Ищем job_id в location (обычно перед /status)
+        location_parts = location.strip("/").split("/")
+        if "status" in location_parts:
+            status_idx = location_parts.index("status")
+            if status_idx > 0:
+                job_id = location_parts[status_idx - 1]
+        else:
+            # Если нет /status, берем последний элемент
+            job_id = location_parts[-1]
+
+    # Пробуем получить из тела ответа, если не получили из location
+    if not job_id and body:
+        job_id = body.get("jobId") or body.get("id") or body.get("job_id")
+
+    if (not job_id or job_id == "status") and location:
+        # Пробуем извлечь из полного URL location через regex
+        match = re.search(r'/exportpdf/([^/]+)/status', location) or re.search(r'/([a-f0-9\-]+)/status', location)
+        if match:
+            job_id = match.group(1)
+
+    if not job_id or job_id == "status":
+        return None
+    return job_id
+
+
+def find_download_uri(status_data: dict) -> Optional[str]:
+    """Найти ссылку на результат в ответе статуса job."""
+    # Сначала проверяем asset объект (это основной путь для Adobe API),
+    # затем корневой уровень и result объект
+    candidates = [status_data.get("asset"), status_data, status_data.get("result")]
+    for container in candidates:
+        if not isinstance(container, dict):
+            continue
+        for key in _DOWNLOAD_URI_KEYS:
+            if container.get(key):
+                return container[key]
+    return None
+
+
+def job_error_message(status_data: dict) -> str:
+    """Текст ошибки из ответа статуса упавшего job."""
+    error_info = status_data.get("error", {})
+    if isinstance(error_info, dict):
+        return error_info.get("message", str(error_info))
+    return str(error_info)
+
+
 class AdobePDFService:
     """Класс для работы с Adobe PDF Services API."""
 
@@ -53,6 +335,9 @@ class AdobePDFService:
         region: Optional[str] = None,
         connect_timeout: Optional[int] = None,
         read_timeout: Optional[int] = None,
+        polling: Optional[PollingStrategy] = None,
+        base_url: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
     ) -> None:
         """
         Инициализация сервиса Adobe PDF Services.
@@ -64,6 +349,9 @@ class AdobePDFService:
             region: Регион обработки ('US' или 'EU', по умолчанию 'US')
             connect_timeout: Таймаут подключения в миллисекундах (по умолчанию 4000)
             read_timeout: Таймаут чтения в миллисекундах (по умолчанию 10000)
+            polling: Стратегия опроса статуса job (по умолчанию из переменных ADOBE_POLL_*)
+            base_url: Адрес REST API вместо Adobe (или переменная ADOBE_BASE_URL)
+            retry_policy: Политика повторов отдельных запросов (по умолчанию из ADOBE_HTTP_*)
         """
         if not ADOBE_AVAILABLE:
             raise ImportError(
@@ -77,6 +365,7 @@ class AdobePDFService:
         self._region = region or os.getenv("ADOBE_REGION", "US")
         self._connect_timeout = connect_timeout or int(os.getenv("ADOBE_CONNECT_TIMEOUT", "4000"))
         self._read_timeout = read_timeout or int(os.getenv("ADOBE_READ_TIMEOUT", "10000"))
+        self._base_url = base_url
 
         import sys
         print(f"[ADOBE_SERVICE] Проверка credentials...", file=sys.stderr, flush=True)
@@ -99,6 +388,28 @@ class AdobePDFService:
         print(f"[ADOBE_SERVICE] ✅ Credentials проверены успешно", file=sys.stderr, flush=True)
         self._execution_context: Optional[ExecutionContext] = None
 
+        # Кэш access token: токен живет ~24 часа, поэтому переиспользуем его между конвертациями
+        # и обновляем заранее (за ADOBE_TOKEN_REFRESH_MARGIN секунд до истечения) или после 401.
+        self._token_refresh_margin = int(os.getenv("ADOBE_TOKEN_REFRESH_MARGIN", "300"))
+        self._access_token: Optional[str] = None
+        self._access_token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+
+        # Пул keep-alive соединений: отдельная requests.Session на каждый хост
+        # (pdf-services, хост pre-signed загрузки, хост скачивания результата),
+        # чтобы polling и загрузки не открывали новое TCP+TLS соединение на каждый запрос.
+        self._pool_size = int(os.getenv("ADOBE_HTTP_POOL_SIZE", "10"))
+        self._sessions: Dict[str, requests.Session] = {}
+        self._sessions_lock = threading.Lock()
+        # Повторы выполняются на уровне отдельного шага (с учетом идемпотентности),
+        # а при затяжном сбое Adobe общий для процесса breaker сразу отклоняет запросы
+        self._retry_policy = retry_policy or RetryPolicy.from_env()
+        self._breaker = get_circuit_breaker(self._api_base_url())
+        # asset/job незавершенных конвертаций: после перезапуска процесса опрос продолжается
+        self._checkpoints = CheckpointStore.from_env()
+        self._polling = polling or PollingStrategy.from_env()
+        self._export_variants = get_variant_registry()
+
     def _get_execution_context(self) -> ExecutionContext:
         """Получить или создать ExecutionContext для работы с API."""
         if self._execution_context is None:
@@ -144,15 +455,150 @@ class AdobePDFService:
 
         return self._execution_context
 
+    def _build_session(self) -> requests.Session:
+        """Создать Session с пулом соединений (повторы выполняет _http_request)."""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _session_for(self, url: str) -> requests.Session:
+        """Вернуть Session для хоста из URL (создается при первом обращении)."""
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(key)
+        if session is None:
+            with self._sessions_lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._build_session()
+                    self._sessions[key] = session
+        return session
+
+    def _http_request(
+        self,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        retry_on_throttle: bool = True,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Выполнить HTTP запрос через пул соединений хоста с повторами по RetryPolicy.
+
+        Args:
+            idempotent: Можно ли повторять запрос после таймаута чтения и 5xx
+                (по умолчанию - для GET/HEAD/PUT)
+            retry_on_throttle: Повторять ли ответ 429 (polling статуса обрабатывает его сам)
+
+        Raises:
+            AdobeServiceUnavailable: circuit breaker разомкнут, запрос не отправлялся
+        """
+        if idempotent is None:
+            idempotent = method.upper() in {"GET", "HEAD", "PUT"}
+        policy = self._retry_policy
+        session = self._session_for(url)
+        import sys
+        attempt = 0
+        while True:
+            last_attempt = attempt + 1 >= policy.attempts
+            self._breaker.before_call()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                record_adobe_request(method, url, "error")
+                if last_attempt or not (idempotent or _request_not_sent(e)):
+                    self._breaker.record_failure()
+                    raise
+                delay = policy.delay(attempt)
+                print(f"[ADOBE_SERVICE] ⚠️ {method} {url}: {e.__class__.__name__}, повтор {attempt + 1}/{policy.attempts - 1} через {delay:.1f} с", file=sys.stderr, flush=True)
+            else:
+                record_adobe_request(method, url, response.status_code)
+                if last_attempt or not policy.should_retry_status(response.status_code, idempotent, retry_on_throttle):
+                    if response.status_code in TRANSIENT_STATUSES:
+                        self._breaker.record_failure()
+                    else:
+                        self._breaker.record_success()
+                    return response
+                delay = policy.delay(attempt, parse_retry_after(response.headers))
+                print(f"[ADOBE_SERVICE] ⚠️ {method} {url}: статус {response.status_code}, повтор {attempt + 1}/{policy.attempts - 1} через {delay:.1f} с", file=sys.stderr, flush=True)
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        """Закрыть все пулы соединений (вызывается при остановке приложения)."""
+        with self._sessions_lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def __enter__(self) -> "AdobePDFService":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def region(self) -> str:
+        """Регион обработки ('US' или 'EU')."""
+        return self._region.upper()
+
+    def _api_base_url(self) -> str:
+        """Базовый URL REST API с учетом региона."""
+        return api_base_url(self._region, self._base_url)
+
     def _get_access_token(self) -> str:
-        """Получить access token для REST API."""
+        """
+        Получить access token для REST API из кэша или запросить новый.
+
+        Обновление выполняется под блокировкой (single-flight): если несколько потоков
+        одновременно обнаружили истекший токен, в /token уходит только один запрос,
+        остальные получают уже обновленный токен.
+        """
+        token = self._access_token
+        if token and time.monotonic() < self._access_token_expires_at:
+            return token
+
+        with self._token_lock:
+            # Пока мы ждали блокировку, токен мог обновить другой поток
+            token = self._access_token
+            if token and time.monotonic() < self._access_token_expires_at:
+                return token
+
+            with timed("adobe_token"):
+                token, expires_in = self._request_access_token()
+            # Обновляем заранее, но не раньше чем через половину срока жизни токена
+            margin = min(self._token_refresh_margin, expires_in // 2)
+            self._access_token = token
+            self._access_token_expires_at = time.monotonic() + expires_in - margin
+            return token
+
+    def _invalidate_access_token(self, stale_token: str) -> None:
+        """
+        Сбросить токен из кэша после 401.
+
+        Если другой поток уже успел обновить токен, кэш не трогаем, чтобы не запрашивать
+        /token повторно.
+        """
+        with self._token_lock:
+            if self._access_token == stale_token:
+                self._access_token = None
+                self._access_token_expires_at = 0.0
+
+    def _request_access_token(self) -> tuple[str, int]:
+        """Запросить новый access token в /token. Возвращает токен и срок жизни в секундах."""
         import sys
-        token_url = "https://pdf-services.adobe.io/token"
-        print(f"[ADOBE_SERVICE] Запрос access token с {token_url}...", file=sys.stderr, flush=True)
+        url = token_url(self._base_url)
+        print(f"[ADOBE_SERVICE] Запрос access token с {url}...", file=sys.stderr, flush=True)
         
         try:
-            response = requests.post(
-                token_url,
+            response = self._http_request(
+                "POST",
+                url,
+                idempotent=True,
                 headers={"Content-Type": "application/x-www-form-urlencoded"},
                 data={
                     "client_id": self._client_id,
@@ -163,39 +609,60 @@ class AdobePDFService:
             print(f"[ADOBE_SERVICE] Ответ на запрос token: статус {response.status_code}", file=sys.stderr, flush=True)
             response.raise_for_status()
             token_data = response.json()
-            print(f"[ADOBE_SERVICE] ✅ Access token получен успешно", file=sys.stderr, flush=True)
-            return token_data["access_token"]
+            expires_in = int(token_data.get("expires_in") or 86399)
+            print(f"[ADOBE_SERVICE] ✅ Access token получен успешно (expires_in: {expires_in} с)", file=sys.stderr, flush=True)
+            return token_data["access_token"], expires_in
         except Exception as e:
             print(f"[ADOBE_SERVICE] ❌ Ошибка получения access token: {e}", file=sys.stderr, flush=True)
             if hasattr(e, 'response') and e.response is not None:
                 print(f"[ADOBE_SERVICE] Ответ сервера: {e.response.text[:500]}", file=sys.stderr, flush=True)
             raise
 
-    def _upload_asset(self, access_token: str, pdf_bytes: bytes, filename: Optional[str] = None) -> str:
+    def _api_request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Выполнить авторизованный запрос к REST API.
+
+        Заголовки Authorization/X-API-Key подставляются из кэша токена. Если сервер
+        ответил 401, токен сбрасывается и запрос повторяется один раз с новым токеном.
+        """
+        extra_headers = kwargs.pop("headers", None) or {}
+        for attempt in range(2):
+            access_token = self._get_access_token()
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "X-API-Key": self._client_id,
+                "Content-Type": "application/json",
+                **extra_headers,
+            }
+            response = self._http_request(method, url, headers=headers, **kwargs)
+            if response.status_code != 401 or attempt == 1:
+                return response
+            response.close()
+            import sys
+            print(f"[ADOBE_SERVICE] ⚠️ 401 от {url}, обновляю access token и повторяю запрос", file=sys.stderr, flush=True)
+            self._invalidate_access_token(access_token)
+        return response
+
+    def _upload_asset(self, pdf_bytes: Union[bytes, memoryview], filename: Optional[str] = None) -> str:
         """
         Шаг 2: Загрузить PDF файл как asset и получить assetID.
+
+        pdf_bytes может быть memoryview над memory map файла: requests отправляет его
+        кусками без копирования в память.
         
         Returns:
             assetID для использования при создании job
         """
-        # Базовый URL для API
-        if self._region.upper() == "EU":
-            base_url = "https://pdf-services-eu.adobe.io"
-        else:
-            base_url = "https://pdf-services.adobe.io"
-        
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "X-API-Key": self._client_id,
-            "Content-Type": "application/json"
-        }
+        base_url = self._api_base_url()
         
         # Шаг 2.1: Получаем pre-signed URI для загрузки
         import sys
         print(f"[INFO] Получение pre-signed URI для загрузки PDF...", file=sys.stderr, flush=True)
-        response = requests.post(
+        # Повтор POST /assets безопасен: в худшем случае останется неиспользованный asset
+        response = self._api_request(
+            "POST",
             f"{base_url}/assets",
-            headers=headers,
+            idempotent=True,
             json={"mediaType": "application/pdf"},
             timeout=30
         )
@@ -211,7 +678,8 @@ class AdobePDFService:
         print(f"[INFO] Asset ID получен: {asset_id}. Загрузка файла...", file=sys.stderr, flush=True)
         
         # Шаг 2.2: Загружаем файл на S3 используя pre-signed URI
-        upload_response = requests.put(
+        upload_response = self._http_request(
+            "PUT",
             upload_uri,
             headers={"Content-Type": "application/pdf"},
             data=pdf_bytes,
@@ -222,7 +690,53 @@ class AdobePDFService:
         print(f"[INFO] Файл успешно загружен", file=sys.stderr, flush=True)
         return asset_id
 
+    def _spool_response(self, response: requests.Response) -> IO[bytes]:
+        """Потоково записать тело ответа во временный файл и вернуть его (позиция 0)."""
+        result_file = spooled_result_file()
+        try:
+            for chunk in response.iter_content(chunk_size=_DOWNLOAD_CHUNK_SIZE):
+                result_file.write(chunk)
+        except BaseException:
+            result_file.close()
+            raise
+        finally:
+            response.close()
+        result_file.seek(0)
+        return result_file
+
     def convert_pdf_to_excel(self, pdf_bytes: bytes, filename: Optional[str] = None) -> bytes:
+        """
+        Конвертировать PDF в Excel (XLSX) и вернуть байты результата.
+
+        Args:
+            pdf_bytes: Байты PDF файла
+            filename: Имя файла (опционально, для логирования)
+
+        Returns:
+            Байты Excel файла (XLSX)
+        """
+        with self.convert_pdf_to_excel_file(pdf_bytes, filename) as result_file:
+            return result_file.read()
+
+    def convert_pdf_to_excel_file(self, pdf: PDFSource, filename: Optional[str] = None) -> IO[bytes]:
+        """
+        Конвертировать PDF в Excel (XLSX) с потоковой загрузкой и скачиванием.
+
+        PDF загружается из байтов или из открытого файла (через memory map), результат
+        скачивается кусками во временный файл, который держится в памяти только пока
+        он меньше ADOBE_SPOOL_MAX_MB.
+
+        Args:
+            pdf: Байты PDF файла или открытый бинарный файл
+            filename: Имя файла (опционально, для логирования)
+
+        Returns:
+            Временный файл с XLSX (позиция в начале); закрыть его должен вызывающий код
+        """
+        with pdf_buffer(pdf) as buffer:
+            return self._convert_buffer(buffer, filename)
+
+    def _convert_buffer(self, pdf_bytes: Union[bytes, memoryview], filename: Optional[str] = None) -> IO[bytes]:
         """
         Конвертировать PDF в Excel (XLSX) через REST API по официальной документации.
 
@@ -234,11 +748,11 @@ class AdobePDFService:
         5. Скачать результат
 
         Args:
-            pdf_bytes: Байты PDF файла
+            pdf_bytes: Байты PDF файла (или memoryview над ними)
             filename: Имя файла (опционально, для логирования)
 
         Returns:
-            Байты Excel файла (XLSX)
+            Временный файл с XLSX
 
         Raises:
             Exception: Ошибка API Adobe
@@ -246,98 +760,109 @@ class AdobePDFService:
         if not self._client_id or not self._client_secret:
             raise ValueError("Client ID и Client Secret обязательны для использования REST API")
 
-        # Шаг 1: Получаем access token
+        # Шаг 1: Получаем access token (из кэша, если он еще действителен)
         import sys
         print(f"[INFO] Получение access token...", file=sys.stderr, flush=True)
-        access_token = self._get_access_token()
+        self._get_access_token()
         print(f"[INFO] Access token получен", file=sys.stderr, flush=True)
         
-        # Базовый URL для API
-        if self._region.upper() == "EU":
-            base_url = "https://pdf-services-eu.adobe.io"
+        export_url = f"{self._api_base_url()}/operation/exportpdf"
+        checkpoints = self._checkpoints
+        checkpoint_key = checkpoints.make_key(pdf_bytes, self._region) if checkpoints else None
+        checkpoint = checkpoints.load(checkpoint_key) if checkpoints else None
+
+        # Прошлая попытка конвертации этого PDF оборвалась во время ожидания: продолжаем ее job
+        if checkpoint and checkpoint.job_id:
+            print(f"[INFO] Найдена контрольная точка: продолжаю job {checkpoint.job_id} (создан {checkpoint.job_age():.0f} с назад)", file=sys.stderr, flush=True)
+            try:
+                result_file = self._wait_for_result(export_url, checkpoint.job_id, pdf_bytes, elapsed=checkpoint.job_age())
+            except (AdobeJobFailed, AdobeJobNotFound) as e:
+                print(f"[WARNING] Job из контрольной точки недоступен ({e}), начинаю конвертацию заново", file=sys.stderr, flush=True)
+                checkpoints.discard(checkpoint_key)
+                checkpoint = None
+            else:
+                checkpoints.discard(checkpoint_key)
+                return result_file
+
+        # Шаг 2: Загружаем PDF файл как asset (или берем уже загруженный из контрольной точки)
+        if checkpoint:
+            asset_id = checkpoint.asset_id
+            print(f"[INFO] Использую загруженный ранее asset {asset_id} из контрольной точки", file=sys.stderr, flush=True)
         else:
-            base_url = "https://pdf-services.adobe.io"
-        
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "X-API-Key": self._client_id,
-            "Content-Type": "application/json"
-        }
-        
-        # Шаг 2: Загружаем PDF файл как asset
-        asset_id = self._upload_asset(access_token, pdf_bytes, filename)
-        
+            with timed("adobe_upload", bytes=len(pdf_bytes)):
+                asset_id = self._upload_asset(pdf_bytes, filename)
+            checkpoint = ConversionCheckpoint(region=self.region, asset_id=asset_id, created_at=time.time())
+            if checkpoints:
+                checkpoints.save(checkpoint_key, checkpoint)
+
         # Шаг 3: Создаем job для экспорта PDF в Excel
+        try:
+            with timed("adobe_job_create"):
+                job_id = self._create_export_job(export_url, asset_id)
+        except AdobeServiceUnavailable:
+            raise
+        except Exception:
+            if checkpoints:
+                # asset из контрольной точки мог устареть - следующая попытка загрузит PDF заново
+                checkpoints.discard(checkpoint_key)
+            raise
+        if checkpoints:
+            checkpoint.job_id = job_id
+            checkpoint.job_created_at = time.time()
+            checkpoints.save(checkpoint_key, checkpoint)
+
+        # Шаги 4-5: Ждем завершения job и скачиваем результат
+        try:
+            result_file = self._wait_for_result(export_url, job_id, pdf_bytes)
+        except (AdobeJobFailed, AdobeJobNotFound):
+            if checkpoints:
+                checkpoints.discard(checkpoint_key)
+            raise
+        if checkpoints:
+            checkpoints.discard(checkpoint_key)
+        return result_file
+
+    def _create_export_job(self, export_url: str, asset_id: str) -> str:
+        """Шаг 3: создать job экспорта в XLSX, перебирая варианты payload. Возвращает job ID."""
         import sys
         print(f"[INFO] Создание job для экспорта PDF в Excel...", file=sys.stderr, flush=True)
-        export_url = f"{base_url}/operation/exportpdf"
-        
-        # Формируем payload для экспорта в Excel
-        # Попробуем упрощенный формат согласно примеру из документации
-        payload_variants = [
-            # Вариант 1: простой формат (согласно примеру)
-            {
-                "assetID": asset_id,
-                "targetFormat": "xlsx"
-            },
-            # Вариант 2: с cpf:engine
-            {
-                "assetID": asset_id,
-                "cpf:engine": {
-                    "assetRef": {
-                        "uri": "urn:adobe:pdfservices:pdf2excel:PDF2Excel"
-                    }
-                },
-                "targetFormat": "xlsx"
-            },
-            # Вариант 3: полный формат
-            {
-                "cpf:engine": {
-                    "assetRef": {
-                        "uri": "urn:adobe:pdfservices:pdf2excel:PDF2Excel"
-                    }
-                },
-                "cpf:inputs": {
-                    "params": {
-                        "cpf:inline": {
-                            "targetFormat": "xlsx"
-                        }
-                    },
-                    "documentIn": {
-                        "cpf:location": {
-                            "storageType": "external",
-                            "assetID": asset_id
-                        }
-                    }
-                }
-            }
-        ]
-        
         response = None
         last_error = None
         
-        # Пробуем разные варианты payload
-        import sys
-        for i, payload in enumerate(payload_variants, 1):
+        # Пробуем варианты payload: сначала тот, что уже срабатывал в этом регионе.
+        # К следующему варианту переходим только при ошибке схемы (400/415/422),
+        # при остальных ошибках другой формат запроса все равно не поможет.
+        payload_variants = build_export_payload_variants(asset_id)
+        for idx in self._export_variants.order(self._region, len(payload_variants)):
+            i = idx + 1
+            payload = payload_variants[idx]
             print(f"[DEBUG] Пробую вариант payload {i}: {payload}", file=sys.stderr, flush=True)
             try:
-                response = requests.post(
+                response = self._api_request(
+                    "POST",
                     export_url,
-                    headers=headers,
                     json=payload,
                     timeout=60
                 )
                 
                 if response.status_code in (200, 201):
                     print(f"[INFO] ✅ Payload вариант {i} сработал!", file=sys.stderr, flush=True)
+                    self._export_variants.remember(self._region, idx)
                     break
                 else:
                     error_text = response.text
                     print(f"[DEBUG] Вариант {i} failed: {response.status_code} - {error_text[:300]}", file=sys.stderr, flush=True)
                     last_error = error_text
+                    if not is_schema_error(response.status_code):
+                        break
+                    record_payload_fallback()
+            except AdobeServiceUnavailable:
+                raise
             except Exception as e:
                 print(f"[DEBUG] Вариант {i} exception: {e}", file=sys.stderr, flush=True)
                 last_error = str(e)
+                response = None
+                break
         
         if not response or response.status_code not in (200, 201):
             error_text = last_error or (response.text if response else "No response")
@@ -348,73 +873,61 @@ class AdobePDFService:
                 raise Exception(f"Не удалось создать job. Ошибка: {last_error}")
         
         # Получаем location из заголовка или job ID из тела ответа
-        import sys
         location = response.headers.get("Location")
-        job_id = None
-        
         print(f"[DEBUG] Response headers Location: {location}", file=sys.stderr, flush=True)
         print(f"[DEBUG] Response status: {response.status_code}", file=sys.stderr, flush=True)
+        job_id = extract_job_id(location, safe_json(response))
         
-        if location:
-            # Извлекаем job ID из location URL
-            # Location может быть: /operation/exportpdf/{job_id}/status
-            # или просто {job_id}
-            location_parts = location.strip("/").split("/")
-            print(f"[DEBUG] Location parts: {location_parts}", file=sys.stderr, flush=True)
-            
-            # Ищем job_id в location (обычно перед /status)
-            if "status" in location_parts:
-                status_idx = location_parts.index("status")
-                if status_idx > 0:
-                    job_id = location_parts[status_idx - 1]
-            else:
-                # Если нет /status, берем последний элемент
-                job_id = location_parts[-1]
-            
-            print(f"[DEBUG] Extracted job_id from Location: {job_id}", file=sys.stderr, flush=True)
-        
-        # Пробуем получить из тела ответа, если не получили из location
         if not job_id:
-            try:
-                job_data = response.json()
-                print(f"[DEBUG] Response body: {job_data}", file=sys.stderr, flush=True)
-                job_id = job_data.get("jobId") or job_data.get("id") or job_data.get("job_id")
-            except Exception as e:
-                print(f"[DEBUG] Could not parse response body: {e}", file=sys.stderr, flush=True)
-                pass
-        
-        if not job_id or job_id == "status":
-            # Пробуем извлечь из полного URL location через regex
-            if location:
-                # Если location содержит путь типа /operation/exportpdf/{job_id}/status
-                match = re.search(r'/exportpdf/([^/]+)/status', location)
-                if match:
-                    job_id = match.group(1)
-                    print(f"[DEBUG] Extracted job_id from regex: {job_id}", file=sys.stderr, flush=True)
-                else:
-                    # Пробуем другой паттерн
-                    match = re.search(r'/([a-f0-9\-]+)/status', location)
-                    if match:
-                        job_id = match.group(1)
-                        print(f"[DEBUG] Extracted job_id from regex pattern 2: {job_id}", file=sys.stderr, flush=True)
-        
-        if not job_id or job_id == "status":
             print(f"[ERROR] Полный ответ: Status={response.status_code}, Headers={dict(response.headers)}, Body={response.text[:500]}", file=sys.stderr, flush=True)
             raise Exception(f"Не удалось получить правильный job ID из ответа. Location: {location}, Status: {response.status_code}, Response: {response.text[:200]}")
         
         print(f"[INFO] Job создан: {job_id}. Ожидание завершения...", file=sys.stderr, flush=True)
-        
-        # Шаг 4: Проверяем статус job
-        status_url = f"{export_url}/{job_id}/status"
-        # Таймаут по умолчанию: 10 минут (600 секунд) для больших файлов
-        # Можно настроить через переменную окружения ADOBE_JOB_TIMEOUT (в секундах)
-        max_wait = int(os.getenv("ADOBE_JOB_TIMEOUT", "600"))  # 10 минут по умолчанию
-        start_time = time.time()
+        return job_id
+
+    def _wait_for_result(
+        self,
+        export_url: str,
+        job_id: str,
+        pdf_bytes: Union[bytes, memoryview],
+        elapsed: float = 0.0,
+    ) -> IO[bytes]:
+        """
+        Шаги 4-5: опрашивать статус job до завершения и скачать результат.
+
+        Args:
+            elapsed: Сколько секунд job уже выполняется (при продолжении по контрольной точке
+                первый опрос не откладывается на полную задержку)
+
+        Raises:
+            AdobeJobFailed: Adobe завершил job с ошибкой
+            AdobeJobNotFound: job неизвестен Adobe (устарел или удален)
+        """
         import sys
+        status_url = f"{export_url}/{job_id}/status"
+        max_wait = job_timeout_seconds()
+        deadline = time.monotonic() + max_wait
         print(f"[DEBUG] Максимальное время ожидания: {max_wait} секунд ({max_wait // 60} минут)", file=sys.stderr, flush=True)
+        schedule = self._polling.schedule(pdf_bytes)
+        delay = max(0.0, schedule.initial_delay() - elapsed)
+        started = time.monotonic()
+        polls = 0
+        print(f"[DEBUG] Первый опрос статуса через {delay:.1f} с (страниц: {schedule.page_count or 'неизвестно'})", file=sys.stderr, flush=True)
         
-        while time.time() - start_time < max_wait:
-            status_response = requests.get(status_url, headers=headers, timeout=10)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            status_response = self._api_request("GET", status_url, retry_on_throttle=False, timeout=10)
+            polls += 1
+            retry_after = parse_retry_after(status_response.headers)
+            if status_response.status_code == 429:
+                delay = schedule.next_delay(retry_after, throttled=True)
+                print(f"[WARNING] Adobe API вернул 429 на запрос статуса, следующий опрос через {delay:.1f} с", file=sys.stderr, flush=True)
+                continue
+            if status_response.status_code in (404, 410):
+                raise AdobeJobNotFound(f"Job {job_id} не найден (статус {status_response.status_code})")
             status_response.raise_for_status()
             status_data = status_response.json()
             
@@ -422,82 +935,51 @@ class AdobePDFService:
             print(f"[INFO] Статус job: {status}", file=sys.stderr, flush=True)
             
             if status == "done" or status == "success":
+                # Время от создания job (или продолжения по контрольной точке) до готовности
+                record_stage("adobe_processing", time.monotonic() - started, polls=polls)
+                record_job_polls(polls)
                 # Шаг 5: Скачиваем результат
                 print(f"[DEBUG] Полный ответ статуса: {status_data}", file=sys.stderr, flush=True)
-                
-                # Пробуем разные варианты ключей для downloadUri
-                # Сначала проверяем asset объект (это основной путь для Adobe API)
-                download_uri = None
-                if isinstance(status_data.get("asset"), dict):
-                    asset_obj = status_data.get("asset")
-                    download_uri = (
-                        asset_obj.get("downloadUri") or
-                        asset_obj.get("download_uri") or
-                        asset_obj.get("downloadURL") or
-                        asset_obj.get("download_url")
-                    )
-                
-                # Если не нашли в asset, проверяем корневой уровень
-                if not download_uri:
-                    if status_data.get("downloadUri"):
-                        download_uri = status_data.get("downloadUri")
-                    elif status_data.get("download_uri"):
-                        download_uri = status_data.get("download_uri")
-                    elif status_data.get("downloadURL"):
-                        download_uri = status_data.get("downloadURL")
-                    elif status_data.get("download_url"):
-                        download_uri = status_data.get("download_url")
-                
-                # Если не нашли, проверяем result объект
-                if not download_uri and isinstance(status_data.get("result"), dict):
-                    result_obj = status_data.get("result")
-                    download_uri = (
-                        result_obj.get("downloadUri") or
-                        result_obj.get("download_uri") or
-                        result_obj.get("downloadURL") or
-                        result_obj.get("download_url")
-                    )
+                download_uri = find_download_uri(status_data)
                 
                 # Если все еще нет, проверяем, может быть нужен отдельный запрос для получения результата
                 if not download_uri:
                     # Пробуем получить результат через другой endpoint
                     result_url = f"{export_url}/{job_id}/result"
-                    import sys
                     print(f"[DEBUG] Пробую получить результат через {result_url}", file=sys.stderr, flush=True)
                     try:
-                        result_response = requests.get(result_url, headers=headers, timeout=10)
-                        result_response.raise_for_status()
-                        # Если это redirect, используем Location
-                        if result_response.status_code in (301, 302, 303, 307, 308):
-                            download_uri = result_response.headers.get("Location")
-                            print(f"[DEBUG] Redirect на: {download_uri}", file=sys.stderr, flush=True)
-                        elif result_response.headers.get("Content-Type", "").startswith("application/vnd.openxmlformats"):
-                            # Прямой ответ с файлом
-                            print(f"[INFO] Результат получен напрямую, размер: {len(result_response.content)} байт", file=sys.stderr, flush=True)
-                            return result_response.content
+                        with self._api_request("GET", result_url, timeout=10, stream=True) as result_response:
+                            result_response.raise_for_status()
+                            # Если это redirect, используем Location
+                            if result_response.status_code in (301, 302, 303, 307, 308):
+                                download_uri = result_response.headers.get("Location")
+                                print(f"[DEBUG] Redirect на: {download_uri}", file=sys.stderr, flush=True)
+                            elif result_response.headers.get("Content-Type", "").startswith(XLSX_MEDIA_TYPE):
+                                # Прямой ответ с файлом
+                                with timed("adobe_download") as download:
+                                    result_file = self._spool_response(result_response)
+                                    download["bytes"] = file_size(result_file)
+                                print(f"[INFO] Результат получен напрямую, размер: {file_size(result_file)} байт", file=sys.stderr, flush=True)
+                                return result_file
                     except Exception as e:
                         print(f"[DEBUG] Не удалось получить результат через result endpoint: {e}", file=sys.stderr, flush=True)
                 
                 if download_uri:
-                    import sys
                     print(f"[INFO] Скачивание результата с URI: {download_uri}", file=sys.stderr, flush=True)
-                    result_response = requests.get(download_uri, timeout=60)
-                    result_response.raise_for_status()
-                    print(f"[INFO] Результат получен, размер: {len(result_response.content)} байт", file=sys.stderr, flush=True)
-                    return result_response.content
+                    with timed("adobe_download") as download:
+                        with self._http_request("GET", download_uri, timeout=60, stream=True) as result_response:
+                            result_response.raise_for_status()
+                            result_file = self._spool_response(result_response)
+                        download["bytes"] = file_size(result_file)
+                    print(f"[INFO] Результат получен, размер: {file_size(result_file)} байт", file=sys.stderr, flush=True)
+                    return result_file
                 else:
-                    import sys
                     print(f"[ERROR] downloadUri не найден. Полный ответ: {status_data}", file=sys.stderr, flush=True)
                     raise Exception(f"downloadUri не найден в ответе статуса. Доступные ключи: {list(status_data.keys())}")
             elif status == "failed" or status == "error":
-                error_info = status_data.get("error", {})
-                if isinstance(error_info, dict):
-                    error_msg = error_info.get("message", str(error_info))
-                else:
-                    error_msg = str(error_info)
-                raise Exception(f"Adobe API job failed: {error_msg}")
+                raise AdobeJobFailed(f"Adobe API job failed: {job_error_message(status_data)}")
             
-            time.sleep(2)
+            delay = schedule.next_delay(retry_after)
         
         raise Exception("Adobe API job timeout (превышено время ожидания)")
 
@@ -0,0 +1,480 @@
+"""Асинхронный (asyncio) клиент Adobe PDF Services REST API для конвертации PDF в Excel."""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import time
+from typing import IO, AsyncIterator, Optional, Union
+
+import httpx
+
+from .adobe_pdf_service import (
+    AdobeJobFailed,
+    AdobeJobNotFound,
+    PDFSource,
+    XLSX_MEDIA_TYPE,
+    api_base_url,
+    safe_json,
+    build_export_payload_variants,
+    extract_job_id,
+    file_size,
+    find_download_uri,
+    job_error_message,
+    job_timeout_seconds,
+    pdf_buffer,
+    spooled_result_file,
+    token_url,
+)
+from .checkpoints import CheckpointStore, ConversionCheckpoint
+from .export_variants import get_variant_registry, is_schema_error
+from .metrics import record_adobe_request, record_job_polls, record_payload_fallback
+from .resilience import TRANSIENT_STATUSES, AdobeServiceUnavailable, RetryPolicy, get_circuit_breaker
+from .polling import PollingStrategy, parse_retry_after
+from .timings import record_stage, timed
+
+
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def _iter_chunks(buffer: memoryview) -> AsyncIterator[bytes]:
+    """Отдавать буфер кусками, чтобы не копировать весь PDF в память при загрузке."""
+    for offset in range(0, len(buffer), _UPLOAD_CHUNK_SIZE):
+        yield bytes(buffer[offset:offset + _UPLOAD_CHUNK_SIZE])
+
+
+class AsyncAdobePDFService:
+    """
+    Asyncio-аналог AdobePDFService.
+
+    Все сетевые операции (token, загрузка asset, создание job, polling статуса и
+    скачивание результата) не блокируют event loop, поэтому один воркер uvicorn может
+    одновременно держать в работе десятки конвертаций, пока Adobe обрабатывает файлы.
+    """
+
+    def __init__(
+        self,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        region: Optional[str] = None,
+        connect_timeout: Optional[int] = None,
+        read_timeout: Optional[int] = None,
+        polling: Optional[PollingStrategy] = None,
+        base_url: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ) -> None:
+        """
+        Инициализация асинхронного клиента.
+
+        Args:
+            client_id: Adobe Client ID (или берется из переменной окружения ADOBE_CLIENT_ID)
+            client_secret: Adobe Client Secret (или берется из переменной окружения ADOBE_CLIENT_SECRET)
+            region: Регион обработки ('US' или 'EU', по умолчанию 'US')
+            connect_timeout: Таймаут подключения в миллисекундах (по умолчанию 4000)
+            read_timeout: Таймаут чтения в миллисекундах (по умолчанию 10000)
+            polling: Стратегия опроса статуса job (по умолчанию из переменных ADOBE_POLL_*)
+            base_url: Адрес REST API вместо Adobe (или переменная ADOBE_BASE_URL)
+            retry_policy: Политика повторов отдельных запросов (по умолчанию из ADOBE_HTTP_*)
+        """
+        self._client_id = client_id or os.getenv("ADOBE_CLIENT_ID")
+        self._client_secret = client_secret or os.getenv("ADOBE_CLIENT_SECRET")
+        self._region = region or os.getenv("ADOBE_REGION", "US")
+        self._connect_timeout = connect_timeout or int(os.getenv("ADOBE_CONNECT_TIMEOUT", "4000"))
+        self._read_timeout = read_timeout or int(os.getenv("ADOBE_READ_TIMEOUT", "10000"))
+        self._base_url = base_url
+
+        if not self._client_id or not self._client_secret:
+            raise ValueError("Client ID и Client Secret обязательны для использования REST API")
+
+        self._token_refresh_margin = int(os.getenv("ADOBE_TOKEN_REFRESH_MARGIN", "300"))
+        self._access_token: Optional[str] = None
+        self._access_token_expires_at = 0.0
+        self._token_lock: Optional[asyncio.Lock] = None
+
+        # httpx держит пул keep-alive соединений на каждый хост внутри одного клиента
+        pool_size = int(os.getenv("ADOBE_HTTP_POOL_SIZE", "10"))
+        self._limits = httpx.Limits(max_connections=None, max_keepalive_connections=pool_size)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._polling = polling or PollingStrategy.from_env()
+        self._export_variants = get_variant_registry()
+        # Breaker общий с синхронным клиентом: сбой Adobe виден всем запросам процесса
+        self._retry_policy = retry_policy or RetryPolicy.from_env()
+        self._breaker = get_circuit_breaker(self._api_base_url())
+        self._checkpoints = CheckpointStore.from_env()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Получить или создать httpx.AsyncClient (создается внутри работающего event loop)."""
+        if self._client is None:
+            timeout = httpx.Timeout(
+                self._read_timeout / 1000,
+                connect=self._connect_timeout / 1000,
+            )
+            self._client = httpx.AsyncClient(limits=self._limits, timeout=timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Закрыть пул соединений."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "AsyncAdobePDFService":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def _api_base_url(self) -> str:
+        """Базовый URL REST API с учетом региона."""
+        return api_base_url(self._region, self._base_url)
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        retry_on_throttle: bool = True,
+        stream: bool = False,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Выполнить запрос с повторами по RetryPolicy (аналог AdobePDFService._http_request).
+
+        content может быть фабрикой (callable): потоковое тело нельзя отправить дважды,
+        поэтому для каждой попытки создается новое. При stream=True ответ закрывает
+        вызывающий код.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in {"GET", "HEAD", "PUT"}
+        policy = self._retry_policy
+        client = self._get_client()
+        content = kwargs.pop("content", None)
+        attempt = 0
+        while True:
+            last_attempt = attempt + 1 >= policy.attempts
+            self._breaker.before_call()
+            body = content() if callable(content) else content
+            request = client.build_request(method, url, content=body, **kwargs)
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                record_adobe_request(method, url, "error")
+                # ConnectError/ConnectTimeout - запрос не ушел, его безопасно повторить всегда
+                not_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if last_attempt or not (idempotent or not_sent):
+                    self._breaker.record_failure()
+                    raise
+                delay = policy.delay(attempt)
+                print(f"[ADOBE_ASYNC] ⚠️ {method} {url}: {e.__class__.__name__}, повтор {attempt + 1}/{policy.attempts - 1} через {delay:.1f} с", file=sys.stderr, flush=True)
+            else:
+                record_adobe_request(method, url, response.status_code)
+                if last_attempt or not policy.should_retry_status(response.status_code, idempotent, retry_on_throttle):
+                    if response.status_code in TRANSIENT_STATUSES:
+                        self._breaker.record_failure()
+                    else:
+                        self._breaker.record_success()
+                    return response
+                delay = policy.delay(attempt, parse_retry_after(response.headers))
+                print(f"[ADOBE_ASYNC] ⚠️ {method} {url}: статус {response.status_code}, повтор {attempt + 1}/{policy.attempts - 1} через {delay:.1f} с", file=sys.stderr, flush=True)
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _get_access_token(self) -> str:
+        """Получить access token из кэша или запросить новый (single-flight через asyncio.Lock)."""
+        token = self._access_token
+        if token and time.monotonic() < self._access_token_expires_at:
+            return token
+
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            token = self._access_token
+            if token and time.monotonic() < self._access_token_expires_at:
+                return token
+
+            url = token_url(self._base_url)
+            print(f"[ADOBE_ASYNC] Запрос access token с {url}...", file=sys.stderr, flush=True)
+            with timed("adobe_token"):
+                response = await self._send(
+                    "POST",
+                    url,
+                    idempotent=True,
+                    data={"client_id": self._client_id, "client_secret": self._client_secret},
+                    timeout=10,
+                )
+            print(f"[ADOBE_ASYNC] Ответ на запрос token: статус {response.status_code}", file=sys.stderr, flush=True)
+            response.raise_for_status()
+            token_data = response.json()
+            expires_in = int(token_data.get("expires_in") or 86399)
+            margin = min(self._token_refresh_margin, expires_in // 2)
+            self._access_token = token_data["access_token"]
+            self._access_token_expires_at = time.monotonic() + expires_in - margin
+            return self._access_token
+
+    async def _api_request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Авторизованный запрос к REST API с одним повтором после 401."""
+        extra_headers = kwargs.pop("headers", None) or {}
+        for attempt in range(2):
+            access_token = await self._get_access_token()
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "X-API-Key": self._client_id,
+                "Content-Type": "application/json",
+                **extra_headers,
+            }
+            response = await self._send(method, url, headers=headers, **kwargs)
+            if response.status_code != 401 or attempt == 1:
+                return response
+            await response.aclose()
+            print(f"[ADOBE_ASYNC] ⚠️ 401 от {url}, обновляю access token и повторяю запрос", file=sys.stderr, flush=True)
+            if self._access_token == access_token:
+                self._access_token = None
+                self._access_token_expires_at = 0.0
+        return response
+
+    async def _upload_asset(self, pdf_bytes: Union[bytes, memoryview]) -> str:
+        """Загрузить PDF как asset и получить assetID (memoryview отправляется кусками)."""
+        response = await self._api_request(
+            "POST",
+            f"{self._api_base_url()}/assets",
+            idempotent=True,
+            json={"mediaType": "application/pdf"},
+            timeout=30,
+        )
+        response.raise_for_status()
+        asset_data = response.json()
+
+        upload_uri = asset_data.get("uploadUri")
+        asset_id = asset_data.get("assetID")
+        if not upload_uri or not asset_id:
+            raise Exception(f"Не удалось получить uploadUri или assetID: {asset_data}")
+
+        # Pre-signed URL требует Content-Length, поэтому задаем его явно и для потоковой загрузки
+        if isinstance(pdf_bytes, bytes):
+            content = pdf_bytes
+        else:
+            content = lambda: _iter_chunks(memoryview(pdf_bytes))  # noqa: E731 - новый поток на каждую попытку
+        upload_response = await self._send(
+            "PUT",
+            upload_uri,
+            headers={"Content-Type": "application/pdf", "Content-Length": str(len(pdf_bytes))},
+            content=content,
+            timeout=60,
+        )
+        upload_response.raise_for_status()
+        print(f"[ADOBE_ASYNC] Asset {asset_id} загружен", file=sys.stderr, flush=True)
+        return asset_id
+
+    async def _create_export_job(self, export_url: str, asset_id: str) -> str:
+        """Создать job экспорта в XLSX, перебирая варианты payload. Возвращает job ID."""
+        response: Optional[httpx.Response] = None
+        last_error = None
+        payload_variants = build_export_payload_variants(asset_id)
+        for idx in self._export_variants.order(self._region, len(payload_variants)):
+            try:
+                response = await self._api_request("POST", export_url, json=payload_variants[idx], timeout=60)
+            except AdobeServiceUnavailable:
+                raise
+            except httpx.HTTPError as e:
+                print(f"[ADOBE_ASYNC] Вариант payload {idx + 1} exception: {e}", file=sys.stderr, flush=True)
+                last_error = str(e)
+                response = None
+                break
+            if response.status_code in (200, 201):
+                # remember может перезаписать файл состояния
+                await asyncio.to_thread(self._export_variants.remember, self._region, idx)
+                break
+            print(f"[ADOBE_ASYNC] Вариант payload {idx + 1} failed: {response.status_code} - {response.text[:300]}", file=sys.stderr, flush=True)
+            last_error = response.text
+            # Следующий вариант пробуем только при ошибке схемы payload
+            if not is_schema_error(response.status_code):
+                break
+            record_payload_fallback()
+
+        if response is None:
+            raise Exception(f"Не удалось создать job. Ошибка: {last_error}")
+        if response.status_code not in (200, 201):
+            response.raise_for_status()
+
+        location = response.headers.get("Location")
+        job_id = extract_job_id(location, safe_json(response))
+        if not job_id:
+            raise Exception(f"Не удалось получить правильный job ID из ответа. Location: {location}, Status: {response.status_code}, Response: {response.text[:200]}")
+        return job_id
+
+    async def _spool_response(self, response: httpx.Response) -> IO[bytes]:
+        """Потоково записать тело ответа во временный файл (позиция 0)."""
+        result_file = spooled_result_file()
+        try:
+            async for chunk in response.aiter_bytes():
+                result_file.write(chunk)
+        except BaseException:
+            result_file.close()
+            raise
+        result_file.seek(0)
+        return result_file
+
+    async def _download(self, url: str) -> IO[bytes]:
+        """Скачать результат конвертации по pre-signed ссылке во временный файл."""
+        with timed("adobe_download") as download:
+            response = await self._send("GET", url, stream=True, timeout=60)
+            try:
+                response.raise_for_status()
+                result_file = await self._spool_response(response)
+            finally:
+                await response.aclose()
+            download["bytes"] = file_size(result_file)
+        print(f"[ADOBE_ASYNC] Результат получен, размер: {result_file.seek(0, 2)} байт", file=sys.stderr, flush=True)
+        result_file.seek(0)
+        return result_file
+
+    async def convert_pdf_to_excel(self, pdf_bytes: bytes, filename: Optional[str] = None) -> bytes:
+        """
+        Конвертировать PDF в Excel (XLSX), не блокируя event loop.
+
+        Контракт совпадает с AdobePDFService.convert_pdf_to_excel.
+
+        Args:
+            pdf_bytes: Байты PDF файла
+            filename: Имя файла (опционально, для логирования)
+
+        Returns:
+            Байты Excel файла (XLSX)
+        """
+        with await self.convert_pdf_to_excel_file(pdf_bytes, filename) as result_file:
+            return result_file.read()
+
+    async def convert_pdf_to_excel_file(self, pdf: PDFSource, filename: Optional[str] = None) -> IO[bytes]:
+        """
+        Конвертировать PDF (байты или открытый файл) в XLSX во временном файле.
+
+        Контракт совпадает с AdobePDFService.convert_pdf_to_excel_file.
+        """
+        with pdf_buffer(pdf) as buffer:
+            return await self._convert_buffer(buffer, filename)
+
+    async def _convert_buffer(self, pdf_bytes: Union[bytes, memoryview], filename: Optional[str]) -> IO[bytes]:
+        """Полный цикл конвертации: asset, job, polling статуса, скачивание результата."""
+        print(f"[ADOBE_ASYNC] Конвертация {filename or 'файла'} ({len(pdf_bytes)} байт)...", file=sys.stderr, flush=True)
+        export_url = f"{self._api_base_url()}/operation/exportpdf"
+        checkpoints = self._checkpoints
+        # Хэш всего PDF и файлы контрольных точек - блокирующая работа, она идет в потоке,
+        # чтобы не задерживать event loop для остальных конвертаций
+        checkpoint_key = await asyncio.to_thread(checkpoints.make_key, pdf_bytes, self._region) if checkpoints else None
+        checkpoint = await asyncio.to_thread(checkpoints.load, checkpoint_key) if checkpoints else None
+
+        # Прошлая попытка конвертации этого PDF оборвалась во время ожидания: продолжаем ее job
+        if checkpoint and checkpoint.job_id:
+            print(f"[ADOBE_ASYNC] Продолжаю job {checkpoint.job_id} из контрольной точки", file=sys.stderr, flush=True)
+            try:
+                result_file = await self._wait_for_result(export_url, checkpoint.job_id, pdf_bytes, elapsed=checkpoint.job_age())
+            except (AdobeJobFailed, AdobeJobNotFound) as e:
+                print(f"[ADOBE_ASYNC] Job из контрольной точки недоступен ({e}), начинаю заново", file=sys.stderr, flush=True)
+                await asyncio.to_thread(checkpoints.discard, checkpoint_key)
+                checkpoint = None
+            else:
+                await asyncio.to_thread(checkpoints.discard, checkpoint_key)
+                return result_file
+
+        if checkpoint:
+            asset_id = checkpoint.asset_id
+        else:
+            with timed("adobe_upload", bytes=len(pdf_bytes)):
+                asset_id = await self._upload_asset(pdf_bytes)
+            checkpoint = ConversionCheckpoint(region=self._region.upper(), asset_id=asset_id, created_at=time.time())
+            if checkpoints:
+                await asyncio.to_thread(checkpoints.save, checkpoint_key, checkpoint)
+
+        try:
+            with timed("adobe_job_create"):
+                job_id = await self._create_export_job(export_url, asset_id)
+        except AdobeServiceUnavailable:
+            raise
+        except Exception:
+            if checkpoints:
+                # asset из контрольной точки мог устареть - следующая попытка загрузит PDF заново
+                await asyncio.to_thread(checkpoints.discard, checkpoint_key)
+            raise
+        print(f"[ADOBE_ASYNC] Job создан: {job_id}. Ожидание завершения...", file=sys.stderr, flush=True)
+        if checkpoints:
+            checkpoint.job_id = job_id
+            checkpoint.job_created_at = time.time()
+            await asyncio.to_thread(checkpoints.save, checkpoint_key, checkpoint)
+
+        try:
+            result_file = await self._wait_for_result(export_url, job_id, pdf_bytes)
+        except (AdobeJobFailed, AdobeJobNotFound):
+            if checkpoints:
+                await asyncio.to_thread(checkpoints.discard, checkpoint_key)
+            raise
+        if checkpoints:
+            await asyncio.to_thread(checkpoints.discard, checkpoint_key)
+        return result_file
+
+    async def _wait_for_result(
+        self,
+        export_url: str,
+        job_id: str,
+        pdf_bytes: Union[bytes, memoryview],
+        elapsed: float = 0.0,
+    ) -> IO[bytes]:
+        """Опрашивать статус job до завершения и скачать результат (elapsed - сколько job уже идет)."""
+        status_url = f"{export_url}/{job_id}/status"
+        deadline = time.monotonic() + job_timeout_seconds()
+        # Оценка числа страниц - регулярное выражение по всему PDF, тоже вне event loop
+        schedule = await asyncio.to_thread(self._polling.schedule, pdf_bytes)
+        delay = max(0.0, schedule.initial_delay() - elapsed)
+        started = time.monotonic()
+        polls = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(delay, remaining))
+            status_response = await self._api_request("GET", status_url, retry_on_throttle=False, timeout=10)
+            polls += 1
+            retry_after = parse_retry_after(status_response.headers)
+            if status_response.status_code == 429:
+                delay = schedule.next_delay(retry_after, throttled=True)
+                continue
+            if status_response.status_code in (404, 410):
+                raise AdobeJobNotFound(f"Job {job_id} не найден (статус {status_response.status_code})")
+            status_response.raise_for_status()
+            status_data = status_response.json()
+            status = status_data.get("status", "unknown")
+
+            if status in ("done", "success"):
+                record_stage("adobe_processing", time.monotonic() - started, polls=polls)
+                record_job_polls(polls)
+                download_uri = find_download_uri(status_data)
+                if download_uri:
+                    return await self._download(download_uri)
+
+                # Результат может отдаваться отдельным endpoint (redirect или сразу файл)
+                result_response = await self._api_request(
+                    "GET", f"{export_url}/{job_id}/result", timeout=10, stream=True
+                )
+                try:
+                    redirect_uri = result_response.headers.get("Location") if result_response.is_redirect else None
+                    if not redirect_uri:
+                        result_response.raise_for_status()
+                        if result_response.headers.get("Content-Type", "").startswith(XLSX_MEDIA_TYPE):
+                            with timed("adobe_download") as download:
+                                result_file = await self._spool_response(result_response)
+                                download["bytes"] = file_size(result_file)
+                            return result_file
+                finally:
+                    await result_response.aclose()
+                if redirect_uri:
+                    return await self._download(redirect_uri)
+                raise Exception(f"downloadUri не найден в ответе статуса. Доступные ключи: {list(status_data.keys())}")
+            if status in ("failed", "error"):
+                raise AdobeJobFailed(f"Adobe API job failed: {job_error_message(status_data)}")
+
+            delay = schedule.next_delay(retry_after)
+
+        raise Exception("Adobe API job timeout (превышено время ожидания)")
+
+
+__all__ = ["AsyncAdobePDFService"]
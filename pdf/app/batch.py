@@ -0,0 +1,81 @@
+"""Параллельная обработка пачки PDF с ограничением числа одновременных конвертаций."""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def batch_concurrency(default: int = 4) -> int:
+    """Сколько файлов обрабатывать одновременно (PDF_BATCH_CONCURRENCY, минимум 1)."""
+    return max(1, int(os.getenv("PDF_BATCH_CONCURRENCY", str(default))))
+
+
+def run_batch(
+    func: Callable[[T], R],
+    items: Sequence[T],
+    max_in_flight: Optional[int] = None,
+) -> List[R]:
+    """
+    Выполнить func для каждого элемента, держа в работе до max_in_flight штук.
+
+    Пока Adobe обрабатывает один файл, следующий уже загружается, а готовый XLSX
+    разбирается сразу в том же потоке, не дожидаясь остальных. Результаты
+    возвращаются в порядке входных элементов; исключения func пробрасываются,
+    поэтому ошибки отдельных файлов func должна обрабатывать сама. После первой
+    ошибки еще не начатые вызовы отменяются, а выход ждет только уже выполняющиеся.
+    Каждый вызов выполняется в копии контекста вызывающего потока (как asyncio.to_thread).
+    """
+    if not items:
+        return []
+    workers = min(max_in_flight or batch_concurrency(), len(items))
+    if workers == 1:
+        return [func(item) for item in items]
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-batch")
+    try:
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        if pending:
+            # Какой-то вызов упал: пробрасываем первую по порядку ошибку, не дожидаясь очереди
+            for future in futures:
+                if future.done() and not future.cancelled() and future.exception() is not None:
+                    raise future.exception()
+        return [future.result() for future in futures]
+    finally:
+        # При ошибке (или KeyboardInterrupt) очередь отменяется; без ошибки все уже завершено
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def run_batch_async(
+    func: Callable[[T], Awaitable[R]],
+    items: Sequence[T],
+    max_in_flight: Optional[int] = None,
+) -> List[R]:
+    """
+    Asyncio-вариант run_batch: одновременно выполняется не больше max_in_flight корутин.
+
+    Как и в run_batch, к моменту выхода с исключением ни один вызов func уже не
+    выполняется: оставшиеся отменяются и дожидаются.
+    """
+    semaphore = asyncio.Semaphore(max_in_flight or batch_concurrency())
+
+    async def limited(item: T) -> R:
+        async with semaphore:
+            return await func(item)
+
+    tasks = [asyncio.ensure_future(limited(item)) for item in items]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+__all__ = ["batch_concurrency", "run_batch", "run_batch_async"]
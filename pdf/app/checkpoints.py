@@ -0,0 +1,109 @@
+"""Контрольные точки конвертации: asset/job Adobe по хэшу PDF для продолжения после перезапуска."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional, Union
+
+from .conversion_cache import pdf_digest
+
+
+@dataclass
+class ConversionCheckpoint:
+    """Состояние незавершенной конвертации одного PDF."""
+
+    region: str
+    asset_id: str
+    created_at: float
+    job_id: Optional[str] = None
+    job_created_at: Optional[float] = None
+
+    def job_age(self) -> float:
+        """Сколько секунд назад создан job (0, если job еще не создан)."""
+        return max(0.0, time.time() - self.job_created_at) if self.job_created_at else 0.0
+
+
+class CheckpointStore:
+    """
+    Небольшие JSON файлы с asset ID и job ID, ключ - SHA-256 PDF и регион.
+
+    Если процесс CLI или воркер умер во время ожидания Adobe, следующая попытка
+    конвертировать тот же PDF продолжает опрос существующего job (или скачивает уже
+    готовый результат) вместо новой загрузки и нового job. Записи старше ttl
+    игнорируются: загруженные asset и результаты job у Adobe живут ограниченное время.
+    """
+
+    def __init__(self, directory: str, ttl: float) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["CheckpointStore"]:
+        """
+        Создать хранилище из переменных окружения.
+
+        ADOBE_CHECKPOINTS=0 отключает контрольные точки, ADOBE_CHECKPOINT_DIR задает
+        каталог, ADOBE_CHECKPOINT_TTL - срок годности записи в секундах.
+        """
+        if os.getenv("ADOBE_CHECKPOINTS", "1").lower() in {"0", "false", "no", "off"}:
+            return None
+        directory = os.getenv("ADOBE_CHECKPOINT_DIR") or os.path.join(tempfile.gettempdir(), "adobe_checkpoints")
+        ttl = float(os.getenv("ADOBE_CHECKPOINT_TTL", "3600"))
+        try:
+            return cls(directory, ttl)
+        except OSError as e:
+            print(f"[WARNING] Контрольные точки конвертации отключены, каталог {directory} недоступен: {e}", file=sys.stderr, flush=True)
+            return None
+
+    @staticmethod
+    def make_key(pdf_bytes: Union[bytes, memoryview], region: str) -> str:
+        """Ключ: хэш содержимого PDF и регион Adobe (как у кэша конвертаций)."""
+        return f"{pdf_digest(pdf_bytes)}-{region.upper()}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> Optional[ConversionCheckpoint]:
+        """Прочитать действующую контрольную точку или None (просроченная удаляется)."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as checkpoint_file:
+                checkpoint = ConversionCheckpoint(**json.load(checkpoint_file))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[WARNING] Поврежденная контрольная точка {path}: {e}", file=sys.stderr, flush=True)
+            self.discard(key)
+            return None
+        if time.time() - checkpoint.created_at > self.ttl:
+            self.discard(key)
+            return None
+        return checkpoint
+
+    def save(self, key: str, checkpoint: ConversionCheckpoint) -> None:
+        """Атомарно записать контрольную точку (ошибки записи не прерывают конвертацию)."""
+        path = self._path(key)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".checkpoint_", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+                json.dump(asdict(checkpoint), tmp)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARNING] Не удалось записать контрольную точку {path}: {e}", file=sys.stderr, flush=True)
+
+    def discard(self, key: str) -> None:
+        """Удалить контрольную точку (конвертация завершена или job больше не существует)."""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[WARNING] Не удалось удалить контрольную точку {key}: {e}", file=sys.stderr, flush=True)
+
+
+__all__ = ["CheckpointStore", "ConversionCheckpoint"]
@@ -2,12 +2,17 @@ from __future__ import annotations
 
 import argparse
 import json
+import sys
 from pathlib import Path
+from typing import List, Optional, Tuple
 import base64
 
 import pandas as pd
 
+from .batch import run_batch
+from .converters import BACKEND_CHOICES
 from .pdf_processor import PDFStatementProcessor, merge_tables
+from .triage import PDFRejected
 
 
 def parse_args() -> argparse.Namespace:
@@ -15,12 +20,73 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("inputs", nargs="+", type=Path, help="Path(s) to PDF files")
     parser.add_argument("--output", "-o", type=Path, help="Optional path to save the filtered data (CSV or Excel)")
     parser.add_argument("--json", action="store_true", help="Print JSON to stdout instead of tabular view")
-    return parser.parse_args()
+    parser.add_argument(
+        "--concurrency",
+        "-j",
+        type=int,
+        default=None,
+        help="How many files to convert in parallel (default: PDF_BATCH_CONCURRENCY or 4)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKEND_CHOICES,
+        default=None,
+        help="PDF to XLSX converter: Adobe PDF Services API, local pdfplumber, or auto (chosen by PDF triage) "
+        "(default: PDF_CONVERTER_BACKEND or adobe)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print NDJSON as rows are read: a metadata line per file, then a line per transaction "
+        "(files are processed one by one, memory does not grow with statement length)",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Add per-stage timings (Adobe token, upload, job, download, workbook parsing, filtering) "
+        "to each document",
+    )
+    args = parser.parse_args()
+    if args.stream and args.output:
+        parser.error("--stream cannot be combined with --output")
+    if args.stream and args.timings:
+        parser.error("--stream cannot be combined with --timings")
+    return args
+
+
+def _print_json_line(record: dict) -> None:
+    print(json.dumps(record, ensure_ascii=False), flush=True)
+
+
+def stream_documents(processor: PDFStatementProcessor, inputs: List[Path], backend: Optional[str]) -> None:
+    """
+    Вывести результат в stdout в формате NDJSON по мере чтения выписок.
+
+    Для каждого файла сначала строка {"source_file", "metadata"}, затем по строке
+    {"source_file", "transaction"} на каждую транзакцию; при ошибке - строка с "error".
+    Транзакции не накапливаются: каждая выводится сразу после фильтрации своего окна строк.
+    """
+    for idx, path in enumerate(inputs, 1):
+        print(f"\n[CLI] ========== Потоковая обработка файла {idx}/{len(inputs)}: {path.name} ==========", file=sys.stderr, flush=True)
+        try:
+            with path.open("rb") as pdf_file:
+                stream = processor.extract_stream(pdf_file, bank_name=path.name, backend=backend)
+            _print_json_line({"source_file": path.name, "metadata": stream.metadata})
+            count = 0
+            for transaction in stream.transactions:
+                _print_json_line({"source_file": path.name, "transaction": transaction})
+                count += 1
+            print(f"[CLI] Извлечено транзакций: {count}", file=sys.stderr, flush=True)
+        except PDFRejected as e:
+            print(f"[CLI] ⚠️ Файл {path.name} отклонен предварительной проверкой: {e.report.reason}", file=sys.stderr, flush=True)
+            _print_json_line({"source_file": path.name, "metadata": {"triage": e.report.to_metadata()}, "error": str(e)})
+        except Exception as e:
+            print(f"[CLI] ❌ Ошибка при обработке файла {path.name}: {e}", file=sys.stderr, flush=True)
+            _print_json_line({"source_file": path.name, "metadata": {}, "error": str(e)})
 
 
 def main() -> None:
     import os
-    import sys
     
     args = parse_args()
     
@@ -43,7 +109,7 @@ def main() -> None:
     # Инициализируем процессор
     print(f"[CLI] Инициализация PDFStatementProcessor...", file=sys.stderr, flush=True)
     try:
-        processor = PDFStatementProcessor()
+        processor = PDFStatementProcessor(backend=args.backend)
         print(f"[CLI] ✅ PDFStatementProcessor инициализирован успешно", file=sys.stderr, flush=True)
     except Exception as e:
         print(f"[CLI] ❌ Ошибка инициализации PDFStatementProcessor: {e}", file=sys.stderr, flush=True)
@@ -51,26 +117,29 @@ def main() -> None:
         print(f"[CLI] Traceback: {traceback.format_exc()}", file=sys.stderr, flush=True)
         raise
     
-    documents = []
-    aggregated_frames = []
-    
-    for idx, path in enumerate(args.inputs, 1):
-        print(f"\n[CLI] ========== Обработка файла {idx}/{len(args.inputs)}: {path.name} ==========", file=sys.stderr, flush=True)
-        
+    for path in args.inputs:
         if not path.exists():
             print(f"[CLI] ❌ Файл не найден: {path}", file=sys.stderr, flush=True)
             raise SystemExit(f"File not found: {path}")
+
+    if args.stream:
+        stream_documents(processor, args.inputs, args.backend)
+        processor.close()
+        return
+
+    def process_path(indexed: Tuple[int, Path]) -> Tuple[dict, Optional[pd.DataFrame]]:
+        idx, path = indexed
+        print(f"\n[CLI] ========== Обработка файла {idx}/{len(args.inputs)}: {path.name} ==========", file=sys.stderr, flush=True)
         
         file_size = path.stat().st_size
         print(f"[CLI] Размер файла: {file_size} байт", file=sys.stderr, flush=True)
+        extraction = None
         
         try:
             with path.open("rb") as pdf_file:
-                pdf_bytes = pdf_file.read()
-                print(f"[CLI] Файл прочитан: {len(pdf_bytes)} байт", file=sys.stderr, flush=True)
-                
+                # Файл передается открытым: процессор отображает его в память без чтения в кучу
                 print(f"[CLI] Вызов processor.extract()...", file=sys.stderr, flush=True)
-                extraction = processor.extract(pdf_bytes, bank_name=path.name)
+                extraction = processor.extract(pdf_file, bank_name=path.name, backend=args.backend)
                 print(f"[CLI] ✅ extraction завершен", file=sys.stderr, flush=True)
                 print(f"[CLI] Найдено таблиц: {len(extraction.tables)}", file=sys.stderr, flush=True)
                 print(f"[CLI] Метаданные: {list(extraction.metadata.keys())}", file=sys.stderr, flush=True)
@@ -102,10 +171,11 @@ def main() -> None:
                 transactions = []
             print(f"[CLI] Извлечено транзакций: {len(transactions)}", file=sys.stderr, flush=True)
             
+            aggregated = None
             if transactions:
                 print(f"[CLI] ✅ Найдено {len(transactions)} транзакций с кредитом", file=sys.stderr, flush=True)
                 frame["source_file"] = path.name
-                aggregated_frames.append(frame)
+                aggregated = frame
             else:
                 print(f"[CLI] ⚠️ Транзакций не найдено (DataFrame пустой или нет строк с кредитом)", file=sys.stderr, flush=True)
                 if not frame.empty:
@@ -113,35 +183,59 @@ def main() -> None:
                     print(f"[CLI] Первые 3 строки DataFrame:", file=sys.stderr, flush=True)
                     print(frame.head(3).to_string(), file=sys.stderr, flush=True)
 
-            excel_bytes, excel_filename = processor.get_last_excel()
+            # XLSX - из результата этого файла: процессор общий для параллельных потоков
+            excel_file = extraction.excel_file
+            excel_file.seek(0)
+            excel_bytes = excel_file.read()
             excel_attachment = None
             if excel_bytes:
                 excel_attachment = {
-                    "name": excel_filename or f"{path.stem}.xlsx",
+                    "name": f"{path.stem}.xlsx",
                     "size": len(excel_bytes),
                     "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     "base64": base64.b64encode(excel_bytes).decode("utf-8"),
                 }
 
-            documents.append(
-                {
-                    "source_file": path.name,
-                    "metadata": extraction.metadata,
-                    "transactions": transactions,
-                    "excel_file": excel_attachment,
-                }
-            )
+            document = {
+                "source_file": path.name,
+                "metadata": extraction.metadata,
+                "transactions": transactions,
+                "excel_file": excel_attachment,
+            }
+            if args.timings:
+                document["timings"] = extraction.timings
+            return document, aggregated
+        except PDFRejected as e:
+            print(f"[CLI] ⚠️ Файл {path.name} отклонен предварительной проверкой: {e.report.reason}", file=sys.stderr, flush=True)
+            return {
+                "source_file": path.name,
+                "metadata": {"triage": e.report.to_metadata()},
+                "transactions": [],
+                "error": str(e)
+            }, None
         except Exception as e:
             print(f"[CLI] ❌ Ошибка при обработке файла {path.name}: {e}", file=sys.stderr, flush=True)
             import traceback
             print(f"[CLI] Traceback: {traceback.format_exc()}", file=sys.stderr, flush=True)
             # Добавляем документ с ошибкой
-            documents.append({
+            return {
                 "source_file": path.name,
                 "metadata": {},
                 "transactions": [],
                 "error": str(e)
-            })
+            }, None
+        finally:
+            # XLSX уже в документе (base64): временный файл или файл кэша больше не нужен
+            if extraction is not None:
+                extraction.close()
+
+    # Несколько файлов конвертируются параллельно, результаты сохраняют порядок аргументов
+    results = run_batch(process_path, list(enumerate(args.inputs, 1)), max_in_flight=args.concurrency)
+    documents = [document for document, _ in results]
+    aggregated_frames = [frame for _, frame in results if frame is not None]
+
+    # Все файлы обработаны - закрываем пулы соединений к Adobe API
+    processor.close()
 
     has_transactions = any(doc["transactions"] for doc in documents)
     print(f"\n[CLI] ========== ИТОГИ ОБРАБОТКИ ==========", file=sys.stderr, flush=True)
@@ -208,6 +302,11 @@ def main() -> None:
                     if key == "raw_header":
                         continue
                     print(f"  - {key}: {value}")
+            if doc.get("timings"):
+                print(f"Время этапов (всего {doc['timings']['total_seconds']} с):")
+                for stage, entry in doc["timings"]["stages"].items():
+                    counts = ", ".join(f"{key}={value}" for key, value in entry.items() if key != "seconds")
+                    print(f"  - {stage}: {entry['seconds']} с ({counts})")
             if doc["transactions"]:
                 print("Транзакции:")
                 frame = pd.DataFrame(doc["transactions"])
@@ -0,0 +1,184 @@
+"""Дисковый кэш результатов конвертации PDF → XLSX, адресуемый по содержимому PDF."""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from typing import IO, Dict, Optional, Union
+
+
+def pdf_digest(pdf_bytes: Union[bytes, memoryview]) -> str:
+    """SHA-256 содержимого PDF (hex)."""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+class ConversionCache:
+    """
+    Кэш XLSX, полученных от Adobe, с ключом SHA-256(PDF) + регион.
+
+    Файлы пишутся атомарно (временный файл + os.replace), поэтому один каталог могут
+    одновременно использовать несколько воркеров uvicorn и процессов CLI. Размер
+    ограничен max_bytes: при переполнении удаляются давно не использованные записи
+    (время последнего использования хранится в mtime файла).
+
+    Размер кэша ведется счетчиком: каталог обходится целиком, только когда счетчик
+    превысил max_bytes или после _RESCAN_EVERY записей (их могли добавить другие процессы).
+    """
+
+    # Через сколько записей пересчитать размер каталога, даже если лимит не превышен
+    _RESCAN_EVERY = 64
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Размер кэша по последнему обходу плюс записи этого процесса (None - еще не считали)
+        self._total_bytes: Optional[int] = None
+        self._writes_since_scan = 0
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["ConversionCache"]:
+        """
+        Создать кэш из переменных окружения.
+
+        PDF_CONVERSION_CACHE=0 отключает кэш, PDF_CONVERSION_CACHE_DIR задает каталог,
+        PDF_CONVERSION_CACHE_MAX_MB - максимальный размер.
+        """
+        if os.getenv("PDF_CONVERSION_CACHE", "1").lower() in {"0", "false", "no", "off"}:
+            return None
+        directory = os.getenv("PDF_CONVERSION_CACHE_DIR") or os.path.join(
+            tempfile.gettempdir(), "pdf_conversion_cache"
+        )
+        max_bytes = int(float(os.getenv("PDF_CONVERSION_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        try:
+            return cls(directory, max_bytes)
+        except OSError as e:
+            print(f"[WARNING] Кэш конвертаций отключен, каталог {directory} недоступен: {e}", file=sys.stderr, flush=True)
+            return None
+
+    @staticmethod
+    def make_key(pdf_bytes: Union[bytes, memoryview], region: str) -> str:
+        """Ключ кэша: хэш содержимого PDF и регион Adobe."""
+        return f"{pdf_digest(pdf_bytes)}-{region.upper()}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.xlsx")
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += value
+
+    def open(self, key: str) -> Optional[IO[bytes]]:
+        """Открыть XLSX из кэша на чтение или вернуть None (файл закрывает вызывающий код)."""
+        path = self._path(key)
+        try:
+            # Обновляем mtime - это отметка последнего использования для LRU. До open:
+            # если запись тем временем вытеснил другой воркер, открытый файл не утечет
+            os.utime(path)
+            cached = open(path, "rb")
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except OSError as e:
+            print(f"[WARNING] Не удалось прочитать кэш {path}: {e}", file=sys.stderr, flush=True)
+            self._count("misses")
+            return None
+        self._count("hits")
+        return cached
+
+    def put(self, key: str, data: Union[bytes, IO[bytes]]) -> None:
+        """
+        Сохранить XLSX в кэш и при необходимости вытеснить старые записи.
+
+        Файл копируется потоково с начала, после записи позиция возвращается в начало.
+        """
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".xlsx")
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    if isinstance(data, (bytes, bytearray)):
+                        tmp.write(data)
+                    else:
+                        data.seek(0)
+                        shutil.copyfileobj(data, tmp)
+                        data.seek(0)
+                    written = tmp.tell()
+                replaced = self._file_size(path)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except OSError as e:
+            print(f"[WARNING] Не удалось записать кэш {path}: {e}", file=sys.stderr, flush=True)
+            return
+        self._count("writes")
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += written - replaced
+            self._writes_since_scan += 1
+            rescan = (
+                self._total_bytes is None
+                or self._total_bytes > self.max_bytes
+                or self._writes_since_scan >= self._RESCAN_EVERY
+            )
+        if rescan:
+            self._evict()
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+    def _evict(self) -> None:
+        """Пересчитать размер каталога и удалить давно не использованные записи, пока кэш больше max_bytes."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".xlsx") or name.startswith(".tmp_"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total > self.max_bytes:
+            total = self._remove_oldest(entries, total)
+        with self._lock:
+            self._total_bytes = total
+            self._writes_since_scan = 0
+
+    def _remove_oldest(self, entries: list, total: int) -> int:
+        """Удалять записи от давно не использованных, пока кэш больше max_bytes; вернуть новый размер."""
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self._count("evictions")
+        return total
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий/промахов текущего процесса."""
+        with self._lock:
+            return dict(self._stats)
+
+
+__all__ = ["ConversionCache", "pdf_digest"]
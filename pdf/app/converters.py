@@ -0,0 +1,236 @@
+"""Бэкенды конвертации PDF → XLSX: Adobe PDF Services API и локальное извлечение таблиц pdfplumber."""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import IO, Dict, List, Optional, Union
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None  # type: ignore
+
+from .adobe_pdf_service import AdobePDFService, BufferStream, spooled_result_file
+from .async_adobe_pdf_service import AsyncAdobePDFService
+
+ADOBE_BACKEND = "adobe"
+LOCAL_BACKEND = "local"
+CONVERTER_BACKENDS = (ADOBE_BACKEND, LOCAL_BACKEND)
+# Не бэкенд, а режим: бэкенд выбирает предварительная проверка PDF (app.triage)
+AUTO_BACKEND = "auto"
+BACKEND_CHOICES = CONVERTER_BACKENDS + (AUTO_BACKEND,)
+
+
+def default_backend_name() -> str:
+    """Бэкенд по умолчанию (PDF_CONVERTER_BACKEND: adobe, local или auto)."""
+    return os.getenv("PDF_CONVERTER_BACKEND", ADOBE_BACKEND).strip().lower() or ADOBE_BACKEND
+
+
+class ConverterBackend(ABC):
+    """
+    Конвертер PDF в XLSX, листы которого разбирает PDFStatementProcessor.
+
+    Один лист - одна страница (или одна таблица) документа; первая строка листа при
+    чтении становится названиями колонок DataFrame, заголовок таблицы ищется ниже.
+    """
+
+    name: str = ""
+    # Значение metadata["extraction_method"] для результатов этого бэкенда
+    extraction_method: str = ""
+    # Имеет ли смысл делить большой PDF на части и конвертировать их параллельно
+    split_large_pdfs: bool = False
+    # Регион удаленного сервиса (для локальной конвертации - None)
+    region: Optional[str] = None
+
+    @property
+    def cache_namespace(self) -> str:
+        """Часть ключа кэша конвертаций: результаты разных бэкендов не смешиваются."""
+        return self.name.upper()
+
+    @abstractmethod
+    def convert(self, pdf_bytes: Union[bytes, memoryview], filename: Optional[str] = None) -> IO[bytes]:
+        """Конвертировать PDF в XLSX во временном файле (позиция в начале, закрывает вызывающий код)."""
+
+    async def convert_async(self, pdf_bytes: Union[bytes, memoryview], filename: Optional[str] = None) -> IO[bytes]:
+        """По умолчанию синхронная конвертация выполняется в отдельном потоке."""
+        return await asyncio.to_thread(self.convert, pdf_bytes, filename)
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        self.close()
+
+
+class AdobeConverter(ConverterBackend):
+    """Конвертация через Adobe PDF Services API (синхронный и асинхронный клиент)."""
+
+    name = ADOBE_BACKEND
+    extraction_method = "adobe_pdf_services_api"
+    split_large_pdfs = True
+
+    def __init__(
+        self,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        credentials_file: Optional[str] = None,
+        region: Optional[str] = None,
+        connect_timeout: Optional[int] = None,
+        read_timeout: Optional[int] = None,
+    ) -> None:
+        # Настройки REST API общие для синхронного и асинхронного клиента
+        self._options = {
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "region": region,
+            "connect_timeout": connect_timeout,
+            "read_timeout": read_timeout,
+        }
+        self._service = AdobePDFService(credentials_file=credentials_file, **self._options)
+        self._async_service: Optional[AsyncAdobePDFService] = None
+
+    @property
+    def region(self) -> str:  # type: ignore[override]
+        return self._service.region.upper()
+
+    @property
+    def cache_namespace(self) -> str:
+        # Регион, как до появления других бэкендов: существующий кэш остается действительным
+        return self.region
+
+    def convert(self, pdf_bytes: Union[bytes, memoryview], filename: Optional[str] = None) -> IO[bytes]:
+        return self._service.convert_pdf_to_excel_file(pdf_bytes, filename=filename)
+
+    async def convert_async(self, pdf_bytes: Union[bytes, memoryview], filename: Optional[str] = None) -> IO[bytes]:
+        return await self._get_async_service().convert_pdf_to_excel_file(pdf_bytes, filename=filename)
+
+    def _get_async_service(self) -> AsyncAdobePDFService:
+        """Создать асинхронный клиент Adobe при первом обращении (с теми же настройками)."""
+        if self._async_service is None:
+            self._async_service = AsyncAdobePDFService(**self._options)
+        return self._async_service
+
+    def close(self) -> None:
+        self._service.close()
+
+    async def aclose(self) -> None:
+        if self._async_service is not None:
+            await self._async_service.aclose()
+        self.close()
+
+
+class LocalTableConverter(ConverterBackend):
+    """
+    Локальное извлечение таблиц из текстового слоя PDF через pdfplumber.
+
+    Каждая страница становится отдельным листом "Page N". Сеть и квота Adobe не нужны,
+    выписка с текстовым слоем обрабатывается за секунды; для сканов без текстового
+    слоя результат будет пустым.
+    """
+
+    name = LOCAL_BACKEND
+    extraction_method = "pdfplumber_local"
+
+    # Если по линиям разметки таблица не нашлась, пробуем выравнивание текста
+    _TEXT_TABLE_SETTINGS = {"vertical_strategy": "text", "horizontal_strategy": "text"}
+
+    def __init__(self) -> None:
+        if pdfplumber is None:
+            raise ImportError(
+                "pdfplumber не установлен, локальная конвертация недоступна. "
+                "Установите его командой: pip install pdfplumber"
+            )
+
+    @classmethod
+    def _page_rows(cls, page) -> List[List[Optional[str]]]:
+        tables = page.extract_tables() or []
+        if not any(tables):
+            table = page.extract_table(cls._TEXT_TABLE_SETTINGS)
+            tables = [table] if table else []
+        rows: List[List[Optional[str]]] = []
+        for table in tables:
+            rows.extend(row for row in table if row and any(cell not in (None, "") for cell in row))
+        return rows
+
+    def convert(self, pdf_bytes: Union[bytes, memoryview], filename: Optional[str] = None) -> IO[bytes]:
+        from openpyxl import Workbook
+
+        print(f"[LOCAL_CONVERTER] Извлечение таблиц через pdfplumber: {filename or 'без имени'}", file=sys.stderr, flush=True)
+        workbook = Workbook(write_only=True)
+        total_rows = 0
+        with BufferStream(pdf_bytes) as stream, pdfplumber.open(stream) as pdf_document:
+            for page_number, page in enumerate(pdf_document.pages, 1):
+                sheet = workbook.create_sheet(f"Page {page_number}")
+                # Первая строка листа уходит в названия колонок DataFrame,
+                # поэтому заголовок таблицы не должен оказаться на ее месте
+                sheet.append([f"Страница {page_number}"])
+                rows = self._page_rows(page)
+                for row in rows:
+                    sheet.append(row)
+                total_rows += len(rows)
+                page.flush_cache()
+            page_count = len(pdf_document.pages)
+        result_file = spooled_result_file()
+        workbook.save(result_file)
+        result_file.seek(0)
+        print(f"[LOCAL_CONVERTER] ✅ Страниц: {page_count}, строк таблиц: {total_rows}", file=sys.stderr, flush=True)
+        return result_file
+
+
+class ConverterRegistry:
+    """
+    Бэкенды конвертации процессора по имени.
+
+    Бэкенд создается при первом обращении: без учетных данных Adobe локальная
+    конвертация работает, а ошибка настройки Adobe возникает только у запросов к нему.
+    """
+
+    def __init__(self, adobe_options: Optional[Dict[str, object]] = None) -> None:
+        self._adobe_options = adobe_options or {}
+        self._backends: Dict[str, ConverterBackend] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> ConverterBackend:
+        name = name.strip().lower()
+        with self._lock:
+            backend = self._backends.get(name)
+            if backend is None:
+                if name == ADOBE_BACKEND:
+                    backend = AdobeConverter(**self._adobe_options)
+                elif name == LOCAL_BACKEND:
+                    backend = LocalTableConverter()
+                else:
+                    raise ValueError(
+                        f"Неизвестный бэкенд конвертации: {name!r}. Доступны: {', '.join(CONVERTER_BACKENDS)}"
+                    )
+                self._backends[name] = backend
+            return backend
+
+    def close(self) -> None:
+        with self._lock:
+            backends = list(self._backends.values())
+        for backend in backends:
+            backend.close()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            backends = list(self._backends.values())
+        for backend in backends:
+            await backend.aclose()
+
+
+__all__ = [
+    "ADOBE_BACKEND",
+    "AUTO_BACKEND",
+    "AdobeConverter",
+    "BACKEND_CHOICES",
+    "CONVERTER_BACKENDS",
+    "ConverterBackend",
+    "ConverterRegistry",
+    "LOCAL_BACKEND",
+    "LocalTableConverter",
+    "default_backend_name",
+]
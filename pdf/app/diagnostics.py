@@ -0,0 +1,114 @@
+"""Диагностика разбора выписок: уровневый логгер, выборочная трассировка строк и счетчики листа."""
+from __future__ import annotations
+
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+# Уровень трассировки строк: ниже DEBUG, включается только PDF_ROW_TRACE_SAMPLE
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
+
+# Сообщения пишутся в stderr как есть, с префиксом вида [DEBUG] в самом тексте:
+# stdout занят JSON для вызывающего кода
+logger = logging.getLogger("app.pdf_processor")
+
+
+class _StderrHandler(logging.StreamHandler):
+    """Пишет в текущий sys.stderr, как print(..., file=sys.stderr): его могут подменить после настройки."""
+
+    def __init__(self) -> None:
+        super().__init__(sys.stderr)
+
+    @property
+    def stream(self):  # type: ignore[override]
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value) -> None:
+        pass
+
+
+def row_trace_sample() -> int:
+    """Каждая какая строка трассируется (PDF_ROW_TRACE_SAMPLE, 0 - трассировка выключена)."""
+    return max(int(os.getenv("PDF_ROW_TRACE_SAMPLE", "0")), 0)
+
+
+def configure_logging() -> None:
+    """
+    Настроить логгер разбора из окружения (PDF_LOG_LEVEL, по умолчанию INFO).
+
+    Сообщения передаются с аргументами в стиле %, поэтому на выключенном уровне
+    строка не форматируется: остается только проверка уровня.
+    """
+    level_name = os.getenv("PDF_LOG_LEVEL", "INFO").strip().upper()
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        print(f"[DIAGNOSTICS] Неизвестный уровень PDF_LOG_LEVEL={level_name!r}, используется INFO", file=sys.stderr, flush=True)
+        level = logging.INFO
+    if row_trace_sample():
+        level = min(level, TRACE)
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = _StderrHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.propagate = False
+
+
+class RowTrace:
+    """Трассировка каждой N-й строки одного этапа разбора (консолидация, фильтр кредита)."""
+
+    def __init__(self, stage: str, every: int) -> None:
+        self.stage = stage
+        self.every = every
+        self._seen = 0
+
+    def sample(self) -> bool:
+        """Отсчитать строку; True - ее нужно записать в трассировку."""
+        self._seen += 1
+        return (self._seen - 1) % self.every == 0
+
+    def log(self, message: str, *args: object) -> None:
+        logger.log(TRACE, "[TRACE] %s: " + message, self.stage, *args)
+
+
+def row_trace(stage: str) -> Optional[RowTrace]:
+    """Трассировка этапа или None, если она выключена (проверка в цикле - одно сравнение с None)."""
+    every = row_trace_sample()
+    if not every or not logger.isEnabledFor(TRACE):
+        return None
+    return RowTrace(stage, every)
+
+
+@dataclass
+class SheetStats:
+    """Счетчики разбора одного листа: одна итоговая запись в лог вместо сообщений по строкам."""
+
+    sheet: str
+    rows: int = 0
+    headers: int = 0
+    sections: int = 0
+    records: int = 0
+    skipped_empty: int = 0
+    skipped_headers: int = 0
+    with_credit: int = 0
+    summary: int = 0
+    no_date: int = 0
+    with_debit: int = 0
+    kept: int = 0
+
+    def log(self) -> None:
+        logger.info(
+            "[PDF_PROCESSOR] Лист '%s': строк=%d заголовков=%d секций=%d записей=%d пустых=%d "
+            "повторов_заголовка=%d с_кредитом=%d итоговых=%d без_даты_и_№=%d с_дебетом=%d в_результат=%d",
+            self.sheet, self.rows, self.headers, self.sections, self.records, self.skipped_empty,
+            self.skipped_headers, self.with_credit, self.summary, self.no_date, self.with_debit, self.kept,
+        )
+
+
+configure_logging()
+
+__all__ = ["TRACE", "RowTrace", "SheetStats", "configure_logging", "logger", "row_trace", "row_trace_sample"]
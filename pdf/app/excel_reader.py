@@ -0,0 +1,293 @@
+"""Чтение XLSX от бэкенда конвертации: книга открывается один раз на все листы."""
+from __future__ import annotations
+
+import os
+import posixpath
+import re
+import sys
+import zipfile
+from dataclasses import dataclass
+from typing import IO, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+from xml.etree.ElementTree import ParseError, iterparse
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from openpyxl.workbook.workbook import Workbook
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None  # type: ignore
+
+OPENPYXL_ENGINE = "openpyxl"
+CALAMINE_ENGINE = "calamine"
+EXCEL_ENGINES = (OPENPYXL_ENGINE, CALAMINE_ENGINE)
+
+_RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+# Число или сумма, записанная текстом: "1 000,00", "-150.5", "42"
+_AMOUNT_PATTERN = re.compile(r"^-?\d[\d \xa0]*(?:[.,]\d{1,2})?$")
+# Лист без ключевых слов считается продолжением таблицы, если в нем столько строк с числами
+_CONTINUATION_MIN_ROWS = 2
+# ... а строка - строкой с числами, если в ней столько ячеек-чисел
+_CONTINUATION_ROW_AMOUNTS = 2
+# Строки, которые pd.read_excel по умолчанию читает как пропуск (na_values)
+_NA_STRINGS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+
+
+def excel_engine() -> str:
+    """
+    Движок чтения XLSX (PDF_EXCEL_ENGINE: openpyxl или calamine).
+
+    calamine (пакет python-calamine) разбирает XLSX в Rust в несколько раз быстрее
+    openpyxl; если пакет не установлен, используется openpyxl.
+    """
+    engine = os.getenv("PDF_EXCEL_ENGINE", OPENPYXL_ENGINE).strip().lower() or OPENPYXL_ENGINE
+    if engine not in EXCEL_ENGINES:
+        print(f"[EXCEL_READER] Неизвестный движок PDF_EXCEL_ENGINE={engine!r}, используется openpyxl", file=sys.stderr, flush=True)
+        return OPENPYXL_ENGINE
+    if engine == CALAMINE_ENGINE and python_calamine is None:
+        print("[EXCEL_READER] python-calamine не установлен, используется openpyxl", file=sys.stderr, flush=True)
+        return OPENPYXL_ENGINE
+    return engine
+
+
+def open_workbook(excel_file: IO[bytes]) -> pd.ExcelFile:
+    """
+    Открыть XLSX один раз для чтения всех листов.
+
+    Архив и общие строки книги разбираются при открытии, дальше
+    ExcelFile.parse(sheet_name) читает строки одного листа в режиме read-only.
+    В отличие от pd.read_excel на каждый лист время чтения растет с размером книги,
+    а не с квадратом числа листов. Закрывать через close() или with.
+    """
+    excel_file.seek(0)
+    return pd.ExcelFile(excel_file, engine=excel_engine())
+
+
+def stream_window_rows() -> int:
+    """Сколько строк листа разбирается за раз в потоковом режиме (PDF_STREAM_WINDOW_ROWS)."""
+    return max(int(os.getenv("PDF_STREAM_WINDOW_ROWS", "2000")), 1)
+
+
+def open_row_workbook(excel_file: IO[bytes]) -> Workbook:
+    """
+    Открыть XLSX для построчного чтения листов (openpyxl read-only).
+
+    В отличие от open_workbook() лист не собирается в DataFrame: iter_sheet_rows()
+    читает XML листа потоково, в памяти только текущая строка. Закрывать через close().
+    """
+    excel_file.seek(0)
+    return load_workbook(excel_file, read_only=True, data_only=True, keep_links=False)
+
+
+def _cell_value(cell) -> object:
+    # Как pd.read_excel с openpyxl: пустые ячейки, ошибки и строки na_values - NaN, целые числа - int
+    value = cell.value
+    if value is None or cell.data_type == TYPE_ERROR or (isinstance(value, str) and value in _NA_STRINGS):
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC and not isinstance(value, bool):
+        integer = int(value)
+        return integer if integer == value else float(value)
+    return value
+
+
+def iter_sheet_rows(worksheet) -> Iterator[List[object]]:
+    """
+    Строки листа по одной, включая пустые строки внутри листа.
+
+    Значения ячеек те же, что у pd.read_excel, но без вывода типа колонки целиком:
+    целое число в колонке с пропусками остается int, а не становится float.
+    """
+    for row in worksheet.iter_rows():
+        yield [_cell_value(cell) for cell in row]
+
+
+def sheet_prescan_enabled() -> bool:
+    """Включен ли предварительный просмотр листов XLSX (PDF_SHEET_PRESCAN, по умолчанию да)."""
+    return os.getenv("PDF_SHEET_PRESCAN", "1").lower() not in {"0", "false", "no", "off"}
+
+
+@dataclass
+class SheetScan:
+    """Что известно о листе без его разбора: ключевые слова и строки с числами."""
+
+    name: str
+    has_keywords: bool = False
+    numeric_rows: int = 0
+    relevant: bool = True
+    reason: str = ""
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _normalized_texts(text: str) -> Tuple[str, ...]:
+    # Как названия колонок в обработке: нижний регистр, перенос строки - пробел, ё - е
+    normalized = text.lower().replace("\n", " ")
+    return (normalized, normalized.replace("ё", "е"))
+
+
+def _words_in(text: str, words: FrozenSet[str]) -> Set[str]:
+    texts = _normalized_texts(text)
+    return {word for word in words if any(word in variant for variant in texts)}
+
+
+def _workbook_sheet_paths(archive: zipfile.ZipFile) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+    """Листы книги по порядку (имя, путь XML в архиве) и путь sharedStrings.xml."""
+    targets: Dict[str, str] = {}
+    shared_strings: Optional[str] = None
+    with archive.open("xl/_rels/workbook.xml.rels") as rels:
+        for _, element in iterparse(rels):
+            if _local_name(element.tag) != "Relationship":
+                continue
+            target = element.get("Target", "")
+            # Путь может быть абсолютным в архиве или относительным к xl/
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            targets[element.get("Id", "")] = path
+            if element.get("Type", "").endswith("/sharedStrings"):
+                shared_strings = path
+    sheets: List[Tuple[str, str]] = []
+    with archive.open("xl/workbook.xml") as workbook:
+        for _, element in iterparse(workbook):
+            if _local_name(element.tag) == "sheet":
+                sheets.append((element.get("name", ""), targets[element.get(_RELATIONSHIP_ID, "")]))
+    return sheets, shared_strings
+
+
+def _shared_string_words(archive: zipfile.ZipFile, path: Optional[str], words: FrozenSet[str]) -> List[Tuple[Set[str], bool]]:
+    """Для каждой общей строки: какие слова в ней есть и похожа ли она на сумму."""
+    result: List[Tuple[Set[str], bool]] = []
+    if path is None or path not in archive.namelist():
+        return result
+    parts: List[str] = []
+    with archive.open(path) as shared_strings:
+        for _, element in iterparse(shared_strings):
+            tag = _local_name(element.tag)
+            if tag == "t":
+                parts.append(element.text or "")
+            elif tag == "si":
+                text = "".join(parts)
+                parts = []
+                result.append((_words_in(text, words), bool(_AMOUNT_PATTERN.match(text.strip()))))
+                element.clear()
+    return result
+
+
+def _scan_sheet(
+    archive: zipfile.ZipFile,
+    name: str,
+    path: str,
+    keyword_words: List[FrozenSet[str]],
+    words: FrozenSet[str],
+    shared: List[Tuple[Set[str], bool]],
+) -> SheetScan:
+    """
+    Пройти XML листа потоково: есть ли ключевые слова и сколько строк с несколькими числами.
+
+    Как только ключевое слово найдено, дальше лист не читается.
+    """
+    scan = SheetScan(name=name)
+    found: Set[str] = set()
+    row_amounts = 0
+    cell_type: Optional[str] = None
+    value: Optional[str] = None
+    with archive.open(path) as sheet:
+        for event, element in iterparse(sheet, events=("start", "end")):
+            tag = _local_name(element.tag)
+            if event == "start":
+                if tag == "c":
+                    cell_type = element.get("t", "n")
+                    value = None
+                continue
+            if tag == "v":
+                value = element.text
+            elif tag == "t":
+                # Текст inline-строки может быть разбит на несколько фрагментов
+                value = (value or "") + (element.text or "")
+            elif tag == "c":
+                is_amount = False
+                cell_words: Set[str] = set()
+                if value is not None:
+                    if cell_type == "s":
+                        index = int(value)
+                        if index < len(shared):
+                            cell_words, is_amount = shared[index]
+                    elif cell_type in ("inlineStr", "str"):
+                        cell_words = _words_in(value, words)
+                        is_amount = bool(_AMOUNT_PATTERN.match(value.strip()))
+                    elif cell_type == "n":
+                        is_amount = True
+                if cell_words - found:
+                    found |= cell_words
+                    if any(keyword <= found for keyword in keyword_words):
+                        scan.has_keywords = True
+                        break
+                row_amounts += is_amount
+                element.clear()
+            elif tag == "row":
+                if row_amounts >= _CONTINUATION_ROW_AMOUNTS:
+                    scan.numeric_rows += 1
+                row_amounts = 0
+                element.clear()
+    return scan
+
+
+def scan_workbook(excel_file: IO[bytes], keywords: Iterable[str]) -> Optional[List[SheetScan]]:
+    """
+    Определить по XML архива, какие листы стоит разбирать, не разбирая их.
+
+    Лист нужен, если в его ячейках есть ключевое слово (название колонки кредита;
+    слова многословного названия могут быть в разных ячейках, как у заголовка из
+    нескольких строк) или если он похож на продолжение таблицы: идет сразу за нужным
+    листом и в нем есть строки с несколькими числами. Остальные листы (титульные
+    страницы, подписи, колонтитулы) таблицы с кредитом не содержат.
+
+    Возвращает None, если файл не удалось разобрать как XLSX - тогда разбираются все листы.
+    """
+    keyword_words = [frozenset(keyword.split()) for keyword in keywords if keyword.strip()]
+    words = frozenset().union(*keyword_words)
+    try:
+        excel_file.seek(0)
+        with zipfile.ZipFile(excel_file) as archive:
+            sheet_paths, shared_strings_path = _workbook_sheet_paths(archive)
+            shared = _shared_string_words(archive, shared_strings_path, words)
+            scans: List[SheetScan] = []
+            previous_relevant = False
+            for name, path in sheet_paths:
+                scan = _scan_sheet(archive, name, path, keyword_words, words, shared)
+                if scan.has_keywords:
+                    scan.reason = "есть заголовок таблицы"
+                elif previous_relevant and scan.numeric_rows >= _CONTINUATION_MIN_ROWS:
+                    scan.reason = "продолжение таблицы с предыдущего листа"
+                else:
+                    scan.relevant = False
+                    scan.reason = "нет заголовка таблицы и строк с суммами"
+                previous_relevant = scan.relevant
+                scans.append(scan)
+    except (zipfile.BadZipFile, KeyError, ParseError, ValueError) as e:
+        print(f"[EXCEL_READER] Предварительный просмотр листов не удался, разбираются все листы: {e}", file=sys.stderr, flush=True)
+        return None
+    finally:
+        excel_file.seek(0)
+    return scans
+
+
+__all__ = [
+    "CALAMINE_ENGINE",
+    "EXCEL_ENGINES",
+    "OPENPYXL_ENGINE",
+    "SheetScan",
+    "excel_engine",
+    "iter_sheet_rows",
+    "open_row_workbook",
+    "open_workbook",
+    "scan_workbook",
+    "sheet_prescan_enabled",
+    "stream_window_rows",
+]
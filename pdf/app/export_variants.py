@@ -0,0 +1,97 @@
+"""Запоминание рабочего варианта payload для /operation/exportpdf."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+# Ответы, означающие, что Adobe не принял форму запроса: только в этом случае
+# имеет смысл пробовать следующий вариант payload
+SCHEMA_ERROR_STATUSES = frozenset({400, 415, 422})
+
+
+def is_schema_error(status_code: int) -> bool:
+    """Проверить, что ответ означает ошибку схемы payload, а не сбой сервиса."""
+    return status_code in SCHEMA_ERROR_STATUSES
+
+
+def default_state_file() -> str:
+    """Путь к файлу состояния (ADOBE_EXPORT_STATE_FILE или файл во временной директории)."""
+    return os.getenv("ADOBE_EXPORT_STATE_FILE") or os.path.join(
+        tempfile.gettempdir(), "adobe_export_state.json"
+    )
+
+
+class ExportVariantRegistry:
+    """
+    Хранит индекс сработавшего варианта payload по региону.
+
+    Значение держится в памяти процесса и дублируется в небольшой JSON файл, чтобы
+    новые процессы CLI и воркеры uvicorn сразу отправляли запрос в рабочем формате.
+    """
+
+    def __init__(self, state_file: Optional[str] = None) -> None:
+        self._state_file = state_file or default_state_file()
+        self._lock = threading.Lock()
+        self._variants: Dict[str, int] = self._load()
+
+    def _load(self) -> Dict[str, int]:
+        try:
+            with open(self._state_file, "r", encoding="utf-8") as state:
+                data = json.load(state)
+        except (OSError, ValueError):
+            return {}
+        variants = data.get("export_payload_variant") if isinstance(data, dict) else None
+        if not isinstance(variants, dict):
+            return {}
+        return {str(region): int(index) for region, index in variants.items() if isinstance(index, int)}
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self._state_file) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".adobe_state_", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+                json.dump({"export_payload_variant": self._variants}, tmp)
+            os.replace(tmp_path, self._state_file)
+        except OSError as e:
+            print(f"[WARNING] Не удалось сохранить состояние Adobe API в {self._state_file}: {e}", file=sys.stderr, flush=True)
+
+    def order(self, region: str, count: int) -> List[int]:
+        """Порядок перебора вариантов: сначала известный рабочий, затем остальные."""
+        preferred = self._variants.get(region.upper())
+        indices = list(range(count))
+        if preferred is not None and 0 <= preferred < count:
+            indices.remove(preferred)
+            indices.insert(0, preferred)
+        return indices
+
+    def remember(self, region: str, index: int) -> None:
+        """Запомнить сработавший вариант (файл перезаписывается только при изменении)."""
+        region = region.upper()
+        with self._lock:
+            if self._variants.get(region) == index:
+                return
+            self._variants[region] = index
+            self._save()
+
+
+_registries: Dict[str, ExportVariantRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_variant_registry(state_file: Optional[str] = None) -> ExportVariantRegistry:
+    """Общий для процесса реестр вариантов (один на файл состояния)."""
+    path = state_file or default_state_file()
+    with _registries_lock:
+        registry = _registries.get(path)
+        if registry is None:
+            registry = ExportVariantRegistry(path)
+            _registries[path] = registry
+        return registry
+
+
+__all__ = ["ExportVariantRegistry", "get_variant_registry", "is_schema_error"]
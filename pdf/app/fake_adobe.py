@@ -0,0 +1,420 @@
+"""
+Локальный стенд Adobe PDF Services REST API для тестов и нагрузочных замеров.
+
+Реализует те же endpoint'ы, что использует AdobePDFService: /token, /assets,
+pre-signed загрузку, /operation/exportpdf, статус job и скачивание результата.
+Квота Adobe не тратится, сеть не нужна.
+
+Запуск:
+    python -m app.fake_adobe --port 8765 --latency 2 --throttle-rate 0.2
+    ADOBE_BASE_URL=http://127.0.0.1:8765 python -m app.cli statement.pdf --json
+
+Или из кода:
+    with FakeAdobeServer(FakeAdobeConfig(job_latency=0.5)) as server:
+        service = AdobePDFService(client_id="id", client_secret="secret", base_url=server.url)
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from .adobe_pdf_service import XLSX_MEDIA_TYPE
+
+
+@dataclass
+class FakeAdobeConfig:
+    """Поведение стенда: задержки, доля ошибок и ограничений, принимаемые форматы payload."""
+
+    job_latency: float = 1.0
+    latency_jitter: float = 0.0
+    failure_rate: float = 0.0
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    retry_after: Optional[int] = 1
+    accepted_variants: FrozenSet[int] = frozenset({0, 1, 2})
+    token_ttl: int = 86399
+    xlsx_path: Optional[str] = None
+    sheets: int = 3
+    rows_per_sheet: int = 40
+    seed: Optional[int] = None
+
+
+@dataclass
+class _Job:
+    asset_id: str
+    ready_at: float
+    failed: bool
+
+
+@dataclass
+class _State:
+    """Состояние стенда, общее для потоков обработчика."""
+
+    config: FakeAdobeConfig
+    xlsx: bytes
+    random: random.Random
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    tokens: Dict[str, float] = field(default_factory=dict)
+    assets: Dict[str, int] = field(default_factory=dict)
+    jobs: Dict[str, _Job] = field(default_factory=dict)
+    stats: Dict[str, int] = field(default_factory=dict)
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def chance(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+
+def payload_variant(payload: dict) -> int:
+    """Определить, какой из вариантов build_export_payload_variants прислан (0, 1 или 2)."""
+    if "cpf:inputs" in payload:
+        return 2
+    if "cpf:engine" in payload:
+        return 1
+    return 0
+
+
+def payload_asset_id(payload: dict) -> Optional[str]:
+    """Достать assetID из payload любого варианта."""
+    if payload.get("assetID"):
+        return payload["assetID"]
+    location = payload.get("cpf:inputs", {}).get("documentIn", {}).get("cpf:location", {})
+    return location.get("assetID")
+
+
+def generate_statement_xlsx(sheets: int = 3, rows_per_sheet: int = 40, seed: Optional[int] = None) -> bytes:
+    """
+    Сгенерировать XLSX, похожий на результат Adobe для банковской выписки.
+
+    На каждом листе - шапка с реквизитами, заголовок таблицы и строки операций;
+    кредит заполнен примерно в половине строк, как в реальных выписках.
+    """
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    number = 1
+    for sheet_idx in range(sheets):
+        sheet = workbook.create_sheet(f"Table {sheet_idx + 1}")
+        if sheet_idx == 0:
+            sheet.append(["Выписка по счету KZ00000000000000000000"])
+            sheet.append(["Период: 01.01.2024 - 31.12.2024"])
+            sheet.append([])
+        sheet.append(["№", "Дата", "Номер документа", "Дебет", "Кредит", "Назначение платежа"])
+        for _ in range(rows_per_sheet):
+            amount = f"{rng.randint(1000, 10_000_000)},{rng.randint(0, 99):02d}"
+            is_credit = rng.random() < 0.5
+            sheet.append([
+                number,
+                f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2024",
+                str(rng.randint(100000, 999999)),
+                "" if is_credit else amount,
+                amount if is_credit else "",
+                rng.choice(["Оплата по договору", "Перевод собственных средств", "Возврат займа", "Комиссия банка"]),
+            ])
+            number += 1
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_FakeHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> _State:
+        return self.server.state
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - сигнатура BaseHTTPRequestHandler
+        if self.server.verbose:
+            print(f"[FAKE_ADOBE] {self.address_string()} {format % args}", file=sys.stderr, flush=True)
+
+    def _base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, data: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(data).encode("utf-8"), {"Content-Type": "application/json", **(headers or {})})
+
+    def _authorized(self) -> bool:
+        auth = self.headers.get("Authorization", "")
+        token = auth[len("Bearer "):] if auth.startswith("Bearer ") else ""
+        with self.state.lock:
+            expires_at = self.state.tokens.get(token)
+        if expires_at is None or expires_at < time.monotonic():
+            self._send_json(401, {"error": {"code": "Unauthorized", "message": "Invalid or expired token"}})
+            return False
+        return True
+
+    def _route(self) -> Tuple[str, ...]:
+        return tuple(part for part in self.path.split("?", 1)[0].split("/") if part)
+
+    def _simulated_outage(self) -> bool:
+        """Ответить 503 на случайную долю запросов (error_rate), не обрабатывая их."""
+        if not self.state.chance(self.state.config.error_rate):
+            return False
+        self.state.count("unavailable")
+        self._send_json(503, {"error": {"code": "SERVICE_UNAVAILABLE", "message": "Simulated outage"}})
+        return True
+
+    def do_POST(self) -> None:  # noqa: N802 - имя метода задано http.server
+        route = self._route()
+        body = self._read_body()
+        if self._simulated_outage():
+            return
+        if route == ("token",):
+            self.state.count("token")
+            token = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.tokens[token] = time.monotonic() + self.state.config.token_ttl
+            self._send_json(200, {"access_token": token, "token_type": "bearer", "expires_in": self.state.config.token_ttl})
+        elif route == ("assets",):
+            self.state.count("assets")
+            if not self._authorized():
+                return
+            asset_id = f"urn:aaid:AS:fake:{uuid.uuid4()}"
+            self._send_json(200, {"uploadUri": f"{self._base_url()}/upload/{asset_id}", "assetID": asset_id})
+        elif route == ("operation", "exportpdf"):
+            self.state.count("exportpdf")
+            if not self._authorized():
+                return
+            self._create_job(body)
+        else:
+            self._send_json(404, {"error": {"code": "NotFound", "message": self.path}})
+
+    def _create_job(self, body: bytes) -> None:
+        state = self.state
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"code": "BadRequest", "message": "Invalid JSON"}})
+            return
+        variant = payload_variant(payload)
+        if variant not in state.config.accepted_variants:
+            state.count("exportpdf_rejected")
+            self._send_json(400, {"error": {"code": "BAD_REQUEST", "message": f"Payload variant {variant + 1} is not supported"}})
+            return
+        asset_id = payload_asset_id(payload)
+        with state.lock:
+            uploaded = asset_id in state.assets
+        if not uploaded:
+            self._send_json(404, {"error": {"code": "ASSET_NOT_FOUND", "message": f"Asset {asset_id} not found"}})
+            return
+
+        config = state.config
+        latency = config.job_latency
+        if config.latency_jitter:
+            with state.lock:
+                latency += state.random.uniform(-config.latency_jitter, config.latency_jitter)
+        job_id = uuid.uuid4().hex
+        job = _Job(asset_id=asset_id, ready_at=time.monotonic() + max(0.0, latency), failed=state.chance(config.failure_rate))
+        with state.lock:
+            state.jobs[job_id] = job
+        self._send(201, headers={"Location": f"{self._base_url()}/operation/exportpdf/{job_id}/status", "x-request-id": job_id})
+
+    def do_PUT(self) -> None:  # noqa: N802
+        route = self._route()
+        body = self._read_body()
+        if self._simulated_outage():
+            return
+        if len(route) == 2 and route[0] == "upload":
+            self.state.count("upload")
+            with self.state.lock:
+                self.state.assets[route[1]] = len(body)
+            self._send(200)
+        else:
+            self._send_json(404, {"error": {"code": "NotFound", "message": self.path}})
+
+    def do_GET(self) -> None:  # noqa: N802
+        route = self._route()
+        if route != ("_stats",) and self._simulated_outage():
+            return
+        if len(route) == 4 and route[:2] == ("operation", "exportpdf") and route[3] == "status":
+            self.state.count("status")
+            if not self._authorized():
+                return
+            self._job_status(route[2])
+        elif len(route) == 2 and route[0] == "download":
+            self.state.count("download")
+            with self.state.lock:
+                known = route[1] in self.state.jobs
+            if not known:
+                self._send_json(404, {"error": {"code": "NotFound", "message": self.path}})
+                return
+            self._send(200, self.state.xlsx, {"Content-Type": XLSX_MEDIA_TYPE})
+        elif route == ("_stats",):
+            with self.state.lock:
+                stats = dict(self.state.stats)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": {"code": "NotFound", "message": self.path}})
+
+    def _job_status(self, job_id: str) -> None:
+        state = self.state
+        with state.lock:
+            job = state.jobs.get(job_id)
+        if job is None:
+            self._send_json(404, {"error": {"code": "JOB_NOT_FOUND", "message": f"Job {job_id} not found"}})
+            return
+        if state.chance(state.config.throttle_rate):
+            state.count("throttled")
+            headers = {"Retry-After": str(state.config.retry_after)} if state.config.retry_after is not None else {}
+            self._send_json(429, {"error": {"code": "TOO_MANY_REQUESTS", "message": "Rate limit exceeded"}}, headers)
+            return
+        if time.monotonic() < job.ready_at:
+            self._send_json(200, {"status": "in progress"})
+        elif job.failed:
+            self._send_json(200, {"status": "failed", "error": {"code": "ERROR", "message": "Simulated conversion failure", "status": 500}})
+        else:
+            self._send_json(200, {
+                "status": "done",
+                "asset": {
+                    "assetID": f"urn:aaid:AS:fake:result:{job_id}",
+                    "downloadUri": f"{self._base_url()}/download/{job_id}",
+                    "metadata": {"type": XLSX_MEDIA_TYPE, "size": len(state.xlsx)},
+                },
+            })
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], state: _State, verbose: bool) -> None:
+        super().__init__(address, _Handler)
+        self.state = state
+        self.verbose = verbose
+
+
+class FakeAdobeServer:
+    """Стенд Adobe API в фоновом потоке. Порт 0 - выбрать свободный автоматически."""
+
+    def __init__(
+        self,
+        config: Optional[FakeAdobeConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        verbose: bool = False,
+    ) -> None:
+        self.config = config or FakeAdobeConfig()
+        if self.config.xlsx_path:
+            with open(self.config.xlsx_path, "rb") as xlsx_file:
+                xlsx = xlsx_file.read()
+        else:
+            xlsx = generate_statement_xlsx(self.config.sheets, self.config.rows_per_sheet, self.config.seed)
+        self._state = _State(config=self.config, xlsx=xlsx, random=random.Random(self.config.seed))
+        self._httpd = _FakeHTTPServer((host, port), self._state, verbose)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Базовый URL для ADOBE_BASE_URL / параметра base_url."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self) -> Dict[str, int]:
+        """Число запросов к каждому endpoint'у."""
+        with self._state.lock:
+            return dict(self._state.stats)
+
+    def start(self) -> "FakeAdobeServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-adobe", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Обслуживать запросы в текущем потоке до KeyboardInterrupt."""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "FakeAdobeServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Adobe PDF Services REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds until a job is done")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Random +/- seconds added to job latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of jobs that end with status 'failed'")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of status requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of all requests answered with 503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429 (negative to omit)")
+    parser.add_argument(
+        "--accept-variants",
+        default="1,2,3",
+        help="Comma-separated exportpdf payload variants (1-3) that are accepted; others get 400",
+    )
+    parser.add_argument("--token-ttl", type=int, default=86399, help="Access token lifetime in seconds")
+    parser.add_argument("--xlsx", help="Serve this XLSX file instead of a generated statement")
+    parser.add_argument("--sheets", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=40, help="Rows per generated sheet")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--verbose", "-v", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    config = FakeAdobeConfig(
+        job_latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        failure_rate=args.failure_rate,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after if args.retry_after >= 0 else None,
+        accepted_variants=frozenset(int(v) - 1 for v in args.accept_variants.split(",") if v.strip()),
+        token_ttl=args.token_ttl,
+        xlsx_path=args.xlsx,
+        sheets=args.sheets,
+        rows_per_sheet=args.rows,
+        seed=args.seed,
+    )
+    server = FakeAdobeServer(config, host=args.host, port=args.port, verbose=args.verbose)
+    print(f"[FAKE_ADOBE] Слушаю {server.url} (ADOBE_BASE_URL={server.url})", file=sys.stderr, flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Поиск нескольких групп ключевых слов в строке за один проход скомпилированного регулярного выражения."""
+from __future__ import annotations
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Tuple
+
+
+class KeywordMatcher:
+    """
+    Набор групп ключевых слов, скомпилированный один раз.
+
+    Все слова объединены в одно регулярное выражение с lookahead, поэтому один проход
+    по строке находит каждое вхождение каждого слова вместе с позицией, включая
+    перекрывающиеся ("назнач" внутри "назначение", "дата" внутри "дата печати"):
+    в каждой позиции берется самое длинное совпадение, а более короткие слова,
+    являющиеся его префиксами, добавляются из заранее посчитанной таблицы.
+    Результат тот же, что у проверок вида ``any(kw in text for kw in keywords)``.
+    """
+
+    def __init__(self, groups: Mapping[str, Iterable[str]]) -> None:
+        self._groups: Dict[str, FrozenSet[str]] = {
+            name: frozenset(keyword for keyword in keywords if keyword) for name, keywords in groups.items()
+        }
+        keywords = sorted(set().union(*self._groups.values()), key=lambda keyword: (-len(keyword), keyword))
+        self._keyword_groups: Dict[str, FrozenSet[str]] = {
+            keyword: frozenset(name for name, members in self._groups.items() if keyword in members)
+            for keyword in keywords
+        }
+        # Слова, совпадающие в той же позиции, что и более длинное слово: его префиксы
+        self._prefixes: Dict[str, Tuple[str, ...]] = {
+            keyword: tuple(other for other in keywords if keyword.startswith(other))
+            for keyword in keywords
+        }
+        alternation = "|".join(re.escape(keyword) for keyword in keywords)
+        self._scan_pattern = re.compile(f"(?=({alternation}))") if keywords else None
+        self._group_patterns: Dict[str, Optional[re.Pattern]] = {
+            name: re.compile("|".join(re.escape(keyword) for keyword in sorted(members, key=len, reverse=True)))
+            if members else None
+            for name, members in self._groups.items()
+        }
+
+    def keywords(self, group: str) -> FrozenSet[str]:
+        return self._groups[group]
+
+    def scan(self, text: str) -> List[Tuple[int, str]]:
+        """Все вхождения всех ключевых слов: список (позиция, слово) в порядке позиций."""
+        if self._scan_pattern is None:
+            return []
+        hits: List[Tuple[int, str]] = []
+        for match in self._scan_pattern.finditer(text):
+            position = match.start()
+            hits.extend((position, keyword) for keyword in self._prefixes[match.group(1)])
+        return hits
+
+    def found(self, text: str) -> Dict[str, Set[str]]:
+        """Найденные в строке слова по группам (группы без совпадений - пустые множества)."""
+        result: Dict[str, Set[str]] = {name: set() for name in self._groups}
+        for _, keyword in self.scan(text):
+            for name in self._keyword_groups[keyword]:
+                result[name].add(keyword)
+        return result
+
+    def contains(self, text: str, group: str) -> bool:
+        """Есть ли в строке хотя бы одно слово группы."""
+        pattern = self._group_patterns[group]
+        return pattern is not None and pattern.search(text) is not None
+
+    def first_position(self, text: str, group: str) -> Optional[int]:
+        """Позиция самого раннего вхождения слова группы или None."""
+        pattern = self._group_patterns[group]
+        match = pattern.search(text) if pattern is not None else None
+        return match.start() if match else None
+
+
+__all__ = ["KeywordMatcher"]
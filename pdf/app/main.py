@@ -1,18 +1,22 @@
 from __future__ import annotations
 
+import json
 import os
-from typing import List
+from contextlib import asynccontextmanager
+from typing import Iterator, List, Optional, Tuple
 
 import pandas as pd
-from fastapi import FastAPI, File, HTTPException, UploadFile
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 
-from .pdf_processor import PDFStatementProcessor, merge_tables
+from .adobe_pdf_service import file_size
+from .batch import run_batch_async
+from .converters import BACKEND_CHOICES, LOCAL_BACKEND
+from .metrics import mark_process_dead, metrics_available, render_metrics
+from .pdf_processor import PDFStatementProcessor, StatementStream, merge_tables
+from .triage import PDFRejected
 
-app = FastAPI(title="PDF Statement Cleaner")
-
-# Инициализация процессора с ОБЯЗАТЕЛЬНЫМ Adobe API
-# Приложение использует только Adobe PDF Services API для конвертации PDF в Excel
+# Конвертация PDF в Excel: Adobe PDF Services API или локальное извлечение таблиц (pdfplumber)
 ADOBE_CLIENT_ID = os.getenv("ADOBE_CLIENT_ID")
 ADOBE_CLIENT_SECRET = os.getenv("ADOBE_CLIENT_SECRET")
 ADOBE_CREDENTIALS_FILE = os.getenv("ADOBE_CREDENTIALS_FILE")
@@ -20,11 +24,16 @@ ADOBE_REGION = os.getenv("ADOBE_REGION", "US")
 ADOBE_CONNECT_TIMEOUT = int(os.getenv("ADOBE_CONNECT_TIMEOUT", "4000")) if os.getenv("ADOBE_CONNECT_TIMEOUT") else None
 ADOBE_READ_TIMEOUT = int(os.getenv("ADOBE_READ_TIMEOUT", "10000")) if os.getenv("ADOBE_READ_TIMEOUT") else None
 
-if not ADOBE_CREDENTIALS_FILE and (not ADOBE_CLIENT_ID or not ADOBE_CLIENT_SECRET):
-    raise ValueError(
-        "Adobe API credentials обязательны! Установите переменные окружения: "
-        "ADOBE_CLIENT_ID и ADOBE_CLIENT_SECRET, или ADOBE_CREDENTIALS_FILE"
+PDF_CONVERTER_BACKEND = os.getenv("PDF_CONVERTER_BACKEND")
+
+if not PDF_CONVERTER_BACKEND and not ADOBE_CREDENTIALS_FILE and (not ADOBE_CLIENT_ID or not ADOBE_CLIENT_SECRET):
+    # Без учетных данных Adobe сервис работает на локальной конвертации
+    print(
+        "[WARNING] Adobe API credentials не заданы (ADOBE_CLIENT_ID и ADOBE_CLIENT_SECRET или "
+        "ADOBE_CREDENTIALS_FILE), по умолчанию используется локальная конвертация",
+        flush=True,
     )
+    PDF_CONVERTER_BACKEND = LOCAL_BACKEND
 
 processor = PDFStatementProcessor(
     client_id=ADOBE_CLIENT_ID,
@@ -33,9 +42,21 @@ processor = PDFStatementProcessor(
     region=ADOBE_REGION,
     connect_timeout=ADOBE_CONNECT_TIMEOUT,
     read_timeout=ADOBE_READ_TIMEOUT,
+    backend=PDF_CONVERTER_BACKEND,
 )
 
 
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    yield
+    # Закрываем пулы соединений к Adobe API при остановке воркера
+    await processor.aclose()
+    mark_process_dead()
+
+
+app = FastAPI(title="PDF Statement Cleaner", lifespan=lifespan)
+
+
 @app.get("/", response_class=HTMLResponse)
 def index() -> str:
     return """
@@ -130,69 +151,97 @@ def index() -> str:
 
 
 @app.post("/process")
-async def process_statement(files: List[UploadFile] = File(..., description="Bank statement PDFs")):
-    payload = []
+async def process_statement(
+    files: List[UploadFile] = File(..., description="Bank statement PDFs"),
+    backend: Optional[str] = Query(None, description="Converter backend: adobe, local or auto (chosen by PDF triage)"),
+    stream: bool = Query(False, description="Return NDJSON: a metadata line per file, then a line per transaction"),
+    timings: bool = Query(False, description="Add per-stage timings (Adobe steps, workbook parsing, filtering) to each file"),
+):
+    if backend is not None and backend.strip().lower() not in BACKEND_CHOICES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестный бэкенд конвертации: {backend}. Доступны: {', '.join(BACKEND_CHOICES)}",
+        )
     total_files = len(files)
-    
-    for idx, uploaded_file in enumerate(files, 1):
+    if stream:
+        if timings:
+            raise HTTPException(status_code=400, detail="Время этапов в потоковом режиме не возвращается")
+        return await _process_stream(files, backend)
+
+    async def process_file(indexed: Tuple[int, UploadFile]) -> dict:
+        idx, uploaded_file = indexed
         print(f"[INFO] Обработка файла {idx}/{total_files}: {uploaded_file.filename}", flush=True)
+        extraction = None
         
         try:
             if uploaded_file.content_type not in {"application/pdf", "application/octet-stream"}:
                 # Пропускаем файлы с неподдерживаемым типом, но добавляем в результат с ошибкой
-                payload.append(
-                    {
-                        "source_file": uploaded_file.filename,
-                        "metadata": {},
-                        "transactions": [],
-                        "error": f"Неподдерживаемый тип файла: {uploaded_file.content_type}",
-                    }
-                )
-                continue
+                return {
+                    "source_file": uploaded_file.filename,
+                    "metadata": {},
+                    "transactions": [],
+                    "error": f"Неподдерживаемый тип файла: {uploaded_file.content_type}",
+                }
 
             # Сбрасываем позицию файла на случай, если он уже был прочитан
             await uploaded_file.seek(0)
-            contents = await uploaded_file.read()
+            # Файл не читаем в память целиком: процессор работает с загруженным файлом напрямую
+            size = file_size(uploaded_file.file)
             
             # Проверяем, что файл не пустой
-            if not contents or len(contents) == 0:
+            if not size:
                 raise ValueError(f"Файл {uploaded_file.filename} пустой или не может быть прочитан")
             
-            print(f"[DEBUG] Файл {uploaded_file.filename} прочитан, размер: {len(contents)} байт", flush=True)
+            print(f"[DEBUG] Файл {uploaded_file.filename} получен, размер: {size} байт", flush=True)
             
-            extraction = processor.extract(contents, bank_name=uploaded_file.filename)
+            # Конвертация не блокирует event loop: Adobe - асинхронный клиент, локальная - в потоке
+            extraction = await processor.extract_async(uploaded_file.file, bank_name=uploaded_file.filename, backend=backend)
             frame = merge_tables(extraction.tables)
             transactions = []
             if not frame.empty:
                 frame = frame.astype(object).where(pd.notna(frame), None)
                 transactions = frame.to_dict(orient="records")
 
-            payload.append(
-                {
-                    "source_file": uploaded_file.filename,
-                    "metadata": extraction.metadata,
-                    "transactions": transactions,
-                }
-            )
             print(f"[INFO] Файл {idx}/{total_files} обработан успешно: найдено {len(transactions)} транзакций", flush=True)
+            result = {
+                "source_file": uploaded_file.filename,
+                "metadata": extraction.metadata,
+                "transactions": transactions,
+            }
+            if timings:
+                result["timings"] = extraction.timings
+            return result
             
+        except PDFRejected as e:
+            # Файл отклонен до конвертации: в ответе причина и результат проверки
+            print(f"[INFO] Файл {uploaded_file.filename} отклонен: {e.report.reason}", flush=True)
+            return {
+                "source_file": uploaded_file.filename,
+                "metadata": {"triage": e.report.to_metadata()},
+                "transactions": [],
+                "error": str(e),
+            }
         except Exception as e:
-            # Обрабатываем ошибки для каждого файла отдельно
+            # Обрабатываем ошибки для каждого файла отдельно, остальные файлы продолжают обрабатываться
             error_message = str(e)
             print(f"[ERROR] Ошибка при обработке файла {uploaded_file.filename}: {error_message}", flush=True)
             import traceback
             print(f"[ERROR] Traceback: {traceback.format_exc()}", flush=True)
             
-            payload.append(
-                {
-                    "source_file": uploaded_file.filename,
-                    "metadata": {},
-                    "transactions": [],
-                    "error": error_message,
-                }
-            )
-            # Продолжаем обработку остальных файлов
-            continue
+            return {
+                "source_file": uploaded_file.filename,
+                "metadata": {},
+                "transactions": [],
+                "error": error_message,
+            }
+        finally:
+            # XLSX в ответ не попадает: временный файл или файл кэша закрывается сразу
+            if extraction is not None:
+                extraction.close()
+
+    # Файлы обрабатываются параллельно (до PDF_BATCH_CONCURRENCY одновременно),
+    # результаты возвращаются в порядке загрузки
+    payload = await run_batch_async(process_file, list(enumerate(files, 1)))
 
     # Проверяем, есть ли хотя бы один успешно обработанный файл с транзакциями
     successful_files = [item for item in payload if item.get("transactions") and not item.get("error")]
@@ -205,6 +254,91 @@ async def process_statement(files: List[UploadFile] = File(..., description="Ban
     return payload
 
 
+# Сколько транзакций отправляется одним фрагментом потокового ответа
+STREAM_CHUNK_TRANSACTIONS = 200
+
+
+def _ndjson_line(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+async def _process_stream(files: List[UploadFile], backend: Optional[str]) -> StreamingResponse:
+    """
+    Ответ /process?stream=true в формате NDJSON.
+
+    Загруженные файлы закрываются сразу после возврата ответа, поэтому PDF конвертируются
+    (параллельно, как в обычном режиме) до его начала. Строки XLSX читаются уже при отправке
+    тела ответа окнами, так что транзакции выписки не собираются в памяти целиком.
+    """
+    total_files = len(files)
+
+    async def open_stream(indexed: Tuple[int, UploadFile]) -> Tuple[dict, Optional[StatementStream]]:
+        idx, uploaded_file = indexed
+        print(f"[INFO] Потоковая обработка файла {idx}/{total_files}: {uploaded_file.filename}", flush=True)
+        try:
+            if uploaded_file.content_type not in {"application/pdf", "application/octet-stream"}:
+                return {
+                    "source_file": uploaded_file.filename,
+                    "metadata": {},
+                    "error": f"Неподдерживаемый тип файла: {uploaded_file.content_type}",
+                }, None
+            await uploaded_file.seek(0)
+            if not file_size(uploaded_file.file):
+                raise ValueError(f"Файл {uploaded_file.filename} пустой или не может быть прочитан")
+            statement = await processor.extract_stream_async(uploaded_file.file, bank_name=uploaded_file.filename, backend=backend)
+            return {"source_file": uploaded_file.filename, "metadata": statement.metadata}, statement
+        except PDFRejected as e:
+            print(f"[INFO] Файл {uploaded_file.filename} отклонен: {e.report.reason}", flush=True)
+            return {
+                "source_file": uploaded_file.filename,
+                "metadata": {"triage": e.report.to_metadata()},
+                "error": str(e),
+            }, None
+        except Exception as e:
+            print(f"[ERROR] Ошибка при обработке файла {uploaded_file.filename}: {e}", flush=True)
+            return {"source_file": uploaded_file.filename, "metadata": {}, "error": str(e)}, None
+
+    opened = await run_batch_async(open_stream, list(enumerate(files, 1)))
+
+    def body() -> Iterator[str]:
+        # Синхронный генератор: StreamingResponse обходит его в пуле потоков, чтение XLSX
+        # не блокирует event loop
+        try:
+            for header, statement in opened:
+                yield _ndjson_line(header)
+                if statement is None:
+                    continue
+                source_file = header["source_file"]
+                chunk: List[str] = []
+                try:
+                    for transaction in statement.transactions:
+                        chunk.append(_ndjson_line({"source_file": source_file, "transaction": transaction}))
+                        if len(chunk) >= STREAM_CHUNK_TRANSACTIONS:
+                            yield "".join(chunk)
+                            chunk = []
+                except Exception as e:
+                    print(f"[ERROR] Ошибка при чтении файла {source_file}: {e}", flush=True)
+                    chunk.append(_ndjson_line({"source_file": source_file, "error": str(e)}))
+                if chunk:
+                    yield "".join(chunk)
+        finally:
+            # Клиент мог отключиться: закрываем книги, которые еще читаются
+            for _, statement in opened:
+                if statement is not None:
+                    statement.transactions.close()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
 @app.get("/health")
 def healthcheck():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """Метрики Prometheus (с PROMETHEUS_MULTIPROC_DIR - по всем воркерам)."""
+    if not metrics_available():
+        raise HTTPException(status_code=503, detail="prometheus_client не установлен, метрики недоступны")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
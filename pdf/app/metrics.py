@@ -0,0 +1,182 @@
+"""
+Метрики Prometheus для /metrics: счетчики в памяти процесса, общие для воркеров через каталог.
+
+Нужен пакет prometheus_client; без него запись метрик ничего не делает, а /metrics
+отвечает 503. При нескольких воркерах uvicorn задайте PROMETHEUS_MULTIPROC_DIR (пустой
+каталог, общий для воркеров, до запуска процесса): каждый воркер пишет значения в свои
+файлы в нем, /metrics любого воркера суммирует их по всем процессам.
+"""
+from __future__ import annotations
+
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+except ImportError:
+    prometheus_client = None  # type: ignore
+
+# Границы гистограмм: этапы длятся от миллисекунд (разбор) до минут (job Adobe)
+_STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+_POLL_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+_ROW_BUCKETS = (0, 10, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+if prometheus_client is not None:
+    STAGE_SECONDS = Histogram(
+        "pdf_stage_duration_seconds",
+        "Время этапа обработки одного файла (сумма повторов этапа; stage=total - весь файл)",
+        ["stage", "backend"],
+        buckets=_STAGE_BUCKETS,
+    )
+    ADOBE_REQUESTS = Counter(
+        "pdf_adobe_requests_total",
+        "HTTP запросы к Adobe API и хранилищу файлов (каждая попытка), по endpoint'у и статусу ответа",
+        ["endpoint", "status"],
+    )
+    PAYLOAD_FALLBACKS = Counter(
+        "pdf_adobe_payload_fallbacks_total",
+        "Варианты payload экспорта, отклоненные Adobe как неверная схема запроса",
+    )
+    JOB_POLLS = Histogram(
+        "pdf_adobe_job_polls",
+        "Запросы статуса до завершения одного job Adobe",
+        buckets=_POLL_BUCKETS,
+    )
+    CACHE_LOOKUPS = Counter(
+        "pdf_conversion_cache_lookups_total",
+        "Обращения к кэшу конвертаций (hit / miss)",
+        ["result"],
+    )
+    IN_FLIGHT = Gauge(
+        "pdf_conversions_in_flight",
+        "Файлы на этапе проверки и конвертации PDF в XLSX",
+        multiprocess_mode="livesum",
+    )
+    BYTES = Counter(
+        "pdf_bytes_total",
+        "Байты обработанных файлов: in - PDF, out - XLSX от бэкенда конвертации",
+        ["direction"],
+    )
+    ROWS_PARSED = Histogram(
+        "pdf_rows_parsed",
+        "Строк прочитано из листов XLSX одного файла",
+        buckets=_ROW_BUCKETS,
+    )
+    ROWS_KEPT = Histogram(
+        "pdf_rows_kept",
+        "Строк с кредитом в результате одного файла",
+        buckets=_ROW_BUCKETS,
+    )
+
+
+def metrics_available() -> bool:
+    return prometheus_client is not None
+
+
+def multiprocess_dir() -> Optional[str]:
+    """Каталог значений метрик, общий для воркеров (PROMETHEUS_MULTIPROC_DIR)."""
+    return os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+def adobe_endpoint(method: str, url: str) -> str:
+    """Endpoint Adobe по запросу: token, assets, exportpdf, status, result; pre-signed ссылки - upload/download."""
+    path = urlsplit(url).path.rstrip("/")
+    if path.endswith("/token"):
+        return "token"
+    if path.endswith("/assets"):
+        return "assets"
+    if path.endswith("/status"):
+        return "status"
+    if path.endswith("/result"):
+        return "result"
+    if path.endswith("/operation/exportpdf"):
+        return "exportpdf"
+    return "upload" if method.upper() == "PUT" else "download"
+
+
+def record_adobe_request(method: str, url: str, status: Union[int, str]) -> None:
+    """Учесть попытку запроса; status - код ответа или "error", если ответа нет."""
+    if prometheus_client is not None:
+        ADOBE_REQUESTS.labels(adobe_endpoint(method, url), str(status)).inc()
+
+
+def record_payload_fallback() -> None:
+    if prometheus_client is not None:
+        PAYLOAD_FALLBACKS.inc()
+
+
+def record_job_polls(polls: int) -> None:
+    if prometheus_client is not None:
+        JOB_POLLS.observe(polls)
+
+
+def record_cache_lookup(hit: bool) -> None:
+    if prometheus_client is not None:
+        CACHE_LOOKUPS.labels("hit" if hit else "miss").inc()
+
+
+@contextmanager
+def conversion_in_flight() -> Iterator[None]:
+    if prometheus_client is None:
+        yield
+        return
+    IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        IN_FLIGHT.dec()
+
+
+def record_extraction(timings: Dict[str, object]) -> None:
+    """
+    Учесть обработанный файл по его времени этапов (StatementExtraction.timings).
+
+    У потокового разбора (StatementStream.timings) строки листов и строки с кредитом
+    считаются в одном этапе stream_parse.
+    """
+    if prometheus_client is None or not timings:
+        return
+    backend = str(timings.get("backend") or "")
+    stages: Dict[str, Dict[str, float]] = timings.get("stages") or {}  # type: ignore[assignment]
+    for stage, entry in stages.items():
+        STAGE_SECONDS.labels(stage, backend).observe(entry["seconds"])
+    STAGE_SECONDS.labels("total", backend).observe(timings.get("total_seconds") or 0.0)
+    BYTES.labels("in").inc(stages.get("triage", {}).get("bytes", 0))
+    BYTES.labels("out").inc(stages.get("conversion", {}).get("xlsx_bytes", 0))
+    streamed = stages.get("stream_parse", {})
+    ROWS_PARSED.observe(stages.get("workbook_parse", streamed).get("rows", 0))
+    ROWS_KEPT.observe(stages.get("credit_filter", streamed).get("kept", 0))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Текст метрик для /metrics и его Content-Type (с PROMETHEUS_MULTIPROC_DIR - сумма по воркерам)."""
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Убрать значения остановленного воркера из общих gauge (in-flight) в PROMETHEUS_MULTIPROC_DIR."""
+    if prometheus_client is not None and multiprocess_dir():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+__all__ = [
+    "adobe_endpoint",
+    "conversion_in_flight",
+    "mark_process_dead",
+    "metrics_available",
+    "multiprocess_dir",
+    "record_adobe_request",
+    "record_cache_lookup",
+    "record_extraction",
+    "record_job_polls",
+    "record_payload_fallback",
+    "render_metrics",
+]
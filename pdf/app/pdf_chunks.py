@@ -0,0 +1,128 @@
+"""Разбиение больших PDF на диапазоны страниц и склейка XLSX результатов обратно."""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from typing import IO, Callable, Iterable, List, Optional, Sequence, Union
+
+import pandas as pd
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = None  # type: ignore
+    PdfWriter = None  # type: ignore
+
+from .adobe_pdf_service import BufferStream, spooled_result_file
+from .excel_reader import open_workbook
+
+# Сколько первых строк листа просматривать в поисках заголовка таблицы на стыке частей
+_SEAM_HEADER_ROWS = 5
+_SEAM_MARKER = "Продолжение таблицы с предыдущей части документа"
+
+
+def split_pages_from_env() -> int:
+    """Размер части в страницах (PDF_SPLIT_PAGES, 0 - не разбивать)."""
+    return max(0, int(os.getenv("PDF_SPLIT_PAGES", "0")))
+
+
+def split_concurrency() -> int:
+    """Сколько частей одного PDF конвертировать одновременно (PDF_SPLIT_CONCURRENCY)."""
+    return max(1, int(os.getenv("PDF_SPLIT_CONCURRENCY", "4")))
+
+
+def split_pdf(pdf_bytes: Union[bytes, memoryview], pages_per_chunk: int) -> Optional[List[IO[bytes]]]:
+    """
+    Разбить PDF на части по pages_per_chunk страниц.
+
+    Исходный PDF читается без копии в память, каждая часть записывается во временный
+    файл на диске; файлы частей закрывает вызывающий код. Возвращает None, если
+    разбивать не нужно или нельзя: pypdf не установлен, PDF зашифрован или поврежден,
+    страниц не больше pages_per_chunk.
+    """
+    if PdfReader is None or pages_per_chunk <= 0:
+        return None
+    chunks: List[IO[bytes]] = []
+    try:
+        with BufferStream(pdf_bytes) as source:
+            reader = PdfReader(source)
+            if reader.is_encrypted:
+                return None
+            total_pages = len(reader.pages)
+            if total_pages <= pages_per_chunk:
+                return None
+            for start in range(0, total_pages, pages_per_chunk):
+                writer = PdfWriter()
+                for page_idx in range(start, min(start + pages_per_chunk, total_pages)):
+                    writer.add_page(reader.pages[page_idx])
+                chunk_file = tempfile.TemporaryFile()
+                chunks.append(chunk_file)
+                writer.write(chunk_file)
+                chunk_file.seek(0)
+    except Exception as e:
+        close_all(chunks)
+        print(f"[WARNING] Не удалось разбить PDF на части, конвертирую целиком: {e}", file=sys.stderr, flush=True)
+        return None
+    print(f"[PDF_CHUNKS] PDF ({total_pages} страниц) разбит на {len(chunks)} частей по {pages_per_chunk} страниц", file=sys.stderr, flush=True)
+    return chunks
+
+
+def close_all(files: Iterable[IO[bytes]]) -> None:
+    """Закрыть временные файлы частей (или их XLSX), не прерываясь на ошибке одного из них."""
+    for file in files:
+        try:
+            file.close()
+        except Exception as e:
+            print(f"[WARNING] Не удалось закрыть временный файл: {e}", file=sys.stderr, flush=True)
+
+
+def _row_values(row: Sequence) -> List[object]:
+    return [None if pd.isna(value) else value for value in row]
+
+
+def stitch_workbooks(
+    excel_files: Sequence[IO[bytes]],
+    find_header_rows: Callable[[pd.DataFrame], List[int]],
+) -> IO[bytes]:
+    """
+    Склеить XLSX частей в один файл: листы всех частей подряд, в порядке страниц.
+
+    Таблица, разрезанная границей частей, продолжается на первом листе следующей части
+    без заголовка. Чтобы обработка повторяющихся заголовков увидела такую секцию, в
+    начало этого листа вставляется последний заголовок таблицы из предыдущих частей.
+    find_header_rows возвращает позиции всех строк-заголовков листа за один проход.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    last_header: Optional[List[object]] = None
+    sheet_number = 0
+    for chunk_idx, excel_file in enumerate(excel_files):
+        with open_workbook(excel_file) as chunk_workbook:
+            sheets = [chunk_workbook.parse(sheet_name, header=None) for sheet_name in chunk_workbook.sheet_names]
+        for sheet_idx, frame in enumerate(sheets):
+            rows = [_row_values(row) for row in frame.itertuples(index=False, name=None)]
+            header_positions = find_header_rows(frame) if rows else []
+            sheet_header = rows[header_positions[-1]] if header_positions else None
+            is_seam = chunk_idx > 0 and sheet_idx == 0
+            if is_seam and last_header is not None and not any(idx < _SEAM_HEADER_ROWS for idx in header_positions):
+                # Первая строка листа при чтении становится названиями колонок DataFrame и
+                # в поиск заголовков не попадает, поэтому заголовок идет после строки-пометки
+                rows[:0] = [[_SEAM_MARKER], last_header]
+                print(f"[PDF_CHUNKS] Часть {chunk_idx + 1}: заголовок таблицы перенесен с предыдущей части", file=sys.stderr, flush=True)
+            if sheet_header is not None:
+                last_header = sheet_header
+
+            sheet_number += 1
+            sheet = workbook.create_sheet(f"Table {sheet_number}")
+            for row in rows:
+                sheet.append(row)
+
+    result_file = spooled_result_file()
+    workbook.save(result_file)
+    result_file.seek(0)
+    return result_file
+
+
+__all__ = ["close_all", "split_concurrency", "split_pages_from_env", "split_pdf", "stitch_workbooks"]
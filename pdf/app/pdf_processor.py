@@ -1,16 +1,21 @@
 """Utilities for parsing and cleaning bank statement PDFs using Adobe PDF Services API."""
 from __future__ import annotations
 
+import asyncio
 import io
+import logging
 import os
 import re
 import sys
 import tempfile
+import time
 import traceback
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from decimal import Decimal, InvalidOperation
-from typing import Dict, Iterable, List, Optional
+from itertools import islice
+from typing import IO, Dict, Generator, Iterable, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
 try:
@@ -18,12 +23,32 @@ try:
 except ImportError:
     pdfplumber = None  # type: ignore
 
-from .adobe_pdf_service import AdobePDFService
-
-# Функция для логирования в stderr (чтобы не мешать JSON в stdout)
-def _log_debug(msg: str) -> None:
-    """Выводит DEBUG лог в stderr."""
-    print(msg, file=sys.stderr, flush=True)
+from .adobe_pdf_service import PDFSource, file_size, pdf_buffer
+from .batch import run_batch, run_batch_async
+from .conversion_cache import ConversionCache
+from .diagnostics import RowTrace, SheetStats, logger, row_trace
+from .excel_reader import (
+    SheetScan,
+    iter_sheet_rows,
+    open_row_workbook,
+    open_workbook,
+    scan_workbook,
+    sheet_prescan_enabled,
+    stream_window_rows,
+)
+from .keywords import KeywordMatcher
+from .metrics import conversion_in_flight, record_cache_lookup, record_extraction
+from .converters import (
+    ADOBE_BACKEND,
+    AUTO_BACKEND,
+    AdobeConverter,
+    ConverterBackend,
+    ConverterRegistry,
+    default_backend_name,
+)
+from .pdf_chunks import close_all, split_concurrency, split_pages_from_env, split_pdf, stitch_workbooks
+from .timings import StageTimings, collect_timings, timed
+from .triage import PDFRejected, TriageReport, triage_enabled, triage_pdf
 
 @dataclass
 class ProcessedTable:
@@ -36,15 +61,286 @@ class ProcessedTable:
 
 @dataclass
 class StatementExtraction:
-    """Combined result of metadata and filtered tables for a statement."""
+    """
+    Combined result of metadata and filtered tables for a statement.
+
+    excel_file is the converted XLSX the tables were read from; every result owns its file
+    and releases it on close() (or when used as a context manager).
+    """
 
     bank_name: Optional[str]
     metadata: Dict[str, str]
     tables: List[ProcessedTable]
+    excel_file: Optional[IO[bytes]] = field(default=None, repr=False)
+    excel_filename: Optional[str] = None
+    # Время, байты и строки по этапам обработки (StageTimings.to_dict() с бэкендом и регионом)
+    timings: Dict[str, object] = field(default_factory=dict)
+
+    def close(self) -> None:
+        """Закрыть XLSX (временный файл конвертации или файл кэша)."""
+        if self.excel_file is not None:
+            self.excel_file.close()
+
+    def __enter__(self) -> "StatementExtraction":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+@dataclass
+class StatementStream:
+    """
+    Metadata of a statement and its credit transactions, read from the XLSX lazily.
+
+    Each transaction is a row dict enriched with page_number and bank_name, as in merge_tables().
+    """
+
+    bank_name: Optional[str]
+    metadata: Dict[str, str]
+    transactions: Generator[dict, None, None]
+    # Время этапов как у StatementExtraction; заполняется, когда обход транзакций завершен или закрыт
+    timings: Dict[str, object] = field(default_factory=dict)
+
+
+class _RowConsolidator:
+    """
+    Склейка многострочных записей выписки: строка с номером документа, датой или суммой
+    начинает запись, следующие строки дописываются в нее по индексам колонок.
+
+    Незавершенная запись хранится между вызовами feed(), поэтому строки секции можно
+    подавать частями: результат тот же, что при одном вызове на всю секцию.
+    """
+
+    _DATE_PATTERN = re.compile(r"\d{2}\.\d{2}\.\d{2,4}")
+    _NUMBER_PATTERN = re.compile(r"\d")
+    _DATE_NUMBER_PATTERN = re.compile(r"(\d+)\s+(.*)")
+    _ZERO_VALUES = ("0", "0,00", "0.00", "")
+
+    def __init__(self, columns: List[str], keywords: KeywordMatcher, trace: Optional[RowTrace] = None) -> None:
+        self.columns = columns
+        self._keywords = keywords
+        self._trace = trace
+        column_index = {col: idx for idx, col in enumerate(columns)}
+        self._no_idx = column_index.get("№")
+        self._date_idx = column_index.get("Дата")
+        self._credit_idx = column_index.get("Кредит")
+        self._debit_idx = column_index.get("Дебет")
+        # Порядок важен: номер документа берется из первой непустой колонки
+        self._doc_no_indices = [column_index[col] for col in ("№", "Номер док", "Документ") if col in column_index]
+        self._fallback_no_indices = [column_index[col] for col in ("Номер док", "Документ", "№") if col in column_index]
+        self._numeric_columns = [col in ("Дебет", "Кредит", "Курс") for col in columns]
+        self._entry_indices = [idx for idx, col in enumerate(columns) if col not in ("№", "Дата")]
+        # Если колонки "№" нет, номер, найденный в дате или других колонках, пишется в дополнительную
+        self._output_no_idx = self._no_idx if self._no_idx is not None else len(columns)
+        self._output_width = len(columns) if self._no_idx is not None else len(columns) + 1
+        self._current: Optional[List[Optional[str]]] = None
+        self.processed_rows = 0
+        self.skipped_empty = 0
+        self.skipped_headers = 0
+        self.record_count = 0
+
+    def feed(self, dataframe: pd.DataFrame) -> List[List[Optional[str]]]:
+        """Обработать строки и вернуть записи, завершенные ими (последняя запись остается открытой)."""
+        no_idx = self._no_idx
+        date_idx = self._date_idx
+        credit_idx = self._credit_idx
+        debit_idx = self._debit_idx
+        doc_no_indices = self._doc_no_indices
+        fallback_no_indices = self._fallback_no_indices
+        numeric_columns = self._numeric_columns
+        entry_indices = self._entry_indices
+        output_no_idx = self._output_no_idx
+        date_pattern = self._DATE_PATTERN
+        number_pattern = self._NUMBER_PATTERN
+        date_number_pattern = self._DATE_NUMBER_PATTERN
+        zero_values = self._ZERO_VALUES
+        trace = self._trace
+
+        # Ячейки очищаются разом: None для пустых, иначе str(value).strip()
+        data = dataframe.to_numpy(dtype=object, copy=True)
+        missing = pd.isna(data)
+        empty_rows = missing.all(axis=1)
+        data[missing] = None
+        data[~missing] = [str(value).strip() for value in data[~missing]]
+        cells = data.tolist()
+
+        # Записей не больше, чем строк: буфер выделяется один раз, строки продолжения
+        # дописываются в текущую запись по индексам колонок
+        buffer: List[List[Optional[str]]] = [[None] * self._output_width for _ in range(len(cells))]
+        used = 0
+        completed: List[List[Optional[str]]] = []
+        current = self._current
+        self.skipped_empty += int(empty_rows.sum())
+
+        for row, is_empty in zip(cells, empty_rows):
+            if is_empty:
+                continue
+
+            row_text = " ".join(value.lower() for value in row if value)
+            if (
+                self._keywords.contains(row_text, "consolidate_header")
+                and not any(map(str.isdigit, row_text))
+            ):
+                self.skipped_headers += 1
+                if trace is not None and trace.sample():
+                    trace.log("строка %s пропущена как повтор заголовка", row)
+                continue
+
+            self.processed_rows += 1
+
+            candidate_no = None
+            for idx in doc_no_indices:
+                candidate_no = candidate_no or row[idx]
+            candidate_date = row[date_idx] if date_idx is not None else None
+            candidate_credit = row[credit_idx] if credit_idx is not None else None
+            candidate_debit = row[debit_idx] if debit_idx is not None else None
+
+            # Проверяем, есть ли кредит или дебет в строке
+            has_credit_value = candidate_credit and candidate_credit.strip() and candidate_credit.strip() not in zero_values
+            has_debit_value = candidate_debit and candidate_debit.strip() and candidate_debit.strip() not in zero_values
+
+            new_entry = False
+            extracted_no: Optional[str] = None
+
+            if candidate_no and number_pattern.search(candidate_no):
+                new_entry = True
+                extracted_no = candidate_no
+            elif candidate_date:
+                match = date_number_pattern.match(candidate_date)
+                if match:
+                    extracted_no = match.group(1)
+                    candidate_date = match.group(2)
+                    new_entry = True
+                elif date_pattern.search(candidate_date):
+                    new_entry = True
+            # Если есть кредит или дебет - это тоже может быть новая запись
+            elif has_credit_value or has_debit_value:
+                new_entry = True
+                # Пробуем найти номер документа в других колонках
+                for idx in fallback_no_indices:
+                    if row[idx] and number_pattern.search(row[idx]):
+                        extracted_no = row[idx]
+                        break
+
+            if trace is not None and trace.sample():
+                outcome = "новая запись" if new_entry else "продолжение записи" if current is not None else "пропущена до первой записи"
+                trace.log("строка %s -> %s", row, outcome)
+
+            if new_entry:
+                if current is not None:
+                    completed.append(current)
+                current = buffer[used]
+                used += 1
+                self.record_count += 1
+                if extracted_no:
+                    current[output_no_idx] = extracted_no
+                if candidate_date:
+                    current[date_idx] = candidate_date
+                for idx in entry_indices:
+                    value = row[idx]
+                    if value:
+                        current[idx] = value.replace(" ", "") if numeric_columns[idx] else value
+                continue
+
+            if current is None:
+                continue
+
+            for idx, value in enumerate(row):
+                if not value or idx == no_idx:
+                    continue
+                if numeric_columns[idx]:
+                    current[idx] = (current[idx] or "") + value.replace(" ", "")
+                else:
+                    current[idx] = " ".join(filter(None, [current[idx], value])).strip()
+
+        self._current = current
+        return completed
+
+    def finish(self) -> List[List[Optional[str]]]:
+        """Закрыть последнюю открытую запись."""
+        current, self._current = self._current, None
+        return [current] if current is not None else []
+
+    def frame(self, records: List[List[Optional[str]]]) -> pd.DataFrame:
+        """DataFrame из записей; колонка "№" добавляется, только если номер был найден вне нее."""
+        columns = self.columns
+        extra_no_used = self._no_idx is None and any(record[-1] is not None for record in records)
+        if self._no_idx is None and not extra_no_used:
+            for record in records:
+                del record[-1]
+        output_columns = columns + ["№"] if extra_no_used else columns
+        result_df = pd.DataFrame(records, columns=output_columns)
+        return result_df.replace("", pd.NA).dropna(how="all")
+
+
+class _StreamSection:
+    """Секция листа под одним заголовком в потоковом режиме: колонки и склейка записей."""
+
+    def __init__(self, columns: List[str], keywords: KeywordMatcher) -> None:
+        # Колонки по позициям ячеек листа; колонки без названия в обработку не попадают
+        self.columns = columns
+        self.positions = [idx for idx, col in enumerate(columns) if col]
+        self.consolidator = _RowConsolidator([columns[idx] for idx in self.positions], keywords, row_trace("консолидация"))
+        self.has_credit = True
 
 
 class PDFStatementProcessor:
-    """Extracts rows with non-empty credit column values from bank statements using Adobe PDF Services API."""
+    """Extracts rows with non-empty credit column values from bank statements (Adobe PDF Services API or local pdfplumber)."""
+
+    # Ключевые слова заголовков таблицы (нужно минимум 2 различных)
+    _TABLE_HEADER_KEYWORDS = (
+        "кредит", "дебет", "credit", "debit",
+        "дата", "date", "күні",
+        "номер", "документ", "document", "№",
+        "назначение", "назнач",
+    )
+    # Ключевые слова шапки выписки (метаданные, а не заголовок таблицы)
+    _METADATA_KEYWORDS = (
+        "лицевой счет", "лицевой счёт", "л/с",
+        "валюта счета", "валюта", "currency",
+        "период", "period",
+        "входящий остаток", "исходящий остаток",
+        "банк", "bank", "бик",
+        "клиент", "client",
+        "дата печати", "время печати",
+        "выписка по счету", "выписка",
+    )
+    # Признаки заголовка в строке, следующей за кандидатом в заголовки
+    _DATA_ROW_HEADER_KEYWORDS = ("кредит", "дебет", "дата", "номер", "credit", "debit", "date")
+    # Строка-заголовок, повторно попавшая в данные при консолидации
+    _CONSOLIDATE_HEADER_KEYWORDS = ("дата", "назна", "дебет", "кредит")
+    # Итоговые строки выписки
+    _SUMMARY_KEYWORDS = (
+        "обороты", "итого", "входящий остаток", "исходящий остаток",
+        "всего", "total", "summary", "итог", "остаток",
+        "документов по дебету", "документов по кредиту", "документов:",
+    )
+    # Итоговый текст, приклеенный к дате: все после него отрезается
+    _SUMMARY_CUT_KEYWORDS = ("обороты", "итого", "документов")
+    # Дата операции в ячейке: 2024-05-06, 2024/05/06 или 06.05.2024
+    _DATE_PATTERN = re.compile(r"\d{4}[-/]\d{2}[-/]\d{2}|\d{2}\.\d{2}\.\d{4}")
+    # Канонические названия колонок в порядке проверки (первое совпадение побеждает);
+    # дата проверяется раньше курса, чтобы не путать её с курсом
+    _COLUMN_ALIASES = (
+        ("Кредит", ("кредит",)),
+        ("Дебет", ("дебет",)),
+        ("Назначение платежа", ("назнач", "тағайындал", "төлем")),
+        ("Дата", ("дата", "күні", "date")),
+        ("Курс", ("курс", "бағам")),
+        ("Отправитель", ("отправ", "жібер")),
+        ("Получатель", ("получ", "алушы")),
+        ("Документ", ("номер", "нөмір", "құжат", "document")),
+        ("№", ("№", "номер", "no", "entry")),
+    )
+    # Начало листа, в котором ищется первый заголовок в потоковом режиме (как в _find_header_row),
+    # и минимальный размер окна
+    _STREAM_MIN_WINDOW_ROWS = 50
+    # Сумма в ячейке целиком (после _clean_numeric_value): "1234,56", "-150.5", "42"
+    _AMOUNT_PATTERN = re.compile(r"^-?\d[\d ]*(?:[.,]\d{1,2})?$")
+    # Разделитель ячеек в тексте строки: в XLSX (XML 1.0) символ NUL встретиться не может,
+    # поэтому поиск подстроки в склеенном тексте равен поиску в каждой ячейке
+    _CELL_SEPARATOR = "\x00"
 
     def __init__(
         self,
@@ -57,9 +353,11 @@ class PDFStatementProcessor:
         region: Optional[str] = None,
         connect_timeout: Optional[int] = None,
         read_timeout: Optional[int] = None,
+        split_pages: Optional[int] = None,
+        backend: Optional[str] = None,
     ) -> None:
         """
-        Инициализация процессора с обязательным Adobe API.
+        Инициализация процессора.
 
         Args:
             credit_headers: Заголовки столбцов для кредита
@@ -71,6 +369,11 @@ class PDFStatementProcessor:
             region: Регион обработки ('US' или 'EU')
             connect_timeout: Таймаут подключения в мс
             read_timeout: Таймаут чтения в мс
+            split_pages: Разбивать PDF на части по столько страниц и конвертировать их
+                параллельно (по умолчанию PDF_SPLIT_PAGES, 0 - не разбивать)
+            backend: Бэкенд конвертации по умолчанию: 'adobe', 'local' или 'auto' - выбор по
+                предварительной проверке PDF (по умолчанию PDF_CONVERTER_BACKEND); отдельный
+                запрос может выбрать другой
         """
         self._empty_tokens = {"", "-", "—", "none", "null", "nan", "н/д"}
         self.credit_headers = {
@@ -95,43 +398,89 @@ class PDFStatementProcessor:
             self._normalize_header(h)
             for h in (date_headers or default_date_headers)
         }
+        self._keywords = self._build_keyword_matcher()
 
-        # Инициализируем Adobe API сервис (обязательно)
+        self._default_backend = (backend or default_backend_name()).strip().lower()
         import sys
-        print(f"[PDF_PROCESSOR] Инициализация AdobePDFService...", file=sys.stderr, flush=True)
+        print(f"[PDF_PROCESSOR] Бэкенд конвертации по умолчанию: {self._default_backend}", file=sys.stderr, flush=True)
         print(f"[PDF_PROCESSOR] client_id: {'✅ установлен' if client_id else '❌ не установлен'}", file=sys.stderr, flush=True)
         print(f"[PDF_PROCESSOR] client_secret: {'✅ установлен' if client_secret else '❌ не установлен'}", file=sys.stderr, flush=True)
         print(f"[PDF_PROCESSOR] credentials_file: {credentials_file or 'не установлен'}", file=sys.stderr, flush=True)
         print(f"[PDF_PROCESSOR] region: {region or 'US (по умолчанию)'}", file=sys.stderr, flush=True)
         
+        self._converters = ConverterRegistry({
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "credentials_file": credentials_file,
+            "region": region,
+            "connect_timeout": connect_timeout,
+            "read_timeout": read_timeout,
+        })
+        # Бэкенд по умолчанию создаем сразу, чтобы ошибка настройки была видна при запуске;
+        # остальные - при первом запросе к ним
         try:
-            self._adobe_service = AdobePDFService(
-                client_id=client_id,
-                client_secret=client_secret,
-                credentials_file=credentials_file,
-                region=region,
-                connect_timeout=connect_timeout,
-                read_timeout=read_timeout,
-            )
-            print(f"[PDF_PROCESSOR] ✅ AdobePDFService инициализирован успешно", file=sys.stderr, flush=True)
+            if self._default_backend != AUTO_BACKEND:
+                self._converters.get(self._default_backend)
+            print(f"[PDF_PROCESSOR] ✅ Бэкенд '{self._default_backend}' инициализирован успешно", file=sys.stderr, flush=True)
         except Exception as e:
-            print(f"[PDF_PROCESSOR] ❌ Ошибка инициализации AdobePDFService: {e}", file=sys.stderr, flush=True)
+            print(f"[PDF_PROCESSOR] ❌ Ошибка инициализации бэкенда '{self._default_backend}': {e}", file=sys.stderr, flush=True)
             import traceback
             print(f"[PDF_PROCESSOR] Traceback: {traceback.format_exc()}", file=sys.stderr, flush=True)
             raise
-        
-        # Для сохранения последнего Excel файла для просмотра
-        self._last_excel_bytes: Optional[bytes] = None
-        self._last_excel_filename: Optional[str] = None
+        # Кэш конвертаций: повторная загрузка того же PDF не отправляется в Adobe
+        self._conversion_cache = ConversionCache.from_env()
+        # Предварительная проверка PDF до конвертации (отклонение заведомо пустых файлов, выбор бэкенда)
+        self._triage_enabled = triage_enabled()
+        self._split_pages = split_pages_from_env() if split_pages is None else max(0, split_pages)
+
+    def _triage(
+        self, pdf_bytes: Union[bytes, memoryview], backend: str
+    ) -> tuple[ConverterBackend, Optional[TriageReport]]:
+        """
+        Проверить PDF до конвертации и выбрать бэкенд.
+
+        Отклоненный проверкой файл (нет страниц, пароль; без столбцов кредита/дебета - только
+        с PDF_TRIAGE_REJECT_NO_KEYWORDS) завершается PDFRejected при любом бэкенде; в режиме
+        'auto' бэкенд берется из решения проверки (без нее - Adobe).
+        """
+        report = triage_pdf(pdf_bytes, self.credit_headers | self.debit_headers) if self._triage_enabled else None
+        if report is not None and report.rejected:
+            raise PDFRejected(report)
+        if backend == AUTO_BACKEND:
+            backend = report.decision if report is not None else ADOBE_BACKEND
+        return self._converters.get(backend), report
+
+    def close(self) -> None:
+        """Освободить сетевые ресурсы (пулы соединений Adobe API)."""
+        self._converters.close()
+
+    async def aclose(self) -> None:
+        """Освободить сетевые ресурсы, включая асинхронный клиент Adobe API."""
+        await self._converters.aclose()
+
+    def _build_keyword_matcher(self) -> KeywordMatcher:
+        """Все наборы ключевых слов эвристик в одном скомпилированном матчере."""
+        groups = {
+            "table_header": self._TABLE_HEADER_KEYWORDS,
+            "metadata": self._METADATA_KEYWORDS,
+            "credit_debit": self.credit_headers | self.debit_headers,
+            "data_row_header": self._DATA_ROW_HEADER_KEYWORDS,
+            "consolidate_header": self._CONSOLIDATE_HEADER_KEYWORDS,
+            "summary": self._SUMMARY_KEYWORDS,
+            "summary_cut": self._SUMMARY_CUT_KEYWORDS,
+        }
+        groups.update({f"column:{name}": tokens for name, tokens in self._COLUMN_ALIASES})
+        return KeywordMatcher(groups)
+
+    def _cut_at_summary(self, text: str) -> str:
+        """Отрезать итоговый текст ("обороты", "итого", "документов"), приклеенный к значению."""
+        position = self._keywords.first_position(text.lower(), "summary_cut")
+        return text[:position].strip() if position is not None else text
 
     @staticmethod
     def _normalize_header(header: str) -> str:
         return header.strip().lower().replace("\n", " ")
 
-    @staticmethod
-    def _is_row_empty(row: Iterable[object]) -> bool:
-        return all((str(cell).strip() == "" or cell is None) for cell in row)
-
     def _is_effectively_empty(self, value: object) -> bool:
         if value is None:
             return True
@@ -198,6 +547,36 @@ class PDFStatementProcessor:
         except InvalidOperation:
             return None
 
+    def _present_mask(self, values: np.ndarray) -> np.ndarray:
+        """Маска непустых ячеек колонки: pd.notna и не _is_effectively_empty."""
+        return np.fromiter(
+            (pd.notna(value) and not self._is_effectively_empty(value) for value in values),
+            dtype=bool,
+            count=len(values),
+        )
+
+    def _parse_amount_column(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Очистить и распознать числовую колонку целиком.
+
+        Возвращает массивы длины колонки: значения непустых ячеек после
+        _clean_numeric_value (None для пустых) и маску ячеек с суммой > 0.
+        Одинаковые значения разбираются один раз.
+        """
+        present = self._present_mask(values)
+        cleaned_values = np.full(len(values), None, dtype=object)
+        positive = np.zeros(len(values), dtype=bool)
+        parsed: Dict[object, Tuple[str, bool]] = {}
+        for position in np.flatnonzero(present):
+            value = values[position]
+            result = parsed.get(value)
+            if result is None:
+                cleaned = self._clean_numeric_value(value)
+                amount = self._to_decimal(cleaned) if cleaned else None
+                result = parsed[value] = (cleaned, amount is not None and amount > 0)
+            cleaned_values[position], positive[position] = result
+        return cleaned_values, positive
+
     def _detect_column(self, columns: Iterable[str], known_headers: Iterable[str]) -> Optional[int]:
         normalized_known = set(known_headers)
         for idx, col in enumerate(columns):
@@ -277,49 +656,26 @@ class PDFStatementProcessor:
         if len(non_empty_cells) < 3:
             return False
         
-        # Нормализуем все значения строки
+        # Нормализуем все значения строки и ищем все ключевые слова за один проход
         normalized_row = [self._normalize_header(cell) for cell in row_values]
-        row_text = " ".join(normalized_row)
+        found = self._keywords.found(self._CELL_SEPARATOR.join(normalized_row))
         
         # Проверяем наличие ключевых слов заголовков таблицы
-        table_header_keywords = [
-            "кредит", "дебет", "credit", "debit",
-            "дата", "date", "күні",
-            "номер", "документ", "document", "№",
-            "назначение", "назнач",
-        ]
-        
         # Используем set для уникальности найденных ключевых слов
-        found_keywords = {kw for kw in table_header_keywords if any(kw in cell for cell in normalized_row)}
+        found_keywords = found["table_header"]
         
         # Должно быть найдено минимум 2 различных ключевых слова (например, дата + кредит, или номер + кредит)
         if len(found_keywords) < 2:
             return False
         
         # Обязательно должно быть ключевое слово кредита или дебета
-        has_credit_debit = any(
-            any(header in cell for header in self.credit_headers | self.debit_headers)
-            for cell in normalized_row
-        )
+        has_credit_debit = bool(found["credit_debit"])
         if not has_credit_debit:
             return False
         
         # Проверяем, что это НЕ метаданные
-        metadata_keywords = [
-            "лицевой счет", "лицевой счёт", "л/с",
-            "валюта счета", "валюта", "currency",
-            "период", "period",
-            "входящий остаток", "исходящий остаток",
-            "банк", "bank", "бик",
-            "клиент", "client",
-            "дата печати", "время печати",
-            "выписка по счету", "выписка",
-        ]
-        
         # Если строка содержит только метаданные без достаточного количества колонок таблицы
-        contains_metadata_only = any(
-            any(mk in cell for cell in normalized_row) for mk in metadata_keywords
-        ) and len(found_keywords) < 3
+        contains_metadata_only = bool(found["metadata"]) and len(found_keywords) < 3
         
         if contains_metadata_only:
             return False
@@ -331,10 +687,7 @@ class PDFStatementProcessor:
             
             # Следующая строка должна содержать признаки данных: цифры, даты, но не заголовки
             has_numbers = any(re.search(r'\d', val) for val in next_row_values)
-            has_no_header_keywords = not any(
-                kw in " ".join(next_row_values).lower() 
-                for kw in ["кредит", "дебет", "дата", "номер", "credit", "debit", "date"]
-            )
+            has_no_header_keywords = not self._keywords.contains(next_row_text, "data_row_header")
             
             if has_numbers and has_no_header_keywords:
                 return True  # Следующая строка похожа на данные
@@ -351,6 +704,61 @@ class PDFStatementProcessor:
         # (т.к. все критерии уже проверены выше, просто возвращаем True)
         return True
 
+    def _normalized_cells(self, dataframe: pd.DataFrame) -> List[List[str]]:
+        """
+        Все ячейки листа одним проходом в том виде, в каком их сравнивает
+        _looks_like_table_header: str(cell) без пропусков, strip, lower, без переносов.
+        """
+        cells = dataframe.astype(object).where(pd.notna(dataframe), "")
+        normalize = self._normalize_header
+        return [[normalize(str(cell)) for cell in row] for row in cells.itertuples(index=False, name=None)]
+
+    def _header_row_mask(self, normalized: List[List[str]]) -> np.ndarray:
+        """
+        Векторная версия _looks_like_table_header с проверкой кредита/дебета для всех строк.
+
+        Проверка следующей строки в _looks_like_table_header на результат не влияет
+        (при любом ее исходе возвращается True), поэтому здесь не выполняется.
+        """
+        mask = np.zeros(len(normalized), dtype=bool)
+        if not normalized or not normalized[0]:
+            return mask
+        row_texts = [self._CELL_SEPARATOR.join(row) for row in normalized]
+        non_empty = np.fromiter(
+            (sum(1 for cell in row if cell and cell not in self._empty_tokens) for row in normalized),
+            dtype=np.int64,
+            count=len(normalized),
+        )
+        # Полный поиск ключевых слов - только в строках с кредитом/дебетом и 3+ непустыми ячейками
+        candidates = np.flatnonzero(non_empty >= 3).tolist()
+        for idx in candidates:
+            if not self._keywords.contains(row_texts[idx], "credit_debit"):
+                continue
+            found = self._keywords.found(row_texts[idx])
+            keyword_count = len(found["table_header"])
+            mask[idx] = keyword_count >= 2 and not (found["metadata"] and keyword_count < 3)
+        return mask
+
+    def _find_header_indices(self, dataframe: pd.DataFrame) -> List[int]:
+        """Индексы строк-заголовков таблицы во всем листе, без повторов заголовка в пределах 5 строк."""
+        header_indices: List[int] = []
+        # Лист нормализуется один раз, кандидаты в заголовки находятся масками по всем строкам
+        normalized_cells = self._normalized_cells(dataframe)
+        for idx in np.flatnonzero(self._header_row_mask(normalized_cells)).tolist():
+            # Проверяем, что это не дубликат предыдущего заголовка (похожая структура)
+            # Если предыдущий заголовок был недавно (в пределах 5 строк), это может быть дубликат
+            if header_indices and idx - header_indices[-1] < 5:
+                # Если заголовки очень похожи - это дубликат
+                last_normalized = normalized_cells[header_indices[-1]]
+                if len(set(normalized_cells[idx]) & set(last_normalized)) >= 3:
+                    continue
+            header_indices.append(idx)
+        return header_indices
+
+    def _header_row_positions(self, dataframe: pd.DataFrame) -> List[int]:
+        """Позиции всех строк-заголовков таблицы с колонкой кредита/дебета, без отбора повторов."""
+        return np.flatnonzero(self._header_row_mask(self._normalized_cells(dataframe))).tolist()
+
     def _find_header_row(
         self, dataframe: pd.DataFrame
     ) -> tuple[Optional[int], Optional[pd.Series], bool]:
@@ -371,19 +779,16 @@ class PDFStatementProcessor:
             
             # Проверяем, выглядит ли эта строка как заголовок таблицы
             if self._looks_like_table_header(row, next_row):
-                _log_debug(f"[DEBUG] Найден заголовок прямой проверкой (строка {idx}): выглядит как заголовок таблицы")
+                logger.debug("[DEBUG] Найден заголовок прямой проверкой (строка %s): выглядит как заголовок таблицы", idx)
                 # Дополнительно проверяем наличие кредита/дебета для уверенности
                 normalized = [self._normalize_header(str(cell)) for cell in row]
-                has_credit = any(
-                    any(header in cell for header in self.credit_headers | self.debit_headers)
-                    for cell in normalized
-                )
+                has_credit = self._keywords.contains(self._CELL_SEPARATOR.join(normalized), "credit_debit")
                 if has_credit:
                     return idx, row, True
 
         # ШАГ 2: Fallback - используем накопление только если прямой поиск не дал результата
         # НО: при накоплении тоже проверяем, что результат выглядит как заголовок таблицы
-        _log_debug(f"[DEBUG] Прямой поиск не дал результата, пробуем накопление с проверкой")
+        logger.debug("[DEBUG] Прямой поиск не дал результата, пробуем накопление с проверкой")
         
         accumulated: Optional[pd.Series] = None
         accumulated_start_idx = None
@@ -407,30 +812,27 @@ class PDFStatementProcessor:
                 next_row = dataframe.iloc[idx + 1].fillna("").astype(str)
             
             if self._looks_like_table_header(accumulated, next_row):
-                _log_debug(f"[DEBUG] Найден заголовок накоплением (строки {accumulated_start_idx}-{idx}): выглядит как заголовок таблицы")
+                logger.debug("[DEBUG] Найден заголовок накоплением (строки %s-%s): выглядит как заголовок таблицы", accumulated_start_idx, idx)
                 return idx, accumulated, True
 
         # ШАГ 3: Последний fallback - ищем первую строку с кредитом/дебетом (без строгой проверки)
-        _log_debug(f"[DEBUG] Накопление не дало результата, ищем первую строку с кредитом/дебетом")
+        logger.debug("[DEBUG] Накопление не дало результата, ищем первую строку с кредитом/дебетом")
         
         for idx in range(min(len(dataframe), 50)):
             row = dataframe.iloc[idx].fillna("").astype(str)
             normalized = [self._normalize_header(str(cell)) for cell in row]
             
             # Ищем просто наличие кредита/дебета
-            if any(cell in self.credit_headers | self.debit_headers for cell in normalized):
-                _log_debug(f"[DEBUG] Найдена строка {idx} с кредитом/дебетом как fallback")
+            if any(cell in self._keywords.keywords("credit_debit") for cell in normalized):
+                logger.debug("[DEBUG] Найдена строка %s с кредитом/дебетом как fallback", idx)
                 return idx, row, True
-            if any(
-                any(header in cell for header in self.credit_headers | self.debit_headers)
-                for cell in normalized
-            ):
-                _log_debug(f"[DEBUG] Найдена строка {idx} с кредитом/дебетом (частичное совпадение) как fallback")
+            if self._keywords.contains(self._CELL_SEPARATOR.join(normalized), "credit_debit"):
+                logger.debug("[DEBUG] Найдена строка %s с кредитом/дебетом (частичное совпадение) как fallback", idx)
                 return idx, row, True
 
         # Последний fallback - первая строка
         fallback = dataframe.iloc[0].fillna("").astype(str)
-        _log_debug(f"[DEBUG] Заголовок не найден, используем первую строку как последний fallback")
+        logger.debug("[DEBUG] Заголовок не найден, используем первую строку как последний fallback")
         return None, fallback, False
 
     def _prepare_columns(self, header_series: pd.Series) -> List[str]:
@@ -443,35 +845,12 @@ class PDFStatementProcessor:
             if normalized in self._empty_tokens or col == "":
                 cleaned_columns.append("")
                 continue
-            if "кредит" in normalized:
-                col = "Кредит"
-                normalized = col.lower()
-            elif "дебет" in normalized:
-                col = "Дебет"
-                normalized = col.lower()
-            elif any(token in normalized for token in ("назнач", "тағайындал", "төлем")):
-                col = "Назначение платежа"
-                normalized = col.lower()
-            # Сначала проверяем дату, чтобы не путать её с курсом
-            elif any(token in normalized for token in ("дата", "күні", "date")):
-                col = "Дата"
-                normalized = col.lower()
-            # Курс проверяем после даты, но только если это не дата
-            elif any(token in normalized for token in ("курс", "бағам")) and "дата" not in normalized:
-                col = "Курс"
-                normalized = col.lower()
-            elif any(token in normalized for token in ("отправ", "жібер")):
-                col = "Отправитель"
-                normalized = col.lower()
-            elif any(token in normalized for token in ("получ", "алушы")):
-                col = "Получатель"
-                normalized = col.lower()
-            elif any(token in normalized for token in ("номер", "нөмір", "құжат", "document")):
-                col = "Документ"
-                normalized = col.lower()
-            elif "№" in col or any(token in normalized for token in ("номер", "no", "entry")):
-                col = "№"
-                normalized = col.lower()
+            found = self._keywords.found(normalized)
+            for canonical, _ in self._COLUMN_ALIASES:
+                if found[f"column:{canonical}"]:
+                    col = canonical
+                    normalized = col.lower()
+                    break
             if normalized in seen:
                 suffix = 2
                 candidate = f"{col}_{suffix}"
@@ -484,6 +863,13 @@ class PDFStatementProcessor:
             seen.add(normalized)
         return cleaned_columns
 
+    @staticmethod
+    def _fit_columns(columns: List[str], width: int) -> List[str]:
+        """Подогнать названия колонок под число ячеек: лишние ячейки получают extra_N."""
+        if len(columns) < width:
+            return columns + [f"extra_{i}" for i in range(width - len(columns))]
+        return columns[:width]
+
     @staticmethod
     def _is_numeric_header(header: str) -> bool:
         compact = re.sub(r"[^\d]", "", header)
@@ -494,6 +880,7 @@ class PDFStatementProcessor:
         dataframe: pd.DataFrame,
         page_number: int,
         bank_name: Optional[str],
+        stats: Optional[SheetStats] = None,
     ) -> List[Optional[ProcessedTable]]:
         """
         Обрабатывает DataFrame, разделяя его на части по повторяющимся заголовкам.
@@ -507,46 +894,21 @@ class PDFStatementProcessor:
         
         # Ищем все строки, которые выглядят как заголовки во ВСЕМ DataFrame
         # Это важно для длинных выписок, где заголовки повторяются на каждой странице
-        header_indices = []
+        with timed("header_detection", rows=len(dataframe)):
+            header_indices = self._find_header_indices(dataframe)
         
-        # Проверяем все строки DataFrame для поиска повторяющихся заголовков
-        for idx in range(len(dataframe)):
-            row = dataframe.iloc[idx].fillna("").astype(str)
-            if idx + 1 < len(dataframe):
-                next_row = dataframe.iloc[idx + 1].fillna("").astype(str)
-            else:
-                next_row = None
-            
-            if self._looks_like_table_header(row, next_row):
-                # Проверяем, что это не просто случайное совпадение
-                normalized = [self._normalize_header(str(cell)) for cell in row]
-                has_credit = any(
-                    any(header in cell for header in self.credit_headers | self.debit_headers)
-                    for cell in normalized
-                )
-                if has_credit:
-                    # Проверяем, что это не дубликат предыдущего заголовка (похожая структура)
-                    # Если предыдущий заголовок был недавно (в пределах 5 строк), это может быть дубликат
-                    is_duplicate = False
-                    if header_indices:
-                        last_header_idx = header_indices[-1]
-                        if idx - last_header_idx < 5:
-                            # Сравниваем содержимое заголовков
-                            last_header_row = dataframe.iloc[last_header_idx].fillna("").astype(str)
-                            last_normalized = [self._normalize_header(str(cell)) for cell in last_header_row]
-                            # Если заголовки очень похожи - это дубликат
-                            if len(set(normalized) & set(last_normalized)) >= 3:
-                                is_duplicate = True
-                    
-                    if not is_duplicate:
-                        header_indices.append(idx)
-        
-        _log_debug(f"[DEBUG] Найдено заголовков в листе: {len(header_indices)} (индексы: {header_indices[:20]}...)" if len(header_indices) > 20 else f"[DEBUG] Найдено заголовков в листе: {len(header_indices)} (индексы: {header_indices})")
+        logger.debug(
+            "[DEBUG] Найдено заголовков в листе: %d (индексы: %s%s)",
+            len(header_indices), header_indices[:20], "..." if len(header_indices) > 20 else "",
+        )
+        if stats is not None:
+            stats.headers += len(header_indices)
+            stats.sections += max(len(header_indices), 1)
         
         # Если найдено несколько заголовков, разбиваем DataFrame на части
         # Каждая секция будет обработана с правильными заголовками
         if len(header_indices) > 1:
-            _log_debug(f"[DEBUG] Найдено {len(header_indices)} заголовков, разбиваю DataFrame на {len(header_indices)} секций")
+            logger.debug("[DEBUG] Найдено %s заголовков, разбиваю DataFrame на %s секций", len(header_indices), len(header_indices))
             for i, header_idx in enumerate(header_indices):
                 start_idx = header_idx
                 # Берем все строки до следующего заголовка или до конца
@@ -556,27 +918,29 @@ class PDFStatementProcessor:
                     end_idx = len(dataframe)
                 
                 section_df = dataframe.iloc[start_idx:end_idx].copy().reset_index(drop=True)
-                _log_debug(f"[DEBUG] Обрабатываю секцию {i+1}/{len(header_indices)}: строки {start_idx}-{end_idx} (размер секции: {len(section_df)} строк)")
+                logger.debug("[DEBUG] Обрабатываю секцию %s/%s: строки %s-%s (размер секции: %s строк)", i + 1, len(header_indices), start_idx, end_idx, len(section_df))
                 
                 processed, fallback_columns = self._process_dataframe(
                     section_df, 
                     page_number=page_number, 
                     bank_name=bank_name, 
-                    fallback_columns=fallback_columns
+                    fallback_columns=fallback_columns,
+                    stats=stats,
                 )
                 
                 if processed:
                     results.append(processed)
-                    _log_debug(f"[DEBUG] Секция {i+1} обработана: найдено {len(processed.rows)} строк с кредитом")
+                    logger.debug("[DEBUG] Секция %s обработана: найдено %s строк с кредитом", i + 1, len(processed.rows))
         else:
             # Заголовок один или не найден - обрабатываем весь DataFrame
             # Это нормально для банков, где заголовок только в начале выписки
-            _log_debug(f"[DEBUG] Заголовок один ({len(header_indices)}) или не найден - обрабатываю весь DataFrame как одну секцию")
+            logger.debug("[DEBUG] Заголовок один (%s) или не найден - обрабатываю весь DataFrame как одну секцию", len(header_indices))
             processed, _ = self._process_dataframe(
                 dataframe, 
                 page_number=page_number, 
                 bank_name=bank_name, 
-                fallback_columns=fallback_columns
+                fallback_columns=fallback_columns,
+                stats=stats,
             )
             if processed:
                 results.append(processed)
@@ -589,14 +953,16 @@ class PDFStatementProcessor:
         page_number: int,
         bank_name: Optional[str],
         fallback_columns: Optional[List[str]] = None,
+        stats: Optional[SheetStats] = None,
     ) -> tuple[Optional[ProcessedTable], Optional[List[str]]]:
         if dataframe.empty:
-            _log_debug(f"[DEBUG] DataFrame пустой")
+            logger.debug("[DEBUG] DataFrame пустой")
             return None, fallback_columns
 
-        _log_debug(f"[DEBUG] Ищу заголовок в DataFrame: {len(dataframe)} строк, {len(dataframe.columns)} колонок")
-        header_idx, header_series, header_found = self._find_header_row(dataframe)
-        _log_debug(f"[DEBUG] Найден заголовок: idx={header_idx}, found={header_found}")
+        logger.debug("[DEBUG] Ищу заголовок в DataFrame: %s строк, %s колонок", len(dataframe), len(dataframe.columns))
+        with timed("header_detection"):
+            header_idx, header_series, header_found = self._find_header_row(dataframe)
+        logger.debug("[DEBUG] Найден заголовок: idx=%s, found=%s", header_idx, header_found)
 
         if header_found and header_series is not None and header_idx is not None:
             dataframe = dataframe.iloc[header_idx + 1 :].reset_index(drop=True)
@@ -614,183 +980,145 @@ class PDFStatementProcessor:
         if not columns:
             return None, fallback_columns
 
-        col_count = len(columns)
-        if col_count < dataframe.shape[1]:
-            extras = [f"extra_{i}" for i in range(dataframe.shape[1] - col_count)]
-            columns = columns + extras
-        elif col_count > dataframe.shape[1]:
-            columns = columns[: dataframe.shape[1]]
-
-        dataframe.columns = columns
+        dataframe.columns = self._fit_columns(columns, dataframe.shape[1])
         dataframe = dataframe[[col for col in dataframe.columns if col]]
 
         dataframe = dataframe.replace(pd.NA, None)
-        dataframe = self._consolidate_rows(dataframe)
+        dataframe = self._consolidate_rows(dataframe, stats)
         if dataframe.empty:
-            _log_debug(f"[DEBUG] DataFrame пустой после консолидации")
+            logger.debug("[DEBUG] DataFrame пустой после консолидации")
+            return None, fallback_columns
+
+        with timed("credit_filter", rows=len(dataframe)) as credit_filter:
+            filtered_rows = self._filter_credit_rows(dataframe, stats)
+            credit_filter["kept"] = len(filtered_rows or [])
+        if filtered_rows is None:
+            return None, fallback_columns
+
+        if not filtered_rows:
+            logger.debug("[DEBUG] Не найдено строк для обработки")
             return None, fallback_columns
 
-        _log_debug(f"[DEBUG] Ищу колонку кредита среди колонок: {list(dataframe.columns)}")
-        _log_debug(f"[DEBUG] Ищу колонку кредита среди заголовков: {self.credit_headers}")
+        logger.debug("[DEBUG] Итого добавлено в результат: %s строк", len(filtered_rows))
+        
+        # Выводим номера документов из результата для проверки (список собирается только для DEBUG)
+        if logger.isEnabledFor(logging.DEBUG):
+            doc_numbers = [row["№"] for row in filtered_rows if "№" in row]
+            logger.debug(
+                "[DEBUG] Номера документов в результате: %s%s",
+                doc_numbers[:10], "..." if len(doc_numbers) > 10 else "",
+            )
+
+        return (
+            ProcessedTable(page_number=page_number, bank_name=bank_name, rows=filtered_rows),
+            dataframe.columns.tolist(),
+        )
+
+    def _filter_credit_rows(self, dataframe: pd.DataFrame, stats: Optional[SheetStats] = None) -> Optional[List[dict]]:
+        """
+        Строки консолидированной таблицы с кредитом, очищенные для результата.
+
+        None - в таблице нет колонки кредита.
+        """
+        logger.debug("[DEBUG] Ищу колонку кредита среди колонок: %s", list(dataframe.columns))
+        logger.debug("[DEBUG] Ищу колонку кредита среди заголовков: %s", self.credit_headers)
         credit_column_idx = self._detect_column(dataframe.columns, self.credit_headers)
         if credit_column_idx is None:
-            print(f"[ERROR] Не найдена колонка кредита! Доступные колонки: {list(dataframe.columns)}", file=sys.stderr, flush=True)
-            return None, fallback_columns
+            logger.warning("[WARNING] Не найдена колонка кредита! Доступные колонки: %s", list(dataframe.columns))
+            return None
         
-        _log_debug(f"[DEBUG] Найдена колонка кредита: idx={credit_column_idx}, name={dataframe.columns[credit_column_idx]}")
+        logger.debug("[DEBUG] Найдена колонка кредита: idx=%s, name=%s", credit_column_idx, dataframe.columns[credit_column_idx])
 
         date_column_idx = self._detect_column(dataframe.columns, self.date_headers)
         debit_column_idx = self._detect_column(dataframe.columns, self.debit_headers)
 
         credit_column_name = dataframe.columns[credit_column_idx]
 
-        filtered_rows: List[dict] = []
-
-        # Ключевые слова для фильтрации итоговых строк
-        summary_keywords = [
-            "обороты", "итого", "входящий остаток", "исходящий остаток",
-            "всего", "total", "summary", "итог", "остаток",
-            "документов по дебету", "документов по кредиту", "документов:"
-        ]
-
-        row_number = 0
-        for idx, row in dataframe.iterrows():
-            row_number += 1
-            if self._is_row_empty(row):
-                _log_debug(f"[DEBUG] Строка {row_number}: пропущена - пустая строка")
-                continue
+        # Правила фильтра считаются по колонкам целиком: каждая колонка очищается и
+        # разбирается один раз, словари строк собираются только для прошедших фильтр
+        data = dataframe.to_numpy(dtype=object)
+        row_count = len(data)
+        credit_values, has_credit = self._parse_amount_column(data[:, credit_column_idx])
+
+        has_doc_no = np.zeros(row_count, dtype=bool)
+        if "№" in dataframe.columns:
+            doc_no_values = data[:, dataframe.columns.get_loc("№")]
+            # Номер документа должен содержать цифры (это реальный номер, а не заголовок)
+            for position in np.flatnonzero(self._present_mask(doc_no_values)):
+                has_doc_no[position] = re.search(r"\d", str(doc_no_values[position]).strip()) is not None
+
+        # Итоговые строки: проверяем только строки с кредитом без номера документа -
+        # если есть кредит > 0 и номер документа, это реальная операция, а без кредита
+        # строка отбрасывается в любом случае
+        is_summary = np.zeros(row_count, dtype=bool)
+        for position in np.flatnonzero(has_credit & ~has_doc_no):
+            row_text = " ".join([str(val) for val in data[position] if pd.notna(val)]).lower()
+            is_summary[position] = self._keywords.contains(row_text, "summary")
+
+        keep = has_credit & ~is_summary
+        skipped_no_date = 0
+        if date_column_idx is not None:
+            # Дата может быть в любом формате или отсутствовать, если есть кредит и номер документа
+            date_values = data[:, date_column_idx]
+            has_date = np.zeros(row_count, dtype=bool)
+            for position in np.flatnonzero(self._present_mask(date_values) & keep):
+                # Текст после итоговых слов в ячейке даты не учитывается
+                date_text = self._cut_at_summary(str(date_values[position]).strip())
+                has_date[position] = bool(self._DATE_PATTERN.search(date_text))
+            date_rule = has_doc_no | has_date
+            skipped_no_date = int((keep & ~date_rule).sum())
+            keep &= date_rule
+
+        skipped_debit = 0
+        if debit_column_idx is not None:
+            # Есть и кредит, и дебет > 0 - пропускаем (это может быть дубликат или ошибка парсинга)
+            _, has_debit = self._parse_amount_column(data[:, debit_column_idx])
+            skipped_debit = int((keep & has_debit).sum())
+            keep &= ~has_debit
+
+        logger.debug(
+            "[DEBUG] Строк: %d, с кредитом: %d, итоговых: %d, без даты и №: %d, с дебетом: %d, в результат: %d",
+            row_count, int(has_credit.sum()), int(is_summary.sum()), skipped_no_date, skipped_debit, int(keep.sum()),
+        )
+        if stats is not None:
+            stats.with_credit += int(has_credit.sum())
+            stats.summary += int(is_summary.sum())
+            stats.no_date += skipped_no_date
+            stats.with_debit += skipped_debit
+            stats.kept += int(keep.sum())
+        trace = row_trace("фильтр кредита")
+        if trace is not None:
+            for position in range(row_count):
+                if trace.sample():
+                    trace.log(
+                        "строка %s: кредит=%s итоговая=%s №=%s в_результат=%s",
+                        data[position].tolist(), bool(has_credit[position]), bool(is_summary[position]),
+                        bool(has_doc_no[position]), bool(keep[position]),
+                    )
 
-            # Сначала проверяем кредит - если есть кредит > 0, это может быть реальная операция
-            credit_cell = row.iloc[credit_column_idx]
-            has_credit = False
-            credit_value = None
-            amount = None
-            
-            if pd.notna(credit_cell) and not self._is_effectively_empty(credit_cell):
-                credit_value = self._clean_numeric_value(credit_cell)
-                if credit_value:
-                    amount = self._to_decimal(credit_value)
-                    if amount is not None and amount > 0:
-                        has_credit = True
-            
-            # Получаем номер документа и дату для проверки
-            doc_no = None
-            date_val = None
-            has_doc_no = False
-            has_date = False
-            
-            if "№" in row.index:
-                doc_no_cell = row["№"]
-                if pd.notna(doc_no_cell) and not self._is_effectively_empty(doc_no_cell):
-                    doc_no = str(doc_no_cell).strip()
-                    # Проверяем, что номер документа содержит цифры (это реальный номер, а не заголовок)
-                    if doc_no and re.search(r"\d", doc_no):
-                        has_doc_no = True
-            
-            if date_column_idx is not None:
-                date_cell = row.iloc[date_column_idx]
-                if pd.notna(date_cell) and not self._is_effectively_empty(date_cell):
-                    date_val = str(date_cell).strip()[:20]
-                    # Проверяем, что дата содержит паттерн даты (например, 2024-05-06 или 06.05.2024)
-                    if date_val and (re.search(r"\d{4}[-/]\d{2}[-/]\d{2}", date_val) or re.search(r"\d{2}\.\d{2}\.\d{4}", date_val)):
-                        has_date = True
-            
-            # Проверяем, не является ли это итоговой строкой
-            # НО: если есть кредит > 0 и номер документа - это реальная операция, не итоговая (даже если дата не валидна)
-            row_text = " ".join([str(val) for val in row.values if pd.notna(val)]).lower()
-            contains_summary_keywords = any(keyword in row_text for keyword in summary_keywords)
-            
-            # Если это выглядит как реальная операция (есть кредит и номер документа), не пропускаем
-            # Дата может быть не валидна из-за переносов строк, но это не значит, что это итоговая строка
-            if contains_summary_keywords and not (has_credit and has_doc_no):
-                _log_debug(f"[DEBUG] Строка {row_number}: пропущена - итоговая строка (содержит: {[kw for kw in summary_keywords if kw in row_text]}, кредит: {has_credit}, №: {has_doc_no}, дата: {has_date})")
+        # Для каждой колонки заранее решаем, попадает ли она в результат и как очищается
+        column_plan = []
+        for column_idx, key in enumerate(dataframe.columns):
+            column_name = str(key).strip()
+            if column_name == "":
                 continue
-
-            # Если нет кредита, пропускаем
-            if not has_credit:
-                _log_debug(f"[DEBUG] Строка {row_number}: пропущена - нет кредита (№ документа: {doc_no})")
+            # Пропускаем числовые заголовки, но ОСТАВЛЯЕМ "Дебет", "Кредит", "Курс"
+            if (column_name != credit_column_name and
+                self._is_numeric_header(column_name) and
+                column_name not in ("Дебет", "Кредит", "Курс")):
                 continue
-            
-            _log_debug(f"[DEBUG] Строка {row_number}: найдена с кредитом {amount} (№: {doc_no}, Дата: {date_val if date_val else 'нет'}, значение: {credit_value})")
-
-            # Если есть кредит и номер документа - это реальная операция, не пропускаем из-за даты
-            # Дата может быть в любом формате или вообще отсутствовать - это не проблема
-            if date_column_idx is not None:
-                date_cell = row.iloc[date_column_idx]
-                if pd.isna(date_cell) or self._is_effectively_empty(date_cell):
-                    # Если нет даты, но есть кредит и номер документа - оставляем строку
-                    if has_credit and has_doc_no:
-                        _log_debug(f"[DEBUG] Строка {row_number}: дата пустая, но есть кредит и № документа - оставляем (№: {doc_no}, кредит: {amount})")
-                    else:
-                        _log_debug(f"[DEBUG] Строка {row_number}: пропущена - нет даты и нет кредита/№ документа (№: {doc_no})")
-                        continue
-                else:
-                    # Извлекаем дату из ячейки, игнорируя текст после итоговых слов
-                    date_str_full = str(date_cell).strip()
-                    date_str_lower = date_str_full.lower()
-                    
-                    # Ищем позицию первого вхождения итоговых слов
-                    summary_positions = []
-                    for keyword in ["обороты", "итого", "документов"]:
-                        pos = date_str_lower.find(keyword)
-                        if pos >= 0:
-                            summary_positions.append(pos)
-                    
-                    # Если нашли итоговые слова, берем только часть до них
-                    if summary_positions:
-                        min_pos = min(summary_positions)
-                        date_str_clean = date_str_full[:min_pos].strip()
-                        _log_debug(f"[DEBUG] Строка {row_number}: дата содержит итоговые слова, извлечена дата: '{date_str_clean}' из '{date_str_full[:50]}...'")
-                    else:
-                        date_str_clean = date_str_full
-                    
-                    # Проверяем, что извлеченная дата валидна (содержит паттерн даты)
-                    if not (re.search(r"\d{4}[-/]\d{2}[-/]\d{2}", date_str_clean) or re.search(r"\d{2}\.\d{2}\.\d{4}", date_str_clean)):
-                        # Если дата не валидна, но есть кредит и номер документа - оставляем строку
-                        # Дата может быть в странном формате (например, "YYYY-00-DD 00:00:SS"), это не проблема
-                        if has_credit and has_doc_no:
-                            _log_debug(f"[DEBUG] Строка {row_number}: дата в странном формате '{date_str_clean}', но есть кредит и № документа - оставляем (№: {doc_no}, кредит: {amount})")
-                        else:
-                            _log_debug(f"[DEBUG] Строка {row_number}: пропущена - дата не валидна и нет кредита/№ документа (№: {doc_no}, дата: '{date_str_clean}')")
-                            continue
-
-            # Проверяем дебет - пропускаем строку если есть дебет
-            # Если есть и кредит, и дебет → пропускаем (это может быть дубликат или ошибка парсинга)
-            # Если есть только кредит (без дебета) → включаем в результат
-            if debit_column_idx is not None:
-                debit_cell = row.iloc[debit_column_idx]
-                if pd.notna(debit_cell) and not self._is_effectively_empty(debit_cell):
-                    debit_value = self._clean_numeric_value(debit_cell)
-                    debit_amount = self._to_decimal(debit_value) if debit_value else None
-                    # Если есть реальный дебет > 0
-                    if debit_amount is not None and debit_amount > 0:
-                        # Если есть и кредит, и дебет - пропускаем
-                        if amount is not None and amount > 0:
-                            _log_debug(f"[DEBUG] Строка {row_number}: пропущена - есть кредит {amount} и дебет {debit_amount} (№: {doc_no})")
-                            continue
-                        # Если только дебет, нет кредита - пропускаем
-                        _log_debug(f"[DEBUG] Строка {row_number}: пропущена - есть дебет {debit_amount}, но нет кредита (№: {doc_no})")
-                        continue
-                    elif debit_amount is None and debit_value.lower() not in self._empty_tokens:
-                        # Дебет не распознан как число, но есть текст
-                        # Пропускаем только если нет кредита
-                        if amount is None or amount == 0:
-                            _log_debug(f"[DEBUG] Строка {row_number}: пропущена - дебет не распознан, нет кредита (№: {doc_no})")
-                            continue
+            column_plan.append((column_idx, column_name))
 
+        date_column_name = dataframe.columns[date_column_idx] if date_column_idx is not None else None
+        filtered_rows: List[dict] = []
+        for position in np.flatnonzero(keep):
+            row = data[position]
             sanitized_row: Dict[str, str] = {}
-            for key, value in row.items():
-                column_name = str(key).strip()
-                if column_name == "":
-                    continue
-                # Пропускаем числовые заголовки, но ОСТАВЛЯЕМ "Дебет", "Кредит", "Курс"
-                if (column_name != credit_column_name and 
-                    self._is_numeric_header(column_name) and
-                    column_name not in ("Дебет", "Кредит", "Курс")):
-                    continue
+            for column_idx, column_name in column_plan:
+                value = row[column_idx]
                 if pd.isna(value) or self._is_effectively_empty(value):
                     continue
-                
+
                 # Для числовых колонок (Кредит, Дебет, Курс) убираем переносы строк и дублирование
                 if column_name in ("Дебет", "Кредит", "Курс"):
                     sanitized_row[column_name] = self._clean_numeric_value(value)
@@ -804,319 +1132,758 @@ class PDFStatementProcessor:
                     # Убираем лишние пробелы
                     cleaned = re.sub(r"\s+", " ", cleaned)
                     # Убираем текст после итоговых слов (если есть)
-                    date_str_lower = cleaned.lower()
-                    summary_positions = []
-                    for keyword in ["обороты", "итого", "документов"]:
-                        pos = date_str_lower.find(keyword)
-                        if pos >= 0:
-                            summary_positions.append(pos)
-                    if summary_positions:
-                        min_pos = min(summary_positions)
-                        cleaned = cleaned[:min_pos].strip()
-                    sanitized_row[column_name] = cleaned
+                    sanitized_row[column_name] = self._cut_at_summary(cleaned)
                 else:
                     # Для остальных колонок оставляем как есть (могут быть переносы в тексте)
                     sanitized_row[column_name] = str(value).strip()
 
             # credit_value уже очищен через _clean_numeric_value
-            sanitized_row[credit_column_name] = credit_value
-            
-            if date_column_idx is not None:
-                date_column_name = dataframe.columns[date_column_idx]
-                date_value = str(row.iloc[date_column_idx]).strip()
+            sanitized_row[credit_column_name] = credit_values[position]
+
+            if date_column_name is not None:
+                date_value = str(row[date_column_idx]).strip()
                 # Очищаем дату от переносов строк
                 date_value = date_value.replace("\n", " ").replace("\r", " ").strip()
                 date_value = re.sub(r"\s+", " ", date_value)
                 # Убираем текст после итоговых слов (если есть)
-                date_str_lower = date_value.lower()
-                summary_positions = []
-                for keyword in ["обороты", "итого", "документов"]:
-                    pos = date_str_lower.find(keyword)
-                    if pos >= 0:
-                        summary_positions.append(pos)
-                if summary_positions:
-                    min_pos = min(summary_positions)
-                    date_value = date_value[:min_pos].strip()
-                sanitized_row[date_column_name] = date_value
-
-            if not sanitized_row:
-                _log_debug(f"[DEBUG] Строка {row_number}: пропущена - пустой sanitized_row после обработки (№: {doc_no})")
-                continue
+                sanitized_row[date_column_name] = self._cut_at_summary(date_value)
 
-            _log_debug(f"[DEBUG] Строка {row_number}: ✅ ДОБАВЛЕНА в результат (№: {doc_no}, Кредит: {amount})")
             filtered_rows.append(sanitized_row)
 
-        if not filtered_rows:
-            _log_debug(f"[DEBUG] Не найдено строк для обработки")
-            return None, fallback_columns
-
-        _log_debug(f"[DEBUG] Итого добавлено в результат: {len(filtered_rows)} строк")
-        
-        # Выводим номера документов из результата для проверки
-        doc_numbers = []
-        for row in filtered_rows:
-            if "№" in row:
-                doc_numbers.append(row["№"])
-        _log_debug(f"[DEBUG] Номера документов в результате: {doc_numbers[:10]}..." if len(doc_numbers) > 10 else f"[DEBUG] Номера документов в результате: {doc_numbers}")
+        return filtered_rows
 
-        return (
-            ProcessedTable(page_number=page_number, bank_name=bank_name, rows=filtered_rows),
-            dataframe.columns.tolist(),
-        )
-
-    def _consolidate_rows(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+    def _consolidate_rows(self, dataframe: pd.DataFrame, stats: Optional[SheetStats] = None) -> pd.DataFrame:
         if dataframe.empty:
             return dataframe
 
-        _log_debug(f"[DEBUG] Консолидация строк: было {len(dataframe)} строк")
-        columns = list(dataframe.columns)
-        date_pattern = re.compile(r"\d{2}\.\d{2}\.\d{2,4}")
-        results: List[Dict[str, Optional[str]]] = []
-        current: Optional[Dict[str, Optional[str]]] = None
-        skipped_empty = 0
-        skipped_headers = 0
-        processed_rows = 0
-
-        for row in dataframe.itertuples(index=False, name=None):
-            values = {}
-            for col, val in zip(columns, row):
-                if val is None or (isinstance(val, float) and pd.isna(val)) or pd.isna(val):
-                    values[col] = None
-                else:
-                    values[col] = str(val).strip()
+        logger.debug("[DEBUG] Консолидация строк: было %s строк", len(dataframe))
+        with timed("consolidation", rows=len(dataframe)) as consolidation:
+            consolidator = _RowConsolidator(list(dataframe.columns), self._keywords, row_trace("консолидация"))
+            records = consolidator.feed(dataframe)
+            records.extend(consolidator.finish())
+            consolidation["records"] = len(records)
+        self._log_consolidation(consolidator, stats)
+        result_df = consolidator.frame(records)
+        logger.debug("[DEBUG] После dropna: осталось %s строк", len(result_df))
+        return result_df.reset_index(drop=True)
 
-            if all(value is None for value in values.values()):
-                skipped_empty += 1
-                continue
+    @staticmethod
+    def _log_consolidation(consolidator: "_RowConsolidator", stats: Optional[SheetStats] = None) -> None:
+        if stats is not None:
+            stats.records += consolidator.record_count
+            stats.skipped_empty += consolidator.skipped_empty
+            stats.skipped_headers += consolidator.skipped_headers
+        logger.debug("[DEBUG] Консолидация завершена: обработано %s строк, пропущено пустых %s, пропущено заголовков %s, создано записей %s", consolidator.processed_rows, consolidator.skipped_empty, consolidator.skipped_headers, consolidator.record_count)
+
+    def extract(
+        self, pdf: PDFSource, bank_name: Optional[str] = None, backend: Optional[str] = None
+    ) -> StatementExtraction:
+        """
+        Извлечь данные из PDF: PDF → XLSX → обработка → результат.
 
-            row_text = " ".join(
-                value.lower() for value in values.values() if value
-            )
-            if (
-                any(token in row_text for token in ("дата", "назна", "дебет", "кредит"))
-                and not any(char.isdigit() for char in row_text)
-            ):
-                skipped_headers += 1
-                continue
-            
-            processed_rows += 1
+        Процесс:
+        1. PDF файл отправляется в бэкенд конвертации (Adobe API или локальный pdfplumber)
+        2. Бэкенд конвертирует PDF в Excel (XLSX)
+        3. Excel файл обрабатывается для извлечения строк с кредитом
+        4. Возвращается структурированный результат
 
-            candidate_no = values.get("№") or values.get("Номер док") or values.get("Документ")
-            candidate_date = values.get("Дата")
-            candidate_credit = values.get("Кредит")
-            candidate_debit = values.get("Дебет")
-            
-            # Проверяем, есть ли кредит или дебет в строке
-            has_credit_value = candidate_credit and candidate_credit.strip() and candidate_credit.strip() not in ("0", "0,00", "0.00", "")
-            has_debit_value = candidate_debit and candidate_debit.strip() and candidate_debit.strip() not in ("0", "0,00", "0.00", "")
-            
-            new_entry = False
-            extracted_no: Optional[str] = None
+        Args:
+            pdf: Байты PDF файла или открытый бинарный файл (загружается через memory map,
+                не читаясь в память целиком)
+            bank_name: Имя банка (опционально)
+            backend: Бэкенд конвертации 'adobe' или 'local' (по умолчанию - бэкенд процессора)
 
-            if candidate_no and re.search(r"\d", candidate_no):
-                new_entry = True
-                extracted_no = candidate_no
-                if values.get("№"):
-                    values["№"] = None
-            elif candidate_date:
-                match = re.match(r"(\d+)\s+(.*)", candidate_date)
-                if match:
-                    extracted_no = match.group(1)
-                    values["Дата"] = match.group(2)
-                    new_entry = True
-                elif date_pattern.search(candidate_date):
-                    new_entry = True
-            # Если есть кредит или дебет - это тоже может быть новая запись
-            elif has_credit_value or has_debit_value:
-                new_entry = True
-                # Пробуем найти номер документа в других колонках
-                for col in ["Номер док", "Документ", "№"]:
-                    if values.get(col) and re.search(r"\d", str(values.get(col))):
-                        extracted_no = str(values.get(col))
-                        break
+        Returns:
+            StatementExtraction с извлеченными данными и полученным XLSX (excel_file)
 
-            if new_entry:
-                if current:
-                    results.append(current)
-                current = {col: None for col in columns}
-                if extracted_no:
-                    current["№"] = extracted_no
-                if values.get("Дата"):
-                    current["Дата"] = values["Дата"]
-                for col in columns:
-                    if col in ("№", "Дата"):
-                        continue
-                    value = values.get(col)
-                    if value:
-                        if col in ("Дебет", "Кредит", "Курс"):
-                            current[col] = value.replace(" ", "")
-                        else:
-                            current[col] = value
-                continue
+        Процессор не хранит состояния вызова: extract() можно вызывать одновременно
+        из нескольких потоков, каждый результат получает свой XLSX.
+        """
+        try:
+            with collect_timings() as timings:
+                excel_file, converter, report, cache_hit = self._convert_statement(pdf, bank_name, backend)
+                extraction = self._extract_from_excel(pdf, excel_file, bank_name, converter.extraction_method)
+            self._mark_cache_status(extraction, cache_hit)
+            self._mark_triage(extraction, report)
+            self._mark_timings(extraction, timings, converter, cache_hit)
+            record_extraction(extraction.timings)
+            return extraction
+        except Exception as e:
+            self._log_extraction_error(e)
+            raise  # Пробрасываем ошибку, т.к. у нас нет fallback
 
-            if not current:
-                continue
+    def extract_with_excel(
+        self, pdf: PDFSource, bank_name: Optional[str] = None, backend: Optional[str] = None
+    ) -> tuple[StatementExtraction, IO[bytes]]:
+        """То же, что extract(), XLSX дополнительно возвращается отдельно (он же extraction.excel_file)."""
+        extraction = self.extract(pdf, bank_name, backend)
+        return extraction, extraction.excel_file
 
-            for col, value in values.items():
-                if not value or col == "№":
-                    continue
-                if col == "Дата":
-                    combined = " ".join(filter(None, [current.get(col), value])).strip()
-                    current[col] = combined
-                elif col in ("Дебет", "Кредит", "Курс"):
-                    combined = (current.get(col) or "") + value.replace(" ", "")
-                    current[col] = combined
-                else:
-                    combined = " ".join(filter(None, [current.get(col), value])).strip()
-                    current[col] = combined
+    async def extract_async(
+        self, pdf: PDFSource, bank_name: Optional[str] = None, backend: Optional[str] = None
+    ) -> StatementExtraction:
+        """
+        Асинхронный вариант extract() для FastAPI.
 
-        if current:
-            results.append(current)
+        Конвертация через Adobe идет асинхронным клиентом и не блокирует event loop во
+        время ожидания; локальная конвертация и разбор Excel выполняются в отдельном потоке.
+        """
+        try:
+            with collect_timings() as timings:
+                excel_file, converter, report, cache_hit = await self._convert_statement_async(pdf, bank_name, backend)
+                extraction = await asyncio.to_thread(
+                    self._extract_from_excel, pdf, excel_file, bank_name, converter.extraction_method
+                )
+            self._mark_cache_status(extraction, cache_hit)
+            self._mark_triage(extraction, report)
+            self._mark_timings(extraction, timings, converter, cache_hit)
+            record_extraction(extraction.timings)
+            return extraction
+        except Exception as e:
+            self._log_extraction_error(e)
+            raise
 
-        _log_debug(f"[DEBUG] Консолидация завершена: обработано {processed_rows} строк, пропущено пустых {skipped_empty}, пропущено заголовков {skipped_headers}, создано записей {len(results)}")
-        
-        result_df = pd.DataFrame(results)
-        result_df = result_df.replace("", pd.NA).dropna(how="all")
-        _log_debug(f"[DEBUG] После dropna: осталось {len(result_df)} строк")
-        return result_df.reset_index(drop=True)
+    async def extract_with_excel_async(
+        self, pdf: PDFSource, bank_name: Optional[str] = None, backend: Optional[str] = None
+    ) -> tuple[StatementExtraction, IO[bytes]]:
+        """Асинхронный вариант extract_with_excel()."""
+        extraction = await self.extract_async(pdf, bank_name, backend)
+        return extraction, extraction.excel_file
 
-    def extract(self, pdf_bytes: bytes, bank_name: Optional[str] = None) -> StatementExtraction:
+    def extract_stream(
+        self,
+        pdf: PDFSource,
+        bank_name: Optional[str] = None,
+        backend: Optional[str] = None,
+        window_rows: Optional[int] = None,
+    ) -> StatementStream:
+        """
+        Потоковый вариант extract() для очень длинных выписок.
+
+        Конвертация, проверка PDF, кэш и метаданные - как в extract(). Транзакции не
+        собираются в таблицы: строки листов читаются из XLSX при обходе
+        StatementStream.transactions окнами по window_rows строк (по умолчанию
+        PDF_STREAM_WINDOW_ROWS) и проходят поиск заголовков, склейку и фильтр кредита
+        окно за окном. Расход памяти зависит от размера окна, а не от длины выписки.
+        Заголовок таблицы переносится на следующий лист, если на нем своего нет.
+        Время этапов (stream.timings) и метрики записываются, когда обход завершен или закрыт.
         """
-        Извлечь данные из PDF через Adobe API: PDF → XLSX → обработка → результат.
+        try:
+            with collect_timings() as timings:
+                excel_file, converter, report, cache_hit = self._convert_statement(pdf, bank_name, backend)
+                stream = self._stream_from_excel(
+                    pdf, excel_file, bank_name, converter.extraction_method, window_rows, timings
+                )
+            self._mark_cache_status(stream, cache_hit)
+            self._mark_triage(stream, report)
+            stream.transactions = self._recorded_transactions(stream, stream.transactions, timings, converter, cache_hit)
+            return stream
+        except Exception as e:
+            self._log_extraction_error(e)
+            raise
 
-        Процесс:
-        1. PDF файл отправляется в Adobe API
-        2. Adobe API конвертирует PDF в Excel (XLSX)
-        3. Excel файл обрабатывается для извлечения строк с кредитом
-        4. Возвращается структурированный результат
+    async def extract_stream_async(
+        self,
+        pdf: PDFSource,
+        bank_name: Optional[str] = None,
+        backend: Optional[str] = None,
+        window_rows: Optional[int] = None,
+    ) -> StatementStream:
+        """
+        Асинхронный вариант extract_stream().
 
-        Args:
-            pdf_bytes: Байты PDF файла
-            bank_name: Имя банка (опционально)
+        Итератор транзакций синхронный и читает XLSX: обходить его нужно вне event loop
+        (например, StreamingResponse делает это в пуле потоков).
+        """
+        try:
+            with collect_timings() as timings:
+                excel_file, converter, report, cache_hit = await self._convert_statement_async(pdf, bank_name, backend)
+                stream = await asyncio.to_thread(
+                    self._stream_from_excel, pdf, excel_file, bank_name, converter.extraction_method, window_rows, timings
+                )
+            self._mark_cache_status(stream, cache_hit)
+            self._mark_triage(stream, report)
+            stream.transactions = self._recorded_transactions(stream, stream.transactions, timings, converter, cache_hit)
+            return stream
+        except Exception as e:
+            self._log_extraction_error(e)
+            raise
 
-        Returns:
-            StatementExtraction с извлеченными данными
+    def _convert_statement(
+        self, pdf: PDFSource, bank_name: Optional[str], backend: Optional[str]
+    ) -> tuple[IO[bytes], ConverterBackend, Optional[TriageReport], bool]:
         """
-        metadata: Dict[str, str] = {}
-        tables: List[ProcessedTable] = []
+        Проверить PDF и получить XLSX: из кэша или от бэкенда конвертации.
+
+        При явно выбранном бэкенде кэш проверяется до предварительной проверки PDF: уже
+        сконвертированный файл ее не проходит. В режиме 'auto' бэкенд (и ключ кэша)
+        известен только после проверки.
+        """
+        backend = (backend or self._default_backend).strip().lower()
+        # ШАГ 1: Конвертируем PDF в Excel (или берем из кэша)
+        with conversion_in_flight(), pdf_buffer(pdf) as buffer:
+            converter, report, cache_key, excel_file = None, None, None, None
+            if backend != AUTO_BACKEND:
+                converter = self._converters.get(backend)
+                with timed("cache_lookup"):
+                    cache_key, excel_file = self._get_cached_excel(buffer, converter)
+            if excel_file is None:
+                with timed("triage", bytes=len(buffer)):
+                    converter, report = self._triage(buffer, backend)
+                if backend == AUTO_BACKEND:
+                    with timed("cache_lookup"):
+                        cache_key, excel_file = self._get_cached_excel(buffer, converter)
+            self._log_extraction_start(buffer, bank_name, converter)
+            cache_hit = excel_file is not None
+            if not cache_hit:
+                with timed("conversion", bytes=len(buffer)) as conversion:
+                    excel_file = self._convert(buffer, bank_name, converter)
+                    conversion["xlsx_bytes"] = file_size(excel_file)
+                print(f"[PDF_PROCESSOR] ✅ Excel файл получен от бэкенда '{converter.name}': {conversion['xlsx_bytes']} байт", file=sys.stderr, flush=True)
+                with timed("cache_store"):
+                    self._store_cached_excel(cache_key, excel_file)
+        return excel_file, converter, report, cache_hit
+
+    async def _convert_statement_async(
+        self, pdf: PDFSource, bank_name: Optional[str], backend: Optional[str]
+    ) -> tuple[IO[bytes], ConverterBackend, Optional[TriageReport], bool]:
+        """Асинхронный вариант _convert_statement()."""
+        backend = (backend or self._default_backend).strip().lower()
+        with conversion_in_flight(), pdf_buffer(pdf) as buffer:
+            converter, report, cache_key, excel_file = None, None, None, None
+            if backend != AUTO_BACKEND:
+                converter = self._converters.get(backend)
+                with timed("cache_lookup"):
+                    cache_key, excel_file = await asyncio.to_thread(self._get_cached_excel, buffer, converter)
+            if excel_file is None:
+                with timed("triage", bytes=len(buffer)):
+                    converter, report = await asyncio.to_thread(self._triage, buffer, backend)
+                if backend == AUTO_BACKEND:
+                    with timed("cache_lookup"):
+                        cache_key, excel_file = await asyncio.to_thread(self._get_cached_excel, buffer, converter)
+            self._log_extraction_start(buffer, bank_name, converter)
+            cache_hit = excel_file is not None
+            if not cache_hit:
+                with timed("conversion", bytes=len(buffer)) as conversion:
+                    excel_file = await self._convert_async(buffer, bank_name, converter)
+                    conversion["xlsx_bytes"] = file_size(excel_file)
+                print(f"[PDF_PROCESSOR] ✅ Excel файл получен от бэкенда '{converter.name}': {conversion['xlsx_bytes']} байт", file=sys.stderr, flush=True)
+                with timed("cache_store"):
+                    await asyncio.to_thread(self._store_cached_excel, cache_key, excel_file)
+        return excel_file, converter, report, cache_hit
+
+    def _split_pages_for(self, converter: ConverterBackend) -> int:
+        return self._split_pages if converter.split_large_pdfs else 0
+
+    def _convert(
+        self, pdf_bytes: Union[bytes, memoryview], bank_name: Optional[str], converter: ConverterBackend
+    ) -> IO[bytes]:
+        """Конвертировать PDF в XLSX; большой PDF - частями параллельно с последующей склейкой."""
+        with timed("pdf_split") as split:
+            chunks = split_pdf(pdf_bytes, self._split_pages_for(converter))
+            split["chunks"] = len(chunks or ())
+        if not chunks:
+            return converter.convert(pdf_bytes, filename=bank_name)
+        # XLSX всех частей, включая готовые к моменту ошибки в другой части
+        excel_files: List[IO[bytes]] = []
+
+        def convert_chunk(chunk: IO[bytes]) -> IO[bytes]:
+            with pdf_buffer(chunk) as chunk_bytes:
+                excel_file = converter.convert(chunk_bytes, filename=bank_name)
+            excel_files.append(excel_file)
+            return excel_file
 
         try:
-            # ШАГ 1: Конвертируем PDF в Excel через Adobe API
-            import sys
-            print(f"[PDF_PROCESSOR] ========== НАЧАЛО ИЗВЛЕЧЕНИЯ ==========", file=sys.stderr, flush=True)
-            print(f"[PDF_PROCESSOR] Размер PDF: {len(pdf_bytes)} байт", file=sys.stderr, flush=True)
-            print(f"[PDF_PROCESSOR] Имя файла: {bank_name or 'не указано'}", file=sys.stderr, flush=True)
-            print(f"[PDF_PROCESSOR] Отправка PDF в Adobe API для конвертации в Excel...", file=sys.stderr, flush=True)
-            
-            # Получаем исходные байты Excel файла
-            excel_bytes = self._adobe_service.convert_pdf_to_excel(pdf_bytes, filename=bank_name)
-            print(f"[PDF_PROCESSOR] ✅ Excel файл получен от Adobe API: {len(excel_bytes)} байт", file=sys.stderr, flush=True)
-            
-            # Сохраняем исходный Excel файл для возможности просмотра
-            self._save_last_excel_bytes(excel_bytes, bank_name)
-            
-            # Конвертируем Excel байты в DataFrame для обработки
-            print(f"[PDF_PROCESSOR] Чтение Excel файла в DataFrame...", file=sys.stderr, flush=True)
-            excel_file = io.BytesIO(excel_bytes)
-            
-            # Читаем все листы из Excel файла
-            from openpyxl import load_workbook
-            wb = load_workbook(excel_file, data_only=True)
-            sheet_names = wb.sheetnames
+            ordered = run_batch(convert_chunk, chunks, max_in_flight=split_concurrency())
+            with timed("xlsx_stitch"):
+                return stitch_workbooks(ordered, self._header_row_positions)
+        finally:
+            close_all(excel_files)
+            close_all(chunks)
+
+    async def _convert_async(
+        self, pdf_bytes: Union[bytes, memoryview], bank_name: Optional[str], converter: ConverterBackend
+    ) -> IO[bytes]:
+        """Асинхронный вариант _convert()."""
+        with timed("pdf_split") as split:
+            chunks = await asyncio.to_thread(split_pdf, pdf_bytes, self._split_pages_for(converter))
+            split["chunks"] = len(chunks or ())
+        if not chunks:
+            return await converter.convert_async(pdf_bytes, filename=bank_name)
+        excel_files: List[IO[bytes]] = []
+
+        async def convert_chunk(chunk: IO[bytes]) -> IO[bytes]:
+            with pdf_buffer(chunk) as chunk_bytes:
+                excel_file = await converter.convert_async(chunk_bytes, filename=bank_name)
+            excel_files.append(excel_file)
+            return excel_file
+
+        try:
+            ordered = await run_batch_async(convert_chunk, chunks, max_in_flight=split_concurrency())
+            with timed("xlsx_stitch"):
+                return await asyncio.to_thread(stitch_workbooks, ordered, self._header_row_positions)
+        finally:
+            close_all(excel_files)
+            close_all(chunks)
+
+    def _get_cached_excel(
+        self, pdf_bytes: Union[bytes, memoryview], converter: ConverterBackend
+    ) -> tuple[Optional[str], Optional[IO[bytes]]]:
+        """Найти результат конвертации в кэше. Возвращает ключ кэша и открытый XLSX (или None)."""
+        if self._conversion_cache is None:
+            return None, None
+        cache_key = ConversionCache.make_key(pdf_bytes, converter.cache_namespace)
+        excel_file = self._conversion_cache.open(cache_key)
+        record_cache_lookup(excel_file is not None)
+        if excel_file is not None:
+            print(f"[PDF_PROCESSOR] ✅ Excel файл найден в кэше конвертаций ({file_size(excel_file)} байт), конвертация не нужна", file=sys.stderr, flush=True)
+        return cache_key, excel_file
+
+    def _store_cached_excel(self, cache_key: Optional[str], excel_file: IO[bytes]) -> None:
+        if self._conversion_cache is not None and cache_key:
+            self._conversion_cache.put(cache_key, excel_file)
+
+    def _mark_cache_status(self, extraction: Union[StatementExtraction, StatementStream], cache_hit: bool) -> None:
+        """Записать в метаданные, был ли результат взят из кэша."""
+        if self._conversion_cache is not None:
+            extraction.metadata["conversion_cache"] = "hit" if cache_hit else "miss"
+
+    @staticmethod
+    def _mark_triage(extraction: Union[StatementExtraction, StatementStream], report: Optional[TriageReport]) -> None:
+        """Записать в метаданные результат предварительной проверки PDF."""
+        if report is not None:
+            extraction.metadata["triage"] = report.to_metadata()
+
+    @staticmethod
+    def _mark_timings(
+        extraction: Union[StatementExtraction, StatementStream],
+        timings: StageTimings,
+        converter: ConverterBackend,
+        cache_hit: bool,
+    ) -> None:
+        """Записать время этапов обработки вместе с бэкендом и регионом Adobe (для сравнения по регионам)."""
+        extraction.timings = {
+            "backend": converter.name,
+            "region": converter.region,
+            "cache_hit": cache_hit,
+            **timings.to_dict(),
+        }
+
+    @staticmethod
+    def _log_extraction_start(
+        pdf_bytes: Union[bytes, memoryview], bank_name: Optional[str], converter: ConverterBackend
+    ) -> None:
+        print(f"[PDF_PROCESSOR] ========== НАЧАЛО ИЗВЛЕЧЕНИЯ ==========", file=sys.stderr, flush=True)
+        print(f"[PDF_PROCESSOR] Размер PDF: {len(pdf_bytes)} байт", file=sys.stderr, flush=True)
+        print(f"[PDF_PROCESSOR] Имя файла: {bank_name or 'не указано'}", file=sys.stderr, flush=True)
+        print(f"[PDF_PROCESSOR] Конвертация PDF в Excel (бэкенд '{converter.name}')...", file=sys.stderr, flush=True)
+
+    @staticmethod
+    def _log_extraction_error(error: Exception) -> None:
+        print(f"[PDF_PROCESSOR] ❌ Ошибка при обработке PDF: {error}", file=sys.stderr, flush=True)
+        print(f"[PDF_PROCESSOR] Traceback: {traceback.format_exc()}", file=sys.stderr, flush=True)
+
+    def _extract_from_excel(
+        self,
+        pdf: PDFSource,
+        excel_file: IO[bytes],
+        bank_name: Optional[str],
+        extraction_method: str = AdobeConverter.extraction_method,
+    ) -> StatementExtraction:
+        """
+        Обработать полученный от бэкенда конвертации Excel файл и извлечь строки с кредитом.
+
+        Excel файл переходит в StatementExtraction; если разбор не удался, он закрывается здесь.
+        """
+        try:
+            return self._parse_excel(pdf, excel_file, bank_name, extraction_method)
+        except BaseException:
+            excel_file.close()
+            raise
+
+    def _parse_excel(
+        self,
+        pdf: PDFSource,
+        excel_file: IO[bytes],
+        bank_name: Optional[str],
+        extraction_method: str,
+    ) -> StatementExtraction:
+        tables: List[ProcessedTable] = []
+
+        with timed("metadata"):
+            metadata = self._statement_metadata(pdf, bank_name, extraction_method)
+
+        # ШАГ 3: Обрабатываем каждый лист Excel отдельно. Книга открывается один раз
+        # (Excel читается напрямую из временного файла, без копии в памяти)
+        print(f"[PDF_PROCESSOR] Чтение Excel файла в DataFrame...", file=sys.stderr, flush=True)
+        with timed("sheet_prescan"):
+            scans = self._scan_sheets(excel_file)
+        with timed("workbook_open"):
+            workbook = open_workbook(excel_file)
+        with workbook:
+            sheet_names = workbook.sheet_names
             print(f"[PDF_PROCESSOR] Найдено листов в Excel: {len(sheet_names)}", file=sys.stderr, flush=True)
-            excel_file.seek(0)  # Сбрасываем позицию для чтения через pandas
+            skipped_sheets: List[str] = []
+            for sheet_idx, sheet_name in enumerate(sheet_names):
+                scan = scans.get(sheet_name)
+                if scan is not None and not scan.relevant:
+                    print(f"[PDF_PROCESSOR] Лист '{sheet_name}' пропущен без разбора: {scan.reason}", file=sys.stderr, flush=True)
+                    skipped_sheets.append(sheet_name)
+                    continue
+                tables.extend(self._process_sheet(workbook, sheet_idx, sheet_name, bank_name))
+        if scans:
+            metadata["skipped_sheets"] = skipped_sheets
 
-            # ШАГ 2: Извлекаем метаданные из PDF (опционально, если pdfplumber доступен)
-            if pdfplumber is not None:
-                try:
-                    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-                        metadata = self._extract_metadata(pdf)
-                except Exception as e:
-                    import sys
-                    print(f"[WARNING] Не удалось извлечь метаданные: {e}", file=sys.stderr, flush=True)
-                    metadata = {}
-            else:
+        print(f"[PDF_PROCESSOR] ========== ЗАВЕРШЕНИЕ ИЗВЛЕЧЕНИЯ ==========", file=sys.stderr, flush=True)
+        print(f"[PDF_PROCESSOR] Найдено таблиц: {len(tables)}", file=sys.stderr, flush=True)
+        total_rows = sum(len(table.rows) for table in tables)
+        print(f"[PDF_PROCESSOR] Всего строк с кредитом: {total_rows}", file=sys.stderr, flush=True)
+        print(f"[PDF_PROCESSOR] Метаданные: {len(metadata)} ключей", file=sys.stderr, flush=True)
+        
+        return StatementExtraction(
+            bank_name=bank_name,
+            metadata=metadata,
+            tables=tables,
+            excel_file=excel_file,
+            excel_filename=self._excel_filename(bank_name),
+        )
+
+    @staticmethod
+    def _excel_filename(filename: Optional[str]) -> str:
+        """Имя XLSX для просмотра: имя PDF с расширением .xlsx."""
+        if not filename:
+            return "converted.xlsx"
+        if filename.endswith(".xlsx"):
+            return filename
+        if filename.endswith(".pdf"):
+            return filename.replace(".pdf", ".xlsx")
+        return f"{filename}.xlsx"
+
+    def _statement_metadata(
+        self, pdf: PDFSource, bank_name: Optional[str], extraction_method: str
+    ) -> Dict[str, str]:
+        # ШАГ 2: Извлекаем метаданные из PDF (опционально, если pdfplumber доступен)
+        if pdfplumber is not None:
+            try:
+                pdf_file = io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else pdf
+                pdf_file.seek(0)
+                with pdfplumber.open(pdf_file) as pdf_document:
+                    metadata = self._extract_metadata(pdf_document)
+            except Exception as e:
+                print(f"[WARNING] Не удалось извлечь метаданные: {e}", file=sys.stderr, flush=True)
                 metadata = {}
+        else:
+            metadata = {}
+
+        metadata.setdefault("bank_name", bank_name or "")
+        metadata["extraction_method"] = extraction_method
+        return metadata
+
+    def _stream_from_excel(
+        self,
+        pdf: PDFSource,
+        excel_file: IO[bytes],
+        bank_name: Optional[str],
+        extraction_method: str,
+        window_rows: Optional[int],
+        timings: Optional[StageTimings] = None,
+    ) -> StatementStream:
+        """Метаданные выписки сразу, транзакции - генератором по листам Excel."""
+        metadata = self._statement_metadata(pdf, bank_name, extraction_method)
+        # Пропущенные листы известны до чтения строк, поэтому попадают в метаданные сразу
+        scans = self._scan_sheets(excel_file)
+        if scans:
+            metadata["skipped_sheets"] = [name for name, scan in scans.items() if not scan.relevant]
+        transactions = self._stream_transactions(excel_file, bank_name, scans, window_rows or stream_window_rows(), timings)
+        return StatementStream(bank_name=bank_name, metadata=metadata, transactions=transactions)
+
+    def _scan_sheets(self, excel_file: IO[bytes]) -> Dict[str, SheetScan]:
+        """Предварительный просмотр листов по XML архива (пустой словарь - разбирать все)."""
+        if not sheet_prescan_enabled():
+            return {}
+        # Без колонки кредита таблица из листа не извлекается
+        keywords = self.credit_headers | set(dict(self._COLUMN_ALIASES)["Кредит"])
+        scans = scan_workbook(excel_file, keywords) or []
+        return {scan.name: scan for scan in scans}
+
+    def _process_sheet(
+        self,
+        workbook: pd.ExcelFile,
+        sheet_idx: int,
+        sheet_name: str,
+        bank_name: Optional[str],
+    ) -> List[ProcessedTable]:
+        """Прочитать лист из открытой книги и извлечь из него таблицы со строками кредита."""
+        tables: List[ProcessedTable] = []
+        try:
+            with timed("workbook_parse") as parse:
+                excel_df = workbook.parse(sheet_name)
+                parse["rows"] = len(excel_df)
+            print(f"[PDF_PROCESSOR] ✅ Лист '{sheet_name}' прочитан: {len(excel_df)} строк, {len(excel_df.columns)} колонок", file=sys.stderr, flush=True)
+
+            if excel_df.empty:
+                print(f"[PDF_PROCESSOR] Лист '{sheet_name}' пустой, пропускаем", file=sys.stderr, flush=True)
+                return tables
+
+            logger.debug("[DEBUG] Начинаю обработку листа '%s': %s строк, %s колонок", sheet_name, len(excel_df), len(excel_df.columns))
+            logger.debug("[DEBUG] Колонки: %s", list(excel_df.columns))
+
+            # Обрабатываем лист - ищем все повторяющиеся заголовки и разбиваем на секции
+            # Это важно для выписок, где на каждой странице PDF есть заголовки столбцов
+            stats = SheetStats(sheet_name, rows=len(excel_df))
+            processed_tables = self._process_dataframe_with_repeated_headers(
+                excel_df,
+                page_number=sheet_idx + 1,
+                bank_name=bank_name,
+                stats=stats,
+            )
+            stats.log()
+
+            for processed in processed_tables:
+                if processed:
+                    tables.append(processed)
+                    print(f"[INFO] Извлечено {len(processed.rows)} строк с кредитом с листа '{sheet_name}'", file=sys.stderr, flush=True)
+                else:
+                    print(f"[WARNING] Не удалось обработать часть листа '{sheet_name}': processed вернул None", file=sys.stderr, flush=True)
 
-            metadata.setdefault("bank_name", bank_name or "")
-            metadata["extraction_method"] = "adobe_pdf_services_api"
+        except Exception as e:
+            print(f"[ERROR] Ошибка при обработке листа '{sheet_name}': {e}", file=sys.stderr, flush=True)
+            print(f"[ERROR] Traceback: {traceback.format_exc()}", file=sys.stderr, flush=True)
+            # Продолжаем обработку остальных листов даже если один упал
+        return tables
 
-            # ШАГ 3: Обрабатываем каждый лист Excel отдельно
+    def _stream_transactions(
+        self,
+        excel_file: IO[bytes],
+        bank_name: Optional[str],
+        scans: Dict[str, SheetScan],
+        window_rows: int,
+        timings: Optional[StageTimings] = None,
+    ) -> Generator[dict, None, None]:
+        """
+        Транзакции всех листов по мере чтения; книга и XLSX закрываются, когда генератор завершен или закрыт.
+
+        В timings записывается этап stream_parse: время внутри генератора (без времени
+        потребителя между строками), прочитанные строки листов и строки с кредитом.
+        """
+        window_rows = max(window_rows, self._STREAM_MIN_WINDOW_ROWS)
+        print(f"[PDF_PROCESSOR] Потоковое чтение Excel окнами по {window_rows} строк...", file=sys.stderr, flush=True)
+        try:
+            workbook = open_row_workbook(excel_file)
+        except BaseException:
+            excel_file.close()
+            raise
+        columns: Optional[List[str]] = None
+        parse = {"seconds": 0.0}
+        rows_read = total_rows = 0
+        try:
+            sheet_names = workbook.sheetnames
+            print(f"[PDF_PROCESSOR] Найдено листов в Excel: {len(sheet_names)}", file=sys.stderr, flush=True)
             for sheet_idx, sheet_name in enumerate(sheet_names):
-                excel_file.seek(0)  # Сбрасываем позицию для каждого листа
+                scan = scans.get(sheet_name)
+                if scan is not None and not scan.relevant:
+                    print(f"[PDF_PROCESSOR] Лист '{sheet_name}' пропущен без разбора: {scan.reason}", file=sys.stderr, flush=True)
+                    continue
+                stats = SheetStats(sheet_name)
                 try:
-                    excel_df = pd.read_excel(excel_file, sheet_name=sheet_name, engine="openpyxl")
-                    print(f"[PDF_PROCESSOR] ✅ Лист '{sheet_name}' прочитан: {len(excel_df)} строк, {len(excel_df.columns)} колонок", file=sys.stderr, flush=True)
-                    
-                    if excel_df.empty:
-                        print(f"[PDF_PROCESSOR] Лист '{sheet_name}' пустой, пропускаем", file=sys.stderr, flush=True)
-                        continue
-                    
-                    _log_debug(f"[DEBUG] Начинаю обработку листа '{sheet_name}': {len(excel_df)} строк, {len(excel_df.columns)} колонок")
-                    _log_debug(f"[DEBUG] Колонки: {list(excel_df.columns)}")
-                    
-                    # Обрабатываем лист - ищем все повторяющиеся заголовки и разбиваем на секции
-                    # Это важно для выписок, где на каждой странице PDF есть заголовки столбцов
-                    processed_tables = self._process_dataframe_with_repeated_headers(
-                        excel_df, 
-                        page_number=sheet_idx + 1, 
-                        bank_name=bank_name
+                    rows = iter_sheet_rows(workbook[sheet_name])
+                    # Первая строка листа у pd.read_excel становится названиями колонок и в данные не попадает
+                    next(rows, None)
+                    sheet = self._stream_sheet(
+                        rows, page_number=sheet_idx + 1, bank_name=bank_name, columns=columns, window_rows=window_rows, stats=stats
                     )
-                    
-                    for processed in processed_tables:
-                        if processed:
-                            tables.append(processed)
-                            print(f"[INFO] Извлечено {len(processed.rows)} строк с кредитом с листа '{sheet_name}'", file=sys.stderr, flush=True)
-                        else:
-                            print(f"[WARNING] Не удалось обработать часть листа '{sheet_name}': processed вернул None", file=sys.stderr, flush=True)
-                            
+                    columns = yield from self._timed_rows(sheet, parse)
+                    stats.log()
+                    print(f"[INFO] Извлечено {stats.kept} строк с кредитом с листа '{sheet_name}'", file=sys.stderr, flush=True)
                 except Exception as e:
                     print(f"[ERROR] Ошибка при обработке листа '{sheet_name}': {e}", file=sys.stderr, flush=True)
                     print(f"[ERROR] Traceback: {traceback.format_exc()}", file=sys.stderr, flush=True)
                     # Продолжаем обработку остальных листов даже если один упал
-                    continue
-
-        except Exception as e:
-            import sys
-            print(f"[PDF_PROCESSOR] ❌ Ошибка при обработке через Adobe API: {e}", file=sys.stderr, flush=True)
-            import traceback
-            print(f"[PDF_PROCESSOR] Traceback: {traceback.format_exc()}", file=sys.stderr, flush=True)
-            metadata["extraction_method"] = "adobe_pdf_services_api_failed"
-            metadata["error"] = str(e)
-            raise  # Пробрасываем ошибку, т.к. у нас нет fallback
+                finally:
+                    rows_read += stats.rows
+                    total_rows += stats.kept
+        finally:
+            workbook.close()
+            excel_file.close()
+            if timings is not None:
+                timings.add("stream_parse", parse["seconds"], rows=rows_read, kept=total_rows)
 
-        import sys
         print(f"[PDF_PROCESSOR] ========== ЗАВЕРШЕНИЕ ИЗВЛЕЧЕНИЯ ==========", file=sys.stderr, flush=True)
-        print(f"[PDF_PROCESSOR] Найдено таблиц: {len(tables)}", file=sys.stderr, flush=True)
-        total_rows = sum(len(table.rows) for table in tables)
         print(f"[PDF_PROCESSOR] Всего строк с кредитом: {total_rows}", file=sys.stderr, flush=True)
-        print(f"[PDF_PROCESSOR] Метаданные: {len(metadata)} ключей", file=sys.stderr, flush=True)
-        
-        return StatementExtraction(bank_name=bank_name, metadata=metadata, tables=tables)
 
-    def _save_last_excel_bytes(self, excel_bytes: bytes, filename: Optional[str] = None) -> None:
-        """Сохраняет последний Excel файл (исходные байты) в память для возможности просмотра."""
+    @staticmethod
+    def _timed_rows(
+        rows: Generator[dict, None, Optional[List[str]]], entry: Dict[str, float]
+    ) -> Generator[dict, None, Optional[List[str]]]:
+        """Строки генератора и его результат; в entry["seconds"] копится только время внутри него."""
         try:
-            self._last_excel_bytes = excel_bytes
-            # Формируем имя файла с расширением .xlsx
-            if filename:
-                if not filename.endswith('.xlsx'):
-                    if filename.endswith('.pdf'):
-                        filename = filename.replace('.pdf', '.xlsx')
-                    else:
-                        filename = f"{filename}.xlsx"
-                self._last_excel_filename = filename
-            else:
-                self._last_excel_filename = "converted.xlsx"
-            import sys
-            print(f"[INFO] Excel файл сохранен для просмотра: {self._last_excel_filename} (размер: {len(excel_bytes)} байт)", file=sys.stderr, flush=True)
-        except Exception as e:
-            import sys
-            print(f"[WARNING] Не удалось сохранить Excel файл для просмотра: {e}", file=sys.stderr, flush=True)
-    
-    def get_last_excel(self) -> tuple[Optional[bytes], Optional[str]]:
-        """Возвращает последний Excel файл и его имя."""
-        return self._last_excel_bytes, self._last_excel_filename
+            while True:
+                started = time.monotonic()
+                try:
+                    row = next(rows)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    entry["seconds"] += time.monotonic() - started
+                yield row
+        finally:
+            rows.close()
+
+    def _recorded_transactions(
+        self,
+        stream: StatementStream,
+        transactions: Generator[dict, None, None],
+        timings: StageTimings,
+        converter: ConverterBackend,
+        cache_hit: bool,
+    ) -> Generator[dict, None, None]:
+        """Транзакции потока; когда обход завершен или закрыт, время этапов попадает в stream.timings и метрики."""
+        try:
+            yield from transactions
+        finally:
+            transactions.close()
+            timings.finish()
+            self._mark_timings(stream, timings, converter, cache_hit)
+            record_extraction(stream.timings)
+
+    def _stream_sheet(
+        self,
+        rows: Iterator[List[object]],
+        page_number: int,
+        bank_name: Optional[str],
+        columns: Optional[List[str]],
+        window_rows: int,
+        stats: SheetStats,
+    ) -> Generator[dict, None, Optional[List[str]]]:
+        """
+        Обработать строки листа окнами по window_rows строк.
+
+        Как _process_dataframe_with_repeated_headers: каждый заголовок начинает новую
+        секцию, но секция обрабатывается частями, а незавершенная запись переходит в
+        следующее окно. Строки до первого заголовка листа продолжают таблицу
+        предыдущего листа (columns), только если совпадают с ней по ширине и содержат
+        суммы в колонке кредита (_continues_table) - так таблица, разрезанная границей
+        листов, продолжается, а шапка выписки отбрасывается. Возвращает колонки
+        последней секции.
+        """
+        section: Optional[_StreamSection] = None
+        last_header: Optional[Tuple[int, List[str]]] = None
+        width = 0
+        offset = 0
+        while True:
+            window = list(islice(rows, window_rows))
+            if not window:
+                break
+            if offset == 0:
+                # Ширина листа - по первому окну; более длинные строки дальше обрезаются
+                width = max(map(len, window))
+            window = [row[:width] + [np.nan] * (width - len(row)) if len(row) != width else row for row in window]
+            stats.rows += len(window)
+            frame = pd.DataFrame(window, dtype=object)
+            normalized = self._normalized_cells(frame)
+
+            header_indices = np.flatnonzero(self._header_row_mask(normalized)).tolist()
+            start = 0
+            if offset == 0 and header_indices and header_indices[0] < self._STREAM_MIN_WINDOW_ROWS:
+                # Секции начинаются с заголовков; строки до первого - продолжение таблицы
+                # предыдущего листа, если похожи на нее, иначе (шапка выписки) отбрасываются
+                if self._continues_table(columns, window[:header_indices[0]], width):
+                    section = self._open_stream_section(columns, width, stats)
+            elif offset == 0:
+                header_idx, header_series, header_found = self._find_header_row(frame)
+                if header_found and header_series is not None and header_idx is not None:
+                    section = self._open_stream_section(self._prepare_columns(header_series), width, stats)
+                    start = header_idx + 1
+                    last_header = (header_idx, normalized[header_idx])
+                    stats.headers += 1
+                elif self._continues_table(columns, window[:self._STREAM_MIN_WINDOW_ROWS], width):
+                    logger.debug("[DEBUG] Заголовок в начале листа не найден, используются колонки предыдущего листа: %s", columns)
+                    section = self._open_stream_section(columns, width, stats)
+                elif header_series is not None:
+                    section = self._open_stream_section(self._prepare_columns(header_series), width, stats)
+                    start = (header_idx + 1) if header_idx is not None else 1
+
+            for idx in header_indices:
+                if idx < start:
+                    continue
+                position = offset + idx
+                # Заголовок в пределах 5 строк от предыдущего с похожими ячейками - дубликат
+                if last_header and position - last_header[0] < 5:
+                    if len(set(normalized[idx]) & set(last_header[1])) >= 3:
+                        continue
+                last_header = (position, normalized[idx])
+                stats.headers += 1
+                if section is not None:
+                    yield from self._stream_section_rows(section, window[start:idx], page_number, bank_name, stats, final=True)
+                section = self._open_stream_section(self._prepare_columns(frame.iloc[idx].fillna("").astype(str)), width, stats)
+                start = idx + 1
+
+            if section is not None:
+                yield from self._stream_section_rows(section, window[start:], page_number, bank_name, stats)
+            offset += len(window)
+
+        if section is None:
+            return columns
+        yield from self._stream_section_rows(section, [], page_number, bank_name, stats, final=True)
+        return section.columns
+
+    def _continues_table(self, columns: Optional[List[str]], rows: List[List[object]], width: int) -> bool:
+        """
+        Продолжают ли строки начала листа таблицу предыдущего листа с колонками columns.
+
+        Продолжение должно совпадать с таблицей по ширине, а в колонке кредита хотя бы
+        одной строки должна стоять сумма. Шапка выписки (счет, период, банк) этому не
+        соответствует и не выдается за транзакции.
+        """
+        if not columns or not rows or len(columns) != width:
+            return False
+        credit_idx = self._detect_column(columns, self.credit_headers)
+        if credit_idx is None:
+            return False
+        for row in rows:
+            value = row[credit_idx]
+            if isinstance(value, bool) or value is None:
+                continue
+            if isinstance(value, (int, float)):
+                if not np.isnan(value):
+                    return True
+            elif self._AMOUNT_PATTERN.match(self._clean_numeric_value(value)):
+                return True
+        return False
+
+    def _open_stream_section(self, columns: List[str], width: int, stats: SheetStats) -> _StreamSection:
+        section = _StreamSection(self._fit_columns(columns, width), self._keywords)
+        stats.sections += 1
+        logger.debug("[DEBUG] Новая секция, колонки: %s", section.consolidator.columns)
+        if self._detect_column(section.consolidator.columns, self.credit_headers) is None:
+            logger.warning("[WARNING] Не найдена колонка кредита! Доступные колонки: %s", section.consolidator.columns)
+            section.has_credit = False
+        return section
+
+    def _stream_section_rows(
+        self,
+        section: _StreamSection,
+        rows: List[List[object]],
+        page_number: int,
+        bank_name: Optional[str],
+        stats: SheetStats,
+        final: bool = False,
+    ) -> List[dict]:
+        """Склеить и отфильтровать очередные строки секции; final закрывает последнюю запись."""
+        if not section.has_credit:
+            return []
+        consolidator = section.consolidator
+        records: List[List[Optional[str]]] = []
+        if rows:
+            cells = [[row[idx] for idx in section.positions] for row in rows]
+            records = consolidator.feed(pd.DataFrame(cells, columns=consolidator.columns, dtype=object))
+        if final:
+            records.extend(consolidator.finish())
+            self._log_consolidation(consolidator, stats)
+        if not records:
+            return []
+        filtered_rows = self._filter_credit_rows(consolidator.frame(records).reset_index(drop=True), stats) or []
+        return [{"page_number": page_number, "bank_name": bank_name, **row} for row in filtered_rows]
 
 
 def merge_tables(tables: Iterable[ProcessedTable]) -> pd.DataFrame:
@@ -1135,4 +1902,4 @@ def merge_tables(tables: Iterable[ProcessedTable]) -> pd.DataFrame:
     return pd.DataFrame(normalized_rows)
 
 
-__all__ = ["PDFStatementProcessor", "ProcessedTable", "StatementExtraction", "merge_tables"]
+__all__ = ["PDFStatementProcessor", "ProcessedTable", "StatementExtraction", "StatementStream", "merge_tables"]
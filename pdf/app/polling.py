@@ -0,0 +1,133 @@
+"""Стратегия опроса статуса job в Adobe PDF Services API."""
+from __future__ import annotations
+
+import os
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+_PAGE_OBJECT_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def estimate_page_count(pdf_bytes: bytes) -> Optional[int]:
+    """
+    Быстрая оценка числа страниц по объектам /Type /Page без разбора PDF.
+
+    Для PDF со сжатыми object streams объекты страниц не видны в байтах,
+    тогда возвращается None и задержка считается только по размеру файла.
+    """
+    count = len(_PAGE_OBJECT_RE.findall(pdf_bytes))
+    return count or None
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Разобрать заголовок Retry-After (секунды или HTTP-дата) в секунды ожидания."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+@dataclass
+class PollingStrategy:
+    """
+    Параметры опроса статуса job.
+
+    Первый опрос откладывается пропорционально размеру PDF и числу страниц (Adobe
+    все равно не успеет обработать большой файл за пару секунд), дальше интервал
+    растет экспоненциально до max_interval со случайным разбросом (jitter), чтобы
+    параллельные job не опрашивали API синхронно. Retry-After от сервера (в том числе
+    на 429) имеет приоритет над расчетным интервалом.
+    """
+
+    initial_delay: float = 2.0
+    delay_per_page: float = 0.2
+    delay_per_mb: float = 1.0
+    max_initial_delay: float = 30.0
+    interval: float = 2.0
+    backoff: float = 1.5
+    max_interval: float = 10.0
+    jitter: float = 0.2
+
+    @classmethod
+    def from_env(cls) -> "PollingStrategy":
+        """Создать стратегию из переменных окружения ADOBE_POLL_*."""
+        defaults = cls()
+        return cls(
+            initial_delay=float(os.getenv("ADOBE_POLL_INITIAL_DELAY", str(defaults.initial_delay))),
+            delay_per_page=float(os.getenv("ADOBE_POLL_DELAY_PER_PAGE", str(defaults.delay_per_page))),
+            delay_per_mb=float(os.getenv("ADOBE_POLL_DELAY_PER_MB", str(defaults.delay_per_mb))),
+            max_initial_delay=float(os.getenv("ADOBE_POLL_MAX_INITIAL_DELAY", str(defaults.max_initial_delay))),
+            interval=float(os.getenv("ADOBE_POLL_INTERVAL", str(defaults.interval))),
+            backoff=float(os.getenv("ADOBE_POLL_BACKOFF", str(defaults.backoff))),
+            max_interval=float(os.getenv("ADOBE_POLL_MAX_INTERVAL", str(defaults.max_interval))),
+            jitter=float(os.getenv("ADOBE_POLL_JITTER", str(defaults.jitter))),
+        )
+
+    def schedule(self, pdf_bytes: Optional[bytes] = None) -> "PollingSchedule":
+        """Создать расписание опроса для одного job."""
+        size = len(pdf_bytes) if pdf_bytes is not None else 0
+        page_count = estimate_page_count(pdf_bytes) if pdf_bytes else None
+        return PollingSchedule(self, size_bytes=size, page_count=page_count)
+
+
+@dataclass
+class PollingSchedule:
+    """Состояние опроса одного job: выдает задержки перед очередным запросом статуса."""
+
+    strategy: PollingStrategy
+    size_bytes: int = 0
+    page_count: Optional[int] = None
+    polls: int = 0
+    _interval: float = field(default=0.0, repr=False)
+
+    def __post_init__(self) -> None:
+        self._interval = self.strategy.interval
+
+    def _with_jitter(self, delay: float) -> float:
+        jitter = self.strategy.jitter
+        if jitter <= 0:
+            return delay
+        return delay * random.uniform(1 - jitter, 1 + jitter)
+
+    def initial_delay(self) -> float:
+        """Задержка перед первым опросом: зависит от размера PDF и числа страниц."""
+        strategy = self.strategy
+        delay = strategy.initial_delay + strategy.delay_per_mb * self.size_bytes / (1024 * 1024)
+        if self.page_count:
+            delay += strategy.delay_per_page * self.page_count
+        return self._with_jitter(min(delay, strategy.max_initial_delay))
+
+    def next_delay(self, retry_after: Optional[float] = None, throttled: bool = False) -> float:
+        """
+        Задержка перед следующим опросом.
+
+        Args:
+            retry_after: Подсказка сервера из Retry-After (секунды)
+            throttled: Сервер ответил 429 - увеличиваем интервал сильнее обычного
+        """
+        self.polls += 1
+        strategy = self.strategy
+        if retry_after is not None:
+            # Подсказку сервера соблюдаем, разброс добавляем только в большую сторону
+            return retry_after * random.uniform(1, 1 + max(strategy.jitter, 0))
+
+        delay = self._interval
+        growth = strategy.backoff * strategy.backoff if throttled else strategy.backoff
+        self._interval = min(self._interval * growth, strategy.max_interval)
+        if throttled:
+            delay = max(delay, self._interval)
+        return self._with_jitter(delay)
+
+
+__all__ = ["PollingStrategy", "PollingSchedule", "estimate_page_count", "parse_retry_after"]
@@ -0,0 +1,161 @@
+"""Повторы отдельных запросов и circuit breaker для Adobe PDF Services API."""
+from __future__ import annotations
+
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Ответы, после которых запрос имеет смысл повторить: сервис временно недоступен
+TRANSIENT_STATUSES = frozenset({500, 502, 503, 504})
+THROTTLED_STATUS = 429
+
+
+class AdobeServiceUnavailable(Exception):
+    """Adobe API признан недоступным (circuit breaker разомкнут), запрос не отправлялся."""
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Политика повторов одного шага конвертации (token, asset, загрузка, job, статус, скачивание).
+
+    Идемпотентные шаги повторяются при сетевых ошибках, 429 и 5xx. Создание job
+    (POST /operation/exportpdf) неидемпотентно: повтор после таймаута чтения или 5xx
+    может создать второй job, поэтому его повторяем только когда запрос точно не дошел
+    до Adobe - ошибка соединения или 429 (лимит отклоняет запрос до обработки).
+    """
+
+    attempts: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    jitter: float = 0.2
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Создать политику из ADOBE_HTTP_RETRIES (число повторов), ADOBE_HTTP_BACKOFF, ADOBE_HTTP_MAX_BACKOFF."""
+        defaults = cls()
+        return cls(
+            attempts=max(1, int(os.getenv("ADOBE_HTTP_RETRIES", str(defaults.attempts - 1))) + 1),
+            backoff=float(os.getenv("ADOBE_HTTP_BACKOFF", str(defaults.backoff))),
+            max_backoff=float(os.getenv("ADOBE_HTTP_MAX_BACKOFF", str(defaults.max_backoff))),
+        )
+
+    def should_retry_status(self, status_code: int, idempotent: bool, retry_on_throttle: bool = True) -> bool:
+        """Нужно ли повторить запрос, получивший ответ status_code."""
+        if status_code == THROTTLED_STATUS:
+            return retry_on_throttle
+        return idempotent and status_code in TRANSIENT_STATUSES
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Пауза перед повтором номер attempt (с нуля); Retry-After сервера имеет приоритет."""
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+        if self.jitter > 0:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Общий для процесса circuit breaker.
+
+    После failure_threshold подряд неудачных вызовов (сетевые ошибки и 5xx после всех
+    повторов) breaker размыкается, и следующие reset_timeout секунд запросы сразу
+    завершаются AdobeServiceUnavailable вместо многоминутного ожидания. Затем один
+    пробный запрос (half-open) решает, замкнуть breaker обратно или снова разомкнуть.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60.0) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started_at: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, name: str) -> "CircuitBreaker":
+        """Создать breaker из ADOBE_BREAKER_THRESHOLD и ADOBE_BREAKER_RESET_SECONDS."""
+        return cls(
+            name,
+            failure_threshold=int(os.getenv("ADOBE_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("ADOBE_BREAKER_RESET_SECONDS", "60")),
+        )
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' или 'half_open'."""
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        """Проверить, можно ли отправлять запрос; иначе AdobeServiceUnavailable."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(now)
+            if state == "closed":
+                return
+            if state == "half_open":
+                # Пропускаем один пробный запрос; если он завис, через reset_timeout - еще один
+                probe = self._probe_started_at
+                if probe is None or now - probe >= self.reset_timeout:
+                    self._probe_started_at = now
+                    return
+            retry_in = max(0.0, self.reset_timeout - (now - self._opened_at))
+        raise AdobeServiceUnavailable(
+            f"Adobe API временно недоступен ({self.name}): после {self.failure_threshold} ошибок подряд "
+            f"запросы приостановлены, повторите через {retry_in:.0f} с"
+        )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._failures += 1
+            half_open = self._probe_started_at is not None
+            self._probe_started_at = None
+            if half_open or self._failures >= self.failure_threshold:
+                if self._opened_at is None or half_open:
+                    print(f"[ADOBE_BREAKER] ⚠️ Circuit breaker {self.name} разомкнут на {self.reset_timeout:.0f} с ({self._failures} ошибок подряд)", file=sys.stderr, flush=True)
+                self._opened_at = now
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Общий для процесса breaker (один на адрес API)."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker.from_env(name)
+            _breakers[name] = breaker
+        return breaker
+
+
+__all__ = [
+    "AdobeServiceUnavailable",
+    "CircuitBreaker",
+    "RetryPolicy",
+    "TRANSIENT_STATUSES",
+    "get_circuit_breaker",
+]
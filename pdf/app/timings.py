@@ -0,0 +1,88 @@
+"""Время этапов обработки одной выписки: монотонные часы, байты и строки по этапам."""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+
+class StageTimings:
+    """
+    Время, байты и строки по этапам обработки одного файла.
+
+    Этап может выполняться несколько раз (части большого PDF, листы, секции листа):
+    время и счетчики суммируются, calls - сколько раз этап выполнялся. Части PDF
+    конвертируются в параллельных потоках, поэтому запись идет под блокировкой, а
+    сумма времени этапа может превышать общее время обработки.
+    """
+
+    def __init__(self) -> None:
+        self._started = time.monotonic()
+        self._finished: Optional[float] = None
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, **counts: int) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+            entry["seconds"] += seconds
+            entry["calls"] += 1
+            for key, value in counts.items():
+                entry[key] = entry.get(key, 0) + value
+
+    def finish(self) -> None:
+        self._finished = time.monotonic()
+
+    def to_dict(self) -> Dict[str, object]:
+        """Этапы в порядке первого выполнения и общее время, секунды округлены до миллисекунд."""
+        finished = self._finished if self._finished is not None else time.monotonic()
+        with self._lock:
+            stages = {
+                stage: {key: round(value, 3) if key == "seconds" else value for key, value in entry.items()}
+                for stage, entry in self._stages.items()
+            }
+        return {"total_seconds": round(finished - self._started, 3), "stages": stages}
+
+
+# Замеры текущей выписки. asyncio-задачи и asyncio.to_thread получают копию контекста,
+# потоки run_batch - тоже, поэтому этапы из глубины конвертации попадают к своему файлу
+_current: ContextVar[Optional[StageTimings]] = ContextVar("pdf_stage_timings", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[StageTimings]:
+    """Собирать время этапов, выполняемых внутри блока."""
+    timings = StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        timings.finish()
+        _current.reset(token)
+
+
+def record_stage(stage: str, seconds: float, **counts: int) -> None:
+    """Записать уже измеренный этап (вне collect_timings() ничего не делает)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds, **counts)
+
+
+@contextmanager
+def timed(stage: str, **counts: int) -> Iterator[Dict[str, int]]:
+    """
+    Замерить блок как этап.
+
+    Счетчики, известные только после блока (байты результата, строки), дописываются
+    в возвращаемый словарь. Этап, завершившийся исключением, тоже записывается.
+    """
+    started = time.monotonic()
+    try:
+        yield counts
+    finally:
+        record_stage(stage, time.monotonic() - started, **counts)
+
+
+__all__ = ["StageTimings", "collect_timings", "record_stage", "timed"]
@@ -0,0 +1,156 @@
+"""Быстрая предварительная проверка PDF: выбрать бэкенд конвертации или отклонить файл до отправки."""
+from __future__ import annotations
+
+import os
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Union
+
+try:
+    import pdfplumber
+    from pdfminer.pdfdocument import PDFPasswordIncorrect
+except ImportError:
+    pdfplumber = None  # type: ignore
+    PDFPasswordIncorrect = None  # type: ignore
+
+from .adobe_pdf_service import BufferStream
+from .converters import ADOBE_BACKEND, LOCAL_BACKEND
+
+TRIAGE_REJECT = "reject"
+
+# Меньше символов на проверенных страницах - считаем, что текстового слоя нет (скан)
+_MIN_TEXT_CHARS = 50
+
+
+def triage_enabled() -> bool:
+    """Включена ли предварительная проверка (PDF_TRIAGE, по умолчанию да)."""
+    return os.getenv("PDF_TRIAGE", "1").lower() not in {"0", "false", "no", "off"}
+
+
+def triage_rejects_without_keywords() -> bool:
+    """
+    Отклонять ли PDF с текстом, но без ключевых слов кредита/дебета на первых страницах
+    (PDF_TRIAGE_REJECT_NO_KEYWORDS, по умолчанию нет: такие файлы уходят в Adobe).
+    """
+    return os.getenv("PDF_TRIAGE_REJECT_NO_KEYWORDS", "0").lower() in {"1", "true", "yes", "on"}
+
+
+def triage_pages() -> int:
+    """Сколько первых страниц читать при проверке (PDF_TRIAGE_PAGES)."""
+    return max(1, int(os.getenv("PDF_TRIAGE_PAGES", "2")))
+
+
+@dataclass
+class TriageReport:
+    """Результат проверки: свойства PDF и решение, куда его отправить."""
+
+    page_count: int = 0
+    encrypted: bool = False
+    has_text_layer: bool = False
+    text_chars: int = 0
+    keywords_found: List[str] = field(default_factory=list)
+    decision: str = ADOBE_BACKEND
+    reason: str = ""
+
+    @property
+    def rejected(self) -> bool:
+        return self.decision == TRIAGE_REJECT
+
+    def to_metadata(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+class PDFRejected(ValueError):
+    """PDF отклонен предварительной проверкой: строк с кредитом из него не получить."""
+
+    def __init__(self, report: TriageReport) -> None:
+        super().__init__(f"PDF отклонен предварительной проверкой: {report.reason}")
+        self.report = report
+
+
+def triage_pdf(
+    pdf_bytes: Union[bytes, memoryview],
+    keywords: Iterable[str],
+    sample_pages: Optional[int] = None,
+    reject_without_keywords: Optional[bool] = None,
+) -> Optional[TriageReport]:
+    """
+    Проверить PDF по структуре и тексту первых sample_pages страниц.
+
+    Решение:
+    - reject: страниц нет или PDF защищен паролем; при reject_without_keywords (по
+      умолчанию PDF_TRIAGE_REJECT_NO_KEYWORDS) - еще и текст есть, но ни одного
+      ключевого слова (кредит/дебет) на первых страницах;
+    - local: есть текстовый слой и ключевые слова - таблицы извлекаются локально;
+    - adobe: текстового слоя нет (скан), ключевых слов на первых страницах нет
+      (титульный лист, другой язык, битая кодировка текста) или структуру не удалось разобрать.
+
+    Возвращает None, если pdfplumber не установлен.
+    """
+    if pdfplumber is None:
+        return None
+    sample_pages = sample_pages or triage_pages()
+    if reject_without_keywords is None:
+        reject_without_keywords = triage_rejects_without_keywords()
+    report = TriageReport()
+    try:
+        with BufferStream(pdf_bytes) as stream, pdfplumber.open(stream) as pdf_document:
+            report.encrypted = bool(getattr(pdf_document.doc, "encryption", None))
+            report.page_count = len(pdf_document.pages)
+            texts: List[str] = []
+            for page in pdf_document.pages[:sample_pages]:
+                texts.append(page.extract_text() or "")
+                page.flush_cache()
+    except Exception as e:
+        if PDFPasswordIncorrect is not None and _is_password_error(e):
+            report.encrypted = True
+            report.decision = TRIAGE_REJECT
+            report.reason = "PDF защищен паролем"
+        else:
+            report.reason = f"структуру PDF не удалось разобрать локально ({e})"
+        _log_report(report)
+        return report
+
+    text = " ".join(texts).replace("\xa0", " ").lower()
+    report.text_chars = len(text.strip())
+    report.has_text_layer = report.text_chars >= _MIN_TEXT_CHARS
+    report.keywords_found = sorted({keyword for keyword in keywords if keyword and keyword in text})
+
+    if report.page_count == 0:
+        report.decision = TRIAGE_REJECT
+        report.reason = "в PDF нет страниц"
+    elif not report.has_text_layer:
+        report.decision = ADOBE_BACKEND
+        report.reason = "нет текстового слоя, нужно распознавание"
+    elif not report.keywords_found:
+        checked = min(sample_pages, report.page_count)
+        if reject_without_keywords:
+            report.decision = TRIAGE_REJECT
+            report.reason = f"на первых {checked} страницах нет столбцов кредита/дебета"
+        else:
+            report.decision = ADOBE_BACKEND
+            report.reason = f"на первых {checked} страницах нет столбцов кредита/дебета, нужна полная конвертация"
+    else:
+        report.decision = LOCAL_BACKEND
+        report.reason = "есть текстовый слой и заголовки таблицы"
+    _log_report(report)
+    return report
+
+
+def _is_password_error(error: Exception) -> bool:
+    """pdfplumber заворачивает PDFPasswordIncorrect в свое исключение первым аргументом."""
+    if isinstance(error, PDFPasswordIncorrect):
+        return True
+    return bool(error.args) and isinstance(error.args[0], PDFPasswordIncorrect)
+
+
+def _log_report(report: TriageReport) -> None:
+    print(
+        f"[PDF_TRIAGE] Страниц: {report.page_count}, текст: {report.text_chars} символов, "
+        f"зашифрован: {report.encrypted}, ключевые слова: {report.keywords_found} → {report.decision} ({report.reason})",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+__all__ = ["PDFRejected", "TRIAGE_REJECT", "TriageReport", "triage_enabled", "triage_pages", "triage_pdf", "triage_rejects_without_keywords"]
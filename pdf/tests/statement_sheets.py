@@ -0,0 +1,95 @@
+"""Генератор листов выписки для тестов: преамбула, повторяющиеся заголовки, склейка, итоги."""
+import io
+import random
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+HEADERS = (
+    ["№", "Дата", "Номер док", "Дебет", "Кредит", "Назначение платежа"],
+    ["№ п/п", "Дата операции", "Документ", "Дебет сумма", "Кредит\nсумма", "Назначение", "Курс"],
+    ["Күні / Дата", "Құжат нөмірі", "Debit", "Credit", "Отправитель", "Төлем мақсаты"],
+)
+PREAMBLE = (
+    ["Выписка по счету", None, None],
+    ["Лицевой счет: KZ123", "Валюта счета: KZT", None],
+    ["Период: 01.05.2024 - 31.05.2024", "Дата печати", "Банк"],
+    ["Клиент", "ТОО Ромашка", "БИК ABCDKZKX"],
+)
+AMOUNTS = ("1 234,56", "1\xa0234,56", "15000", "0,00", "0", "-", "", None, np.nan, "4150000,004150000,00", "12.5", "abc")
+TEXTS = ("Оплата по счету", "Возврат", "Перевод собственных средств", "за май\n2024", None, np.nan, "\xa0", "nan")
+SUMMARIES = ("Итого обороты", "Обороты за период", "Документов по кредиту: 3", "Исходящий остаток", "Всего")
+
+
+def _data_row(rng, width, doc_no):
+    row = [rng.choice(TEXTS) for _ in range(width)]
+    kind = rng.random()
+    if kind < 0.55:
+        row[0] = str(doc_no)
+        row[1] = rng.choice(("06.05.2024", "2024-05-06", "06.05.24", f"{doc_no} 07.05.2024", "06.05.2024 Обороты", None))
+    elif kind < 0.75:
+        # Продолжение предыдущей записи: только текст и хвосты сумм
+        row[0] = None
+        row[1] = rng.choice((None, "12:30", np.nan))
+    elif kind < 0.85:
+        row[0] = rng.choice(SUMMARIES)
+        row[1] = None
+    elif kind < 0.92:
+        row = [None] * width
+    else:
+        row[0] = None
+        row[1] = None
+    if len(row) > 2 and any(v is not None for v in row):
+        for amount_idx in range(2, min(width, 5)):
+            if rng.random() < 0.6:
+                row[amount_idx] = rng.choice(AMOUNTS)
+    return row
+
+
+def statement_sheet(seed):
+    """
+    Лист выписки в том виде, в каком его возвращает pd.read_excel.
+
+    Первая строка листа у pd.read_excel становится названиями колонок, поэтому здесь
+    ее нет: колонки - "Unnamed: N", а строки начинаются с преамбулы или заголовка.
+    """
+    rng = random.Random(seed)
+    header = list(rng.choice(HEADERS))
+    width = len(header) + rng.choice((0, 0, 1))
+    header = header + [None] * (width - len(header))
+    rows = []
+    for line in rng.sample(PREAMBLE, rng.randint(0, len(PREAMBLE))):
+        rows.append(line + [None] * (width - len(line)))
+    doc_no = 100
+    for _ in range(rng.randint(1, 4)):
+        rows.append(list(header))
+        if rng.random() < 0.2:
+            # Тот же заголовок еще раз через пару строк (перенос страницы)
+            rows.append([str(doc_no), "01.05.2024"] + [None] * (width - 2))
+            rows.append(list(header))
+        for _ in range(rng.randint(0, 25)):
+            doc_no += 1
+            rows.append(_data_row(rng, width, doc_no))
+    frame = pd.DataFrame(rows, columns=[f"Unnamed: {idx}" for idx in range(width)], dtype=object)
+    return frame.where(pd.notna(frame), np.nan)
+
+
+def write_workbook(sheets):
+    """
+    XLSX из листов statement_sheet (или списков строк) как от бэкенда конвертации.
+
+    Перед строками каждого листа идет строка "Страница N": у pd.read_excel она уходит
+    в названия колонок, как первая строка листов Adobe и локального конвертера.
+    """
+    workbook = Workbook(write_only=True)
+    for number, sheet in enumerate(sheets, 1):
+        rows = sheet.values.tolist() if isinstance(sheet, pd.DataFrame) else sheet
+        worksheet = workbook.create_sheet(f"Table {number}")
+        worksheet.append([f"Страница {number}"])
+        for row in rows:
+            worksheet.append([None if isinstance(value, float) and np.isnan(value) else value for value in row])
+    excel_file = io.BytesIO()
+    workbook.save(excel_file)
+    excel_file.seek(0)
+    return excel_file
@@ -0,0 +1,55 @@
+"""Параллельная обработка пачки: порядок результатов и отмена очереди после ошибки."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.batch import run_batch, run_batch_async
+
+
+def test_results_keep_input_order():
+    def slow_square(n):
+        time.sleep(0.01 * (5 - n))
+        return n * n
+
+    assert run_batch(slow_square, range(5), max_in_flight=3) == [0, 1, 4, 9, 16]
+
+
+def test_failure_cancels_queued_items():
+    started = []
+    lock = threading.Lock()
+
+    def convert(n):
+        with lock:
+            started.append(n)
+        if n == 0:
+            raise ValueError("chunk 0")
+        time.sleep(0.05)
+        return n
+
+    began = time.monotonic()
+    with pytest.raises(ValueError, match="chunk 0"):
+        run_batch(convert, list(range(40)), max_in_flight=4)
+
+    # Очередь из 40 элементов по 0.05 с на 4 потоках заняла бы 0.5 с
+    assert time.monotonic() - began < 0.3
+    assert len(started) < 10
+
+
+def test_async_failure_cancels_remaining():
+    finished = []
+
+    async def convert(n):
+        if n == 0:
+            raise ValueError("chunk 0")
+        await asyncio.sleep(0.05)
+        finished.append(n)
+        return n
+
+    with pytest.raises(ValueError, match="chunk 0"):
+        asyncio.run(run_batch_async(convert, list(range(40)), max_in_flight=4))
+
+    assert finished == []
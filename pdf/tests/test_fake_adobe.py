@@ -0,0 +1,194 @@
+"""Клиенты Adobe REST API (синхронный и асинхронный) против локального стенда app.fake_adobe."""
+from __future__ import annotations
+
+import asyncio
+import io
+import time
+
+import httpx
+import pytest
+import requests
+from openpyxl import load_workbook
+
+from app.adobe_pdf_service import ADOBE_AVAILABLE, AdobeJobFailed, AdobePDFService
+from app.async_adobe_pdf_service import AsyncAdobePDFService
+from app.checkpoints import CheckpointStore
+from app.fake_adobe import FakeAdobeConfig, FakeAdobeServer
+from app.resilience import AdobeServiceUnavailable
+
+requires_sdk = pytest.mark.skipif(not ADOBE_AVAILABLE, reason="pdfservices-sdk не установлен")
+
+# Интервал опроса без подсказки сервера: тест с Retry-After должен уложиться заметно быстрее
+SLOW_POLL_INTERVAL = 30
+
+
+@pytest.fixture(autouse=True)
+def _adobe_env(monkeypatch, tmp_path):
+    """Учетные данные стенда, быстрый опрос и повторы, свой файл вариантов payload."""
+    monkeypatch.delenv("ADOBE_BASE_URL", raising=False)
+    monkeypatch.delenv("ADOBE_CREDENTIALS_FILE", raising=False)
+    monkeypatch.setenv("ADOBE_CLIENT_ID", "fake-client")
+    monkeypatch.setenv("ADOBE_CLIENT_SECRET", "fake-secret")
+    monkeypatch.setenv("ADOBE_EXPORT_STATE_FILE", str(tmp_path / "adobe_export_state.json"))
+    for name in ("ADOBE_POLL_INITIAL_DELAY", "ADOBE_POLL_DELAY_PER_PAGE", "ADOBE_POLL_DELAY_PER_MB", "ADOBE_POLL_JITTER"):
+        monkeypatch.setenv(name, "0")
+    monkeypatch.setenv("ADOBE_POLL_INTERVAL", "0.05")
+    monkeypatch.setenv("ADOBE_POLL_BACKOFF", "1")
+    monkeypatch.setenv("ADOBE_HTTP_BACKOFF", "0.01")
+
+
+@pytest.fixture
+def fake_adobe():
+    """Фабрика запущенных стендов: fake_adobe(job_latency=0, ...); каждый на своем порту (и со своим breaker)."""
+    servers = []
+
+    def start(**config) -> FakeAdobeServer:
+        config.setdefault("job_latency", 0.0)
+        server = FakeAdobeServer(FakeAdobeConfig(**config)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def _sheet_names(result_file) -> list:
+    data = result_file.read()
+    result_file.close()
+    return load_workbook(io.BytesIO(data), read_only=True).sheetnames
+
+
+def _convert(server: FakeAdobeServer, pdf_bytes: bytes):
+    with AdobePDFService(base_url=server.url) as service:
+        return service.convert_pdf_to_excel_file(pdf_bytes, "statement.pdf")
+
+
+def _convert_async(server: FakeAdobeServer, pdf_bytes: bytes):
+    async def run():
+        async with AsyncAdobePDFService(base_url=server.url) as service:
+            return await service.convert_pdf_to_excel_file(pdf_bytes, "statement.pdf")
+
+    return asyncio.run(run())
+
+
+def _convert_twice_async(server: FakeAdobeServer, first: bytes, second: bytes):
+    async def run():
+        async with AsyncAdobePDFService(base_url=server.url) as service:
+            return [await service.convert_pdf_to_excel_file(pdf, "statement.pdf") for pdf in (first, second)]
+
+    return asyncio.run(run())
+
+
+CLIENTS = [pytest.param(_convert, id="sync", marks=requires_sdk), pytest.param(_convert_async, id="async")]
+
+
+@requires_sdk
+def test_sync_conversion_reuses_access_token(fake_adobe, text_pdf):
+    server = fake_adobe(sheets=2)
+
+    with AdobePDFService(base_url=server.url) as service:
+        results = [service.convert_pdf_to_excel_file(text_pdf([text]), "statement.pdf") for text in ("first", "second")]
+
+    assert [_sheet_names(result) for result in results] == [["Table 1", "Table 2"]] * 2
+    stats = server.stats()
+    assert stats["token"] == 1
+    assert stats["exportpdf"] == 2
+    assert stats["download"] == 2
+
+
+def test_async_conversion_reuses_access_token(fake_adobe, text_pdf):
+    server = fake_adobe(sheets=2)
+
+    results = _convert_twice_async(server, text_pdf(["first"]), text_pdf(["second"]))
+
+    assert [_sheet_names(result) for result in results] == [["Table 1", "Table 2"]] * 2
+    stats = server.stats()
+    assert stats["token"] == 1
+    assert stats["exportpdf"] == 2
+
+
+@pytest.mark.parametrize("convert", CLIENTS)
+def test_payload_variant_fallback_is_remembered(convert, fake_adobe, text_pdf):
+    server = fake_adobe(accepted_variants=frozenset({2}))
+
+    _sheet_names(convert(server, text_pdf(["first"])))
+    assert server.stats()["exportpdf_rejected"] == 2
+
+    # Новый клиент (как новый процесс) сразу отправляет сработавший вариант
+    _sheet_names(convert(server, text_pdf(["second"])))
+    stats = server.stats()
+    assert stats["exportpdf_rejected"] == 2
+    assert stats["exportpdf"] == 4
+
+
+@pytest.mark.parametrize("convert", CLIENTS)
+def test_throttled_status_poll_follows_retry_after(convert, fake_adobe, text_pdf, monkeypatch):
+    monkeypatch.setenv("ADOBE_POLL_INTERVAL", str(SLOW_POLL_INTERVAL))
+    # seed=1: первый опрос статуса получает 429, второй - готовый результат
+    server = fake_adobe(throttle_rate=0.5, retry_after=0, seed=1)
+
+    started = time.monotonic()
+    _sheet_names(convert(server, text_pdf(["statement"])))
+
+    assert time.monotonic() - started < SLOW_POLL_INTERVAL / 3
+    stats = server.stats()
+    assert stats["throttled"] == 1
+    assert stats["status"] == 2
+
+
+@pytest.mark.parametrize(
+    "convert, http_error",
+    [
+        pytest.param(_convert, requests.HTTPError, id="sync", marks=requires_sdk),
+        pytest.param(_convert_async, httpx.HTTPStatusError, id="async"),
+    ],
+)
+def test_outage_is_retried_then_opens_circuit_breaker(convert, http_error, fake_adobe, text_pdf, monkeypatch):
+    monkeypatch.setenv("ADOBE_HTTP_RETRIES", "2")
+    monkeypatch.setenv("ADOBE_BREAKER_THRESHOLD", "1")
+    server = fake_adobe(error_rate=1.0)
+    pdf_bytes = text_pdf(["statement"])
+
+    with pytest.raises(http_error):
+        convert(server, pdf_bytes)
+    assert server.stats()["unavailable"] == 3
+
+    # Breaker разомкнут: следующий запрос к стенду не отправляется
+    with pytest.raises(AdobeServiceUnavailable):
+        convert(server, pdf_bytes)
+    assert server.stats()["unavailable"] == 3
+
+
+@pytest.mark.parametrize("convert", CLIENTS)
+def test_failed_job_raises_and_drops_checkpoint(convert, fake_adobe, text_pdf):
+    server = fake_adobe(failure_rate=1.0)
+    pdf_bytes = text_pdf(["statement"])
+
+    with pytest.raises(AdobeJobFailed):
+        convert(server, pdf_bytes)
+
+    assert server.stats().get("download", 0) == 0
+    assert CheckpointStore.from_env().load(CheckpointStore.make_key(pdf_bytes, "US")) is None
+
+
+@pytest.mark.parametrize("convert", CLIENTS)
+def test_interrupted_conversion_resumes_job_from_checkpoint(convert, fake_adobe, text_pdf, monkeypatch):
+    server = fake_adobe(job_latency=2.0)
+    pdf_bytes = text_pdf(["statement"])
+
+    # Ожидание обрывается раньше, чем стенд закончит job: остается контрольная точка
+    monkeypatch.setenv("ADOBE_JOB_TIMEOUT", "1")
+    with pytest.raises(Exception, match="timeout"):
+        convert(server, pdf_bytes)
+    checkpoint = CheckpointStore.from_env().load(CheckpointStore.make_key(pdf_bytes, "US"))
+    assert checkpoint is not None and checkpoint.job_id
+
+    monkeypatch.setenv("ADOBE_JOB_TIMEOUT", "30")
+    _sheet_names(convert(server, pdf_bytes))
+
+    stats = server.stats()
+    assert stats["upload"] == 1
+    assert stats["exportpdf"] == 1
+    assert stats["download"] == 1
+    assert CheckpointStore.from_env().load(CheckpointStore.make_key(pdf_bytes, "US")) is None
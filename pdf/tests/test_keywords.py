@@ -0,0 +1,73 @@
+"""KeywordMatcher против наивного поиска подстрок any(kw in text ...)."""
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from app.keywords import KeywordMatcher
+
+
+def _naive_scan(text, keywords):
+    hits = []
+    for keyword in keywords:
+        position = text.find(keyword)
+        while position != -1:
+            hits.append((position, keyword))
+            position = text.find(keyword, position + 1)
+    return sorted(hits)
+
+
+def _assert_matches_naive(groups, text):
+    matcher = KeywordMatcher(groups)
+    groups = {name: [keyword for keyword in keywords if keyword] for name, keywords in groups.items()}
+    all_keywords = set().union(*map(set, groups.values()))
+
+    assert sorted(matcher.scan(text)) == _naive_scan(text, all_keywords)
+    assert matcher.found(text) == {name: {kw for kw in keywords if kw in text} for name, keywords in groups.items()}
+    for name, keywords in groups.items():
+        assert matcher.contains(text, name) == any(kw in text for kw in keywords)
+        positions = [text.find(kw) for kw in keywords if kw in text]
+        assert matcher.first_position(text, name) == (min(positions) if positions else None)
+
+
+@pytest.mark.parametrize(
+    "groups, text",
+    [
+        # Перекрывающиеся слова: короткое - префикс длинного
+        ({"purpose": ["назнач", "назначение"]}, "назначение платежа"),
+        ({"date": ["дат", "дата", "дата печати"]}, "дата печати: 01.01.2024, дата"),
+        # Перекрытие без общего префикса и повторные вхождения
+        ({"a": ["обор", "рот"], "b": ["оборот"]}, "обороты обороты"),
+        ({"a": ["аа"]}, "аааа"),
+        # Одно слово в нескольких группах
+        ({"credit": ["кредит", "поступ"], "credit_debit": ["кредит", "дебет"]}, "дебет | кредит"),
+        # Регистр: сравнение точное, приведение к нижнему регистру - забота вызывающего кода
+        ({"credit": ["кредит"]}, "КРЕДИТ Кредит"),
+        ({"credit": ["кредит"]}, "КРЕДИТ Кредит".lower()),
+        ({"credit": ["Кредит"]}, "кредит"),
+        # Неразрывный пробел не равен обычному
+        ({"date": ["дата валют"]}, "дата\xa0валютирования"),
+        ({"date": ["дата\xa0валют", "дата"]}, "дата\xa0валютирования"),
+        ({"date": ["дата валют"]}, "дата валютирования"),
+        # Спецсимволы регулярных выражений экранируются
+        ({"number": ["№ п/п", "(тенге)", "сумма.", "a+b"]}, "сумма (тенге) № п/п a+b суммаx"),
+        # Пустые слова и пустые группы
+        ({"empty": [], "blank": [""], "word": ["итого"]}, "итого"),
+        ({"word": ["итого"]}, ""),
+    ],
+)
+def test_matches_naive_substring_check(groups, text):
+    _assert_matches_naive(groups, text)
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_random_keywords_match_naive_substring_check(seed):
+    rng = random.Random(seed)
+    alphabet = "абвАБ .\xa0"
+
+    def word(max_length):
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+
+    groups = {f"g{index}": [word(4) for _ in range(rng.randint(0, 6))] for index in range(rng.randint(1, 4))}
+    _assert_matches_naive(groups, word(40))
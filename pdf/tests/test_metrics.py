@@ -0,0 +1,185 @@
+"""Метрики Prometheus: endpoint'ы Adobe, учет обработанного файла и /metrics."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, metrics
+from app.converters import ConverterBackend
+from app.pdf_processor import PDFStatementProcessor
+
+from statement_sheets import statement_sheet, write_workbook
+
+ADOBE = "https://pdf-services-ue1.adobe.io"
+
+
+@pytest.fixture
+def registry():
+    return pytest.importorskip("prometheus_client").REGISTRY
+
+
+def _value(registry, name, **labels):
+    return registry.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.parametrize(
+    "method, url, endpoint",
+    [
+        ("POST", f"{ADOBE}/token", "token"),
+        ("POST", f"{ADOBE}/assets", "assets"),
+        ("POST", f"{ADOBE}/assets/", "assets"),
+        ("POST", f"{ADOBE}/operation/exportpdf", "exportpdf"),
+        ("GET", f"{ADOBE}/operation/exportpdf/job-1/status", "status"),
+        ("GET", f"{ADOBE}/operation/exportpdf/job-1/result", "result"),
+        # Pre-signed ссылки хранилища: путь произвольный, endpoint - по методу
+        ("PUT", "https://dcplatformstorageservice-prod-us-east-1.s3.amazonaws.com/abc?X-Amz-Signature=1", "upload"),
+        ("put", "https://storage.example/upload/abc", "upload"),
+        ("GET", "https://dcplatformstorageservice-prod-us-east-1.s3.amazonaws.com/abc?X-Amz-Signature=1", "download"),
+        # Query string не участвует в разборе
+        ("GET", "https://storage.example/abc?next=/status", "download"),
+    ],
+)
+def test_adobe_endpoint(method, url, endpoint):
+    assert metrics.adobe_endpoint(method, url) == endpoint
+
+
+def test_record_adobe_request(registry):
+    labels = {"endpoint": "status", "status": "429"}
+    before = _value(registry, "pdf_adobe_requests_total", **labels)
+
+    metrics.record_adobe_request("GET", f"{ADOBE}/operation/exportpdf/job-1/status", 429)
+
+    assert _value(registry, "pdf_adobe_requests_total", **labels) == before + 1
+
+
+def test_record_extraction(registry):
+    timings = {
+        "backend": "test_metrics",
+        "region": None,
+        "cache_hit": False,
+        "total_seconds": 1.5,
+        "stages": {
+            "triage": {"seconds": 0.01, "calls": 1, "bytes": 2048},
+            "conversion": {"seconds": 1.2, "calls": 1, "xlsx_bytes": 512},
+            "workbook_parse": {"seconds": 0.2, "calls": 2, "rows": 120},
+            "credit_filter": {"seconds": 0.05, "calls": 2, "kept": 30},
+        },
+    }
+    before = {
+        "in": _value(registry, "pdf_bytes_total", direction="in"),
+        "out": _value(registry, "pdf_bytes_total", direction="out"),
+        "parsed": _value(registry, "pdf_rows_parsed_sum"),
+        "kept": _value(registry, "pdf_rows_kept_sum"),
+        "files": _value(registry, "pdf_rows_parsed_count"),
+    }
+
+    metrics.record_extraction(timings)
+
+    stage = lambda name: _value(registry, "pdf_stage_duration_seconds_sum", stage=name, backend="test_metrics")
+    assert stage("conversion") == pytest.approx(1.2)
+    assert stage("workbook_parse") == pytest.approx(0.2)
+    assert stage("total") == pytest.approx(1.5)
+    assert _value(registry, "pdf_stage_duration_seconds_count", stage="total", backend="test_metrics") == 1
+    assert _value(registry, "pdf_bytes_total", direction="in") == before["in"] + 2048
+    assert _value(registry, "pdf_bytes_total", direction="out") == before["out"] + 512
+    assert _value(registry, "pdf_rows_parsed_sum") == before["parsed"] + 120
+    assert _value(registry, "pdf_rows_kept_sum") == before["kept"] + 30
+    assert _value(registry, "pdf_rows_parsed_count") == before["files"] + 1
+
+
+def test_record_extraction_ignores_empty_timings(registry):
+    before = _value(registry, "pdf_rows_parsed_count")
+
+    metrics.record_extraction({})
+
+    assert _value(registry, "pdf_rows_parsed_count") == before
+
+
+class WorkbookConverter(ConverterBackend):
+    """Конвертер, возвращающий заранее заданный XLSX."""
+
+    name = "local"
+    extraction_method = "test_metrics_stream"
+
+    def __init__(self, sheets):
+        self.sheets = sheets
+
+    def convert(self, pdf_bytes, filename=None):
+        return write_workbook(self.sheets)
+
+
+def test_stream_extraction_is_recorded(registry, monkeypatch, text_pdf):
+    monkeypatch.setenv("PDF_CONVERSION_CACHE", "0")
+    processor = PDFStatementProcessor(backend="local")
+    processor._converters._backends["local"] = WorkbookConverter([statement_sheet(1), statement_sheet(2)])
+    pdf_bytes = text_pdf(["page 1"])
+    with processor.extract(pdf_bytes) as extraction:
+        expected_rows = sum(len(table.rows) for table in extraction.tables)
+    before = {
+        "files": _value(registry, "pdf_rows_parsed_count"),
+        "kept": _value(registry, "pdf_rows_kept_sum"),
+        "stream_stage": _value(registry, "pdf_stage_duration_seconds_count", stage="stream_parse", backend="local"),
+    }
+
+    stream = processor.extract_stream(pdf_bytes, window_rows=50)
+    assert stream.timings == {}
+    transactions = list(stream.transactions)
+
+    parse = stream.timings["stages"]["stream_parse"]
+    assert stream.timings["backend"] == "local"
+    assert "conversion" in stream.timings["stages"]
+    assert parse["kept"] == len(transactions) == expected_rows
+    assert parse["rows"] == extraction.timings["stages"]["workbook_parse"]["rows"]
+    assert _value(registry, "pdf_rows_parsed_count") == before["files"] + 1
+    assert _value(registry, "pdf_rows_kept_sum") == before["kept"] + expected_rows
+    assert (
+        _value(registry, "pdf_stage_duration_seconds_count", stage="stream_parse", backend="local")
+        == before["stream_stage"] + 1
+    )
+
+
+def test_closed_stream_is_recorded(registry, monkeypatch, text_pdf):
+    monkeypatch.setenv("PDF_CONVERSION_CACHE", "0")
+    processor = PDFStatementProcessor(backend="local")
+    processor._converters._backends["local"] = WorkbookConverter([statement_sheet(1)])
+    before = _value(registry, "pdf_rows_parsed_count")
+
+    stream = processor.extract_stream(text_pdf(["page 1"]), window_rows=50)
+    next(stream.transactions)
+    stream.transactions.close()
+
+    assert stream.timings["stages"]["stream_parse"]["kept"] >= 1
+    assert _value(registry, "pdf_rows_parsed_count") == before + 1
+
+
+def test_metrics_endpoint(registry):
+    metrics.record_cache_lookup(hit=True)
+
+    response = TestClient(main.app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'pdf_conversion_cache_lookups_total{result="hit"}' in response.text
+    assert "pdf_stage_duration_seconds_bucket" in response.text
+
+
+def test_render_metrics_sums_multiprocess_dir(registry, monkeypatch, tmp_path):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+    body, content_type = metrics.render_metrics()
+
+    # Значения пишутся в каталог, только если он задан до запуска процесса; здесь он пуст
+    assert body == b""
+    assert content_type.startswith("text/plain")
+
+
+def test_metrics_endpoint_without_prometheus_client(monkeypatch):
+    monkeypatch.setattr(metrics, "prometheus_client", None)
+
+    response = TestClient(main.app).get("/metrics")
+
+    assert response.status_code == 503
+    assert "prometheus_client" in response.json()["detail"]
+    # Запись метрик без пакета ничего не делает
+    metrics.record_extraction({"backend": "local", "total_seconds": 1.0, "stages": {}})
+    metrics.record_adobe_request("GET", f"{ADOBE}/token", 200)
+    with metrics.conversion_in_flight():
+        pass
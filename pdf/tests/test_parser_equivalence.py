@@ -0,0 +1,102 @@
+"""
+Векторные версии поиска заголовков, фильтра кредита и склейки строк должны давать тот же
+результат, что построчный разбор до переписывания (tests/baseline_parser.py).
+"""
+import pandas as pd
+import pytest
+
+from app.pdf_processor import PDFStatementProcessor
+
+from baseline_parser import BaselineParser
+from statement_sheets import statement_sheet
+
+
+@pytest.fixture(scope="module")
+def processor():
+    return PDFStatementProcessor(backend="local")
+
+
+@pytest.fixture(scope="module")
+def baseline(processor):
+    return BaselineParser(processor.credit_headers, processor.debit_headers, processor.date_headers)
+
+
+def _plain(frame):
+    """DataFrame как список строк с None вместо NaN/NA (сравнение без учета dtype)."""
+    values = frame.astype(object).where(pd.notna(frame), None)
+    return list(frame.columns), values.values.tolist()
+
+
+SEEDS = range(300)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_header_indices_match_row_by_row_detection(processor, baseline, seed):
+    sheet = statement_sheet(seed)
+
+    assert processor._find_header_indices(sheet) == baseline.header_indices(sheet)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_consolidated_rows_match(processor, baseline, seed):
+    sheet = statement_sheet(seed)
+    header_indices = baseline.header_indices(sheet)
+    if not header_indices:
+        pytest.skip("в листе нет заголовка")
+    start = header_indices[0]
+    section = sheet.iloc[start + 1:].reset_index(drop=True)
+    columns = baseline._prepare_columns(sheet.iloc[start].fillna("").astype(str))
+    section.columns = processor._fit_columns(columns, section.shape[1])
+    section = section[[col for col in section.columns if col]].replace(pd.NA, None)
+
+    consolidated = processor._consolidate_rows(section.copy())
+    expected = baseline._consolidate_rows(section.copy())
+
+    if expected.empty:
+        # Пустой результат построчной версии - DataFrame без колонок; дальше важно только empty
+        assert consolidated.empty
+    else:
+        assert _plain(consolidated) == _plain(expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_filtered_credit_rows_match(processor, baseline, seed):
+    sheet = statement_sheet(seed)
+    header_indices = baseline.header_indices(sheet)
+    if not header_indices:
+        pytest.skip("в листе нет заголовка")
+    start = header_indices[0]
+    section = sheet.iloc[start + 1:].reset_index(drop=True)
+    columns = baseline._prepare_columns(sheet.iloc[start].fillna("").astype(str))
+    section.columns = processor._fit_columns(columns, section.shape[1])
+    consolidated = baseline._consolidate_rows(section[[col for col in section.columns if col]].replace(pd.NA, None))
+    if consolidated.empty:
+        pytest.skip("после склейки строк не осталось")
+
+    assert processor._filter_credit_rows(consolidated.copy()) == baseline.filter_credit_rows(consolidated.copy())
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_sheet_tables_match(processor, baseline, seed):
+    sheet = statement_sheet(seed)
+
+    tables = processor._process_dataframe_with_repeated_headers(sheet.copy(), page_number=1, bank_name="bank")
+    expected = baseline._process_dataframe_with_repeated_headers(sheet.copy(), page_number=1, bank_name="bank")
+
+    assert [table.rows for table in tables] == [table.rows for table in expected]
+
+
+def test_synthetic_sheets_cover_the_tricky_cases(processor, baseline):
+    """Генератор действительно дает повторяющиеся заголовки, склейку и строки с кредитом."""
+    sheets = [statement_sheet(seed) for seed in SEEDS]
+    repeated = sum(len(baseline.header_indices(sheet)) > 1 for sheet in sheets)
+    rows = [
+        row
+        for sheet in sheets
+        for table in baseline._process_dataframe_with_repeated_headers(sheet.copy(), 1, None)
+        for row in table.rows
+    ]
+
+    assert repeated > 50
+    assert len(rows) > 500
+    assert any(row.get("Кредит") == "1234,56" for row in rows)
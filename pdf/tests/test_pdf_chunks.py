@@ -0,0 +1,136 @@
+"""Разбиение большого PDF на части и склейка XLSX частей не должны менять извлеченные строки."""
+import io
+import math
+import random
+
+import pytest
+from openpyxl import load_workbook
+from pypdf import PdfReader
+
+from app.converters import ConverterBackend
+from app.pdf_chunks import _SEAM_MARKER, split_pdf
+from app.pdf_processor import PDFStatementProcessor
+
+from statement_sheets import HEADERS, PREAMBLE, write_workbook
+
+PAGES = 7
+SIGNATURE = [["Исполнитель", "Иванова А."], ["Подпись ____________", "М.П."]]
+
+
+def _page_rows(seed, width):
+    """Строки таблицы по страницам PDF; таблица начинается на первой странице и не прерывается."""
+    rng = random.Random(seed)
+    pages = {}
+    doc_no = 100
+    for page in range(1, PAGES + 1):
+        rows = []
+        for _ in range(rng.randint(3, 12)):
+            doc_no += 1
+            credit = rng.random() < 0.5
+            amount = f"{rng.randint(1, 99_999)} {rng.randint(0, 999):03d},{rng.randint(0, 99):02d}"
+            row = [str(doc_no), f"{rng.randint(1, 28):02d}.05.2024", str(rng.randint(1000, 9999)),
+                   None if credit else amount, amount if credit else None, "Оплата по договору"]
+            rows.append(row + [None] * (width - len(row)))
+            if rng.random() < 0.3:
+                # Назначение платежа, перенесенное на следующую строку
+                rows.append([None] * (width - 1) + ["№ " + str(doc_no)])
+        pages[page] = rows
+    return pages
+
+
+class PageTableConverter(ConverterBackend):
+    """
+    Конвертер как у Adobe: таблица, продолжающаяся на следующих страницах, - один лист.
+
+    Номер страницы берется из ее текста ("page N"), поэтому конвертер работает одинаково
+    для целого PDF и для его частей.
+    """
+
+    name = "local"
+    extraction_method = "test_pages"
+    split_large_pdfs = True
+
+    def __init__(self, seed):
+        rng = random.Random(seed)
+        self.header = list(HEADERS[0])
+        self.preamble = [line + [None] * (len(self.header) - len(line)) for line in rng.sample(PREAMBLE, 2)]
+        self.pages = _page_rows(seed, len(self.header))
+        self.calls = 0
+
+    def convert(self, pdf_bytes, filename=None):
+        self.calls += 1
+        reader = PdfReader(io.BytesIO(bytes(pdf_bytes)))
+        numbers = [int(page.extract_text().split()[-1]) for page in reader.pages]
+        rows = self.preamble + [self.header] if numbers[0] == 1 else []
+        for number in numbers:
+            rows.extend(self.pages[number])
+        sheets = [rows]
+        if numbers[-1] == PAGES:
+            sheets.append(SIGNATURE)
+        return write_workbook(sheets)
+
+
+def _processor(converter, split_pages):
+    processor = PDFStatementProcessor(backend="local", split_pages=split_pages)
+    processor._converters._backends["local"] = converter
+    return processor
+
+
+def _rows(extraction):
+    with extraction:
+        return [
+            {key: None if isinstance(value, float) and math.isnan(value) else value for key, value in row.items()}
+            for table in extraction.tables
+            for row in table.rows
+        ]
+
+
+@pytest.fixture(autouse=True)
+def _no_cache(monkeypatch):
+    monkeypatch.setenv("PDF_CONVERSION_CACHE", "0")
+
+
+def test_split_pdf_keeps_pages_in_order(text_pdf):
+    chunks = split_pdf(text_pdf([f"page {number}" for number in range(1, PAGES + 1)]), 3)
+    try:
+        pages = [[page.extract_text().split()[-1] for page in PdfReader(chunk).pages] for chunk in chunks]
+    finally:
+        for chunk in chunks:
+            chunk.close()
+
+    assert pages == [["1", "2", "3"], ["4", "5", "6"], ["7"]]
+
+
+def test_split_pdf_skips_small_documents(text_pdf):
+    assert split_pdf(text_pdf(["page 1", "page 2"]), 2) is None
+    assert split_pdf(b"%PDF-1.4 broken", 1) is None
+
+
+@pytest.mark.parametrize("split_pages", [1, 2, 3])
+@pytest.mark.parametrize("seed", range(10))
+def test_split_conversion_extracts_same_rows_as_whole_pdf(text_pdf, seed, split_pages):
+    pdf_bytes = text_pdf([f"page {number}" for number in range(1, PAGES + 1)])
+    whole = PageTableConverter(seed)
+    chunked = PageTableConverter(seed)
+
+    expected = _rows(_processor(whole, split_pages=0).extract(pdf_bytes))
+    rows = _rows(_processor(chunked, split_pages=split_pages).extract(pdf_bytes))
+
+    assert whole.calls == 1
+    assert chunked.calls == math.ceil(PAGES / split_pages)
+    assert len(expected) > 5
+    assert rows == expected
+
+
+def test_seam_header_is_inserted_into_chunk_sheets(text_pdf):
+    pdf_bytes = text_pdf([f"page {number}" for number in range(1, PAGES + 1)])
+    converter = PageTableConverter(0)
+
+    with _processor(converter, split_pages=3).extract(pdf_bytes) as extraction:
+        extraction.excel_file.seek(0)
+        workbook = load_workbook(extraction.excel_file, read_only=True)
+        first_rows = [next(workbook[name].iter_rows(max_row=2, values_only=True)) for name in workbook.sheetnames]
+
+    # Листы частей 2 и 3 (а не лист подписи) начинаются с пометки о продолжении таблицы
+    seams = [idx for idx, row in enumerate(first_rows) if row[0] == _SEAM_MARKER]
+    assert seams == [1, 2]
@@ -0,0 +1,29 @@
+import io
+
+import pytest
+
+from app.pdf_processor import PDFStatementProcessor
+
+FILLER = "Statement of account for the period, generated by the bank online service"
+
+
+@pytest.fixture
+def processor():
+    return PDFStatementProcessor(backend="local")
+
+
+def test_extraction_owns_and_closes_its_excel_file(processor, text_pdf):
+    with processor.extract(text_pdf([f"{FILLER}. Date Debit Credit"])) as extraction:
+        assert not extraction.excel_file.closed
+
+    assert extraction.excel_file.closed
+
+
+def test_excel_file_closed_when_parsing_fails(processor, monkeypatch):
+    excel_file = io.BytesIO(b"not an xlsx")
+    monkeypatch.setattr(processor, "_scan_sheets", lambda excel_file: {})
+
+    with pytest.raises(Exception):
+        processor._extract_from_excel(b"", excel_file, "statement.pdf")
+
+    assert excel_file.closed
@@ -0,0 +1,100 @@
+"""Предварительный просмотр листов (PDF_SHEET_PRESCAN) не должен менять извлеченные строки."""
+import io
+import math
+import random
+
+import pytest
+
+from app.excel_reader import scan_workbook
+from app.pdf_processor import PDFStatementProcessor
+
+from statement_sheets import HEADERS, statement_sheet, write_workbook
+
+COVER = [
+    ["Выписка по счету", None, None],
+    ["Клиент", "ТОО Ромашка", None],
+    ["Период: 01.05.2024 - 31.05.2024", None, None],
+    ["Входящий остаток", "1 000,00", None],
+]
+SIGNATURE = [
+    ["Исполнитель", "Иванова А.", None],
+    ["Подпись ____________", None, "М.П."],
+    ["Страница", 5, "из 5"],
+]
+
+
+def _continuation(seed):
+    """Лист без заголовка: строки statement_sheet между первым и вторым заголовком."""
+    rows = statement_sheet(seed).values.tolist()
+    headers = [idx for idx, row in enumerate(rows) if any(row[:len(header)] == header for header in HEADERS)]
+    end = headers[1] if len(headers) > 1 else len(rows)
+    return rows[headers[0] + 1:end]
+
+
+def _workbook_sheets(seed):
+    rng = random.Random(seed)
+    sheets = []
+    for _ in range(rng.randint(2, 6)):
+        kind = rng.random()
+        if kind < 0.4:
+            sheets.append(statement_sheet(rng.randrange(10_000)))
+        elif kind < 0.6:
+            sheets.append(_continuation(rng.randrange(10_000)))
+        elif kind < 0.8:
+            sheets.append(rng.sample(COVER, rng.randint(1, len(COVER))))
+        else:
+            sheets.append(SIGNATURE)
+    return sheets
+
+
+@pytest.fixture(scope="module")
+def processor():
+    return PDFStatementProcessor(backend="local")
+
+
+def _plain(rows):
+    return [{key: None if isinstance(value, float) and math.isnan(value) else value for key, value in row.items()} for row in rows]
+
+
+def _extract(processor, sheets):
+    with processor._extract_from_excel(b"", write_workbook(sheets), "bank") as extraction:
+        rows = [{"page_number": table.page_number, **row} for table in extraction.tables for row in table.rows]
+        return _plain(rows), extraction.metadata.get("skipped_sheets", [])
+
+
+@pytest.mark.parametrize("seed", range(80))
+def test_prescan_does_not_change_extracted_rows(processor, monkeypatch, seed):
+    sheets = _workbook_sheets(seed)
+
+    monkeypatch.setenv("PDF_SHEET_PRESCAN", "0")
+    expected, skipped_without_prescan = _extract(processor, sheets)
+    monkeypatch.setenv("PDF_SHEET_PRESCAN", "1")
+    rows, _ = _extract(processor, sheets)
+
+    assert skipped_without_prescan == []
+    assert rows == expected
+
+
+def test_random_workbooks_exercise_skipping_and_continuations(processor):
+    skipped = parsed_continuations = 0
+    for seed in range(80):
+        scans = scan_workbook(write_workbook(_workbook_sheets(seed)), processor.credit_headers)
+        skipped += sum(not scan.relevant for scan in scans)
+        parsed_continuations += sum(scan.reason == "продолжение таблицы с предыдущего листа" for scan in scans)
+
+    assert skipped > 50
+    assert parsed_continuations > 5
+
+
+def test_scan_decisions():
+    sheets = [COVER, statement_sheet(3), _continuation(7), SIGNATURE, _continuation(7)]
+
+    scans = scan_workbook(write_workbook(sheets), {"кредит", "credit"})
+
+    assert [scan.relevant for scan in scans] == [False, True, True, False, False]
+    assert scans[1].has_keywords
+    assert scans[2].reason == "продолжение таблицы с предыдущего листа"
+
+
+def test_unreadable_archive_parses_every_sheet():
+    assert scan_workbook(io.BytesIO(b"not an xlsx"), {"кредит"}) is None
@@ -0,0 +1,83 @@
+"""Потоковый разбор XLSX (extract_stream) должен выдавать те же строки, что extract()."""
+import math
+import random
+
+import pytest
+
+from app.pdf_processor import PDFStatementProcessor
+
+from statement_sheets import statement_sheet, write_workbook
+
+
+@pytest.fixture(scope="module")
+def processor():
+    return PDFStatementProcessor(backend="local")
+
+
+def _plain(rows):
+    return [{key: None if isinstance(value, float) and math.isnan(value) else value for key, value in row.items()} for row in rows]
+
+
+def _extract_rows(processor, sheets):
+    with processor._extract_from_excel(b"", write_workbook(sheets), "bank") as extraction:
+        return _plain(
+            {"page_number": table.page_number, "bank_name": table.bank_name, **row}
+            for table in extraction.tables
+            for row in table.rows
+        )
+
+
+def _stream_rows(processor, sheets, window_rows):
+    stream = processor._stream_from_excel(b"", write_workbook(sheets), "bank", "test", window_rows)
+    return _plain(stream.transactions)
+
+
+@pytest.mark.parametrize("window_rows", [50, 64, 2000])
+@pytest.mark.parametrize("seed", range(60))
+def test_stream_matches_extract_on_multi_sheet_workbooks(processor, seed, window_rows):
+    rng = random.Random(seed)
+    sheets = [statement_sheet(rng.randrange(10_000)) for _ in range(rng.randint(1, 4))]
+
+    assert _stream_rows(processor, sheets, window_rows) == _extract_rows(processor, sheets)
+
+
+def test_sheet_without_header_continues_previous_table(processor):
+    header = ["№", "Дата", "Номер док", "Дебет", "Кредит", "Назначение платежа"]
+    first = [header, ["1", "06.05.2024", "101", None, "1 000,00", "Оплата"]]
+    # Таблица разрезана границей листов: второй лист начинается со строк той же ширины
+    second = [
+        ["2", "07.05.2024", "102", None, "2 500,00", "Возврат"],
+        [None, None, None, None, None, "займа"],
+        ["3", "08.05.2024", "103", "300,00", None, "Комиссия"],
+    ]
+
+    rows = _stream_rows(processor, [first, second], window_rows=50)
+
+    assert [(row["page_number"], row["Кредит"]) for row in rows] == [(1, "1000,00"), (2, "2500,00")]
+    assert rows[1]["Назначение платежа"] == "Возврат займа"
+
+
+def test_statement_preamble_is_not_a_continuation(processor):
+    header = ["№", "Дата", "Номер док", "Дебет", "Кредит", "Назначение платежа"]
+    first = [header, ["1", "06.05.2024", "101", None, "1 000,00", "Оплата"]]
+    second = [
+        ["Выписка по счету", None, None, None, None, None],
+        ["Период: 01.05.2024 - 31.05.2024", None, None, None, "Лицевой счет: KZ123", None],
+        header,
+        ["2", "07.05.2024", "102", None, "2 500,00", "Возврат"],
+    ]
+
+    rows = _stream_rows(processor, [first, second], window_rows=50)
+
+    assert [(row["page_number"], row["Кредит"]) for row in rows] == [(1, "1000,00"), (2, "2500,00")]
+    assert rows == _extract_rows(processor, [first, second])
+
+
+def test_stream_closes_excel_file(processor):
+    excel_file = write_workbook([statement_sheet(1)])
+    stream = processor._stream_from_excel(b"", excel_file, None, "test", 50)
+
+    next(stream.transactions, None)
+    stream.transactions.close()
+
+    assert excel_file.closed
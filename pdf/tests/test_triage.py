@@ -0,0 +1,62 @@
+from app.triage import TRIAGE_REJECT, triage_pdf
+
+KEYWORDS = {"credit", "debit", "кредит", "дебет"}
+FILLER = "Statement of account for the period, generated by the bank online service"
+
+
+def test_statement_with_credit_columns_goes_local(text_pdf):
+    report = triage_pdf(text_pdf([f"{FILLER}. Date Debit Credit"]), KEYWORDS)
+
+    assert report.decision == "local"
+    assert report.keywords_found == ["credit", "debit"]
+
+
+def test_text_without_keywords_is_sent_to_adobe_by_default(text_pdf):
+    pdf_bytes = text_pdf([f"{FILLER}. Cover page", "Terms and conditions of the account service"])
+
+    report = triage_pdf(pdf_bytes, KEYWORDS)
+
+    assert not report.rejected
+    assert report.decision == "adobe"
+
+
+def test_text_without_keywords_rejected_only_when_opted_in(text_pdf, monkeypatch):
+    pdf_bytes = text_pdf([f"{FILLER}. Cover page"])
+
+    assert triage_pdf(pdf_bytes, KEYWORDS, reject_without_keywords=True).decision == TRIAGE_REJECT
+    monkeypatch.setenv("PDF_TRIAGE_REJECT_NO_KEYWORDS", "1")
+    assert triage_pdf(pdf_bytes, KEYWORDS).rejected
+
+
+def test_broken_pdf_falls_back_to_adobe():
+    report = triage_pdf(b"%PDF-1.4\nnot really a pdf", KEYWORDS)
+
+    assert report.decision == "adobe"
+    assert "не удалось разобрать" in report.reason
+
+
+def test_memoryview_input_is_not_copied_and_released(text_pdf):
+    buffer = bytearray(text_pdf([f"{FILLER}. Debit Credit"]))
+    view = memoryview(buffer)
+
+    assert triage_pdf(view, KEYWORDS).decision == "local"
+    # BufferStream отпустил свой экспорт: буфер снова можно менять в размере
+    view.release()
+    buffer.extend(b"\n")
+
+
+def test_cache_hit_skips_triage(text_pdf):
+    from app.pdf_processor import PDFStatementProcessor
+
+    processor = PDFStatementProcessor(backend="local")
+    pdf_bytes = text_pdf([f"{FILLER}. Date Debit Credit"])
+
+    first = processor.extract(pdf_bytes)
+    second = processor.extract(pdf_bytes)
+    first.close()
+    second.close()
+
+    assert "triage" in first.timings["stages"]
+    assert second.metadata["conversion_cache"] == "hit"
+    assert "triage" not in second.timings["stages"]
+    assert "triage" not in second.metadata